@@ -0,0 +1,28 @@
+#============ Deferral Queue ============#
+# Resources that are not ready to tag yet (DynamoDB tables, ElastiCache
+# clusters) are parked here with a delay and redelivered to the function.
+# Give-ups are acknowledged by the handler; records that keep failing for
+# other reasons end up on the dead-letter queue instead of cycling until
+# retention expires.
+resource "aws_sqs_queue" "deferral_dlq" {
+  name                      = "${var.autotag_function_name}-deferral-dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "deferral" {
+  name                       = "${var.autotag_function_name}-deferral"
+  visibility_timeout_seconds = 360
+  message_retention_seconds  = 86400
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.deferral_dlq.arn
+    maxReceiveCount     = 3
+  })
+}
+
+resource "aws_lambda_event_source_mapping" "deferral" {
+  event_source_arn        = aws_sqs_queue.deferral.arn
+  function_name           = aws_lambda_function.autotag.arn
+  batch_size              = 10
+  function_response_types = ["ReportBatchItemFailures"]
+  depends_on              = [aws_iam_role.lambda_exec_role]
+}
@@ -5,86 +5,223 @@ resource "aws_cloudwatch_event_rule" "resource_creation_rule" {
   event_pattern = <<EOF
 {
   "source": [
+    "aws.amazonmq",
+    "aws.dynamodb",
     "aws.ec2",
-    "aws.elasticloadbalancing", 
-    "aws.rds", 
-    "aws.lambda", 
-    "aws.s3", 
-    "aws.dynamodb", 
-    "aws.elasticfilesystem", 
-    "aws.es", 
-    "aws.sqs", 
-    "aws.sns", 
-    "aws.kms", 
-    "aws.ecs", 
-    "aws.redshift", 
-    "aws.redshift-serverless", 
-    "aws.sagemaker", 
-    "aws.monitoring", 
-    "aws.logs", 
-    "aws.kafka", 
-    "aws.amazonmq"
+    "aws.ecs",
+    "aws.elasticache",
+    "aws.elasticfilesystem",
+    "aws.elasticloadbalancing",
+    "aws.es",
+    "aws.glue",
+    "aws.kafka",
+    "aws.kms",
+    "aws.lambda",
+    "aws.logs",
+    "aws.monitoring",
+    "aws.rds",
+    "aws.redshift",
+    "aws.s3",
+    "aws.sagemaker",
+    "aws.sns",
+    "aws.sqs"
+  ],
+  "detail-type": [
+    "AWS API Call via CloudTrail"
   ],
-  "detail-type": ["AWS API Call via CloudTrail"],
   "detail": {
-    "eventSource": [
-      "ec2.amazonaws.com",
-      "elasticloadbalancing.amazonaws.com",
-      "s3.amazonaws.com",
-      "rds.amazonaws.com",
-      "lambda.amazonaws.com",
-      "dynamodb.amazonaws.com",
-      "elasticfilesystem.amazonaws.com",
-      "es.amazonaws.com",
-      "sqs.amazonaws.com",
-      "sns.amazonaws.com",
-      "kms.amazonaws.com",
-      "redshift.amazonaws.com",
-      "redshift-serverless.amazonaws.com",
-      "sagemaker.amazonaws.com",
-      "ecs.amazonaws.com",
-      "monitoring.amazonaws.com",
-      "logs.amazonaws.com",
-      "kafka.amazonaws.com",
-      "amazonmq.amazonaws.com"
+    "errorCode": [
+      {
+        "exists": false
+      }
+    ],
+    "readOnly": [
+      false,
+      {
+        "exists": false
+      }
     ],
-    "eventName": [
-      "RunInstances",
-      "CreateVpc",
-      "CreateSecurityGroup",
-      "CreateSubnet",
-      "CreateFunction20150331",
-      "CreateBucket",
-      "CreateDBInstance",
-      "CreateTable",
-      "CreateVolume",
-      "CreateLoadBalancer",
-      "CreateInternetGateway",
-      "CreateNatGateway",
-      "AllocateAddress",
-      "CreateVpcEndpoint",
-      "CreateTransitGateway",
-      "CreateMountTarget",
-      "CreateDomain",
-      "CreateQueue",
-      "CreateTopic",
-      "CreateKey",
-      "CreateCluster",
-      "CreateClusterV2",
-      "CreateNotebookInstance",
-      "PutMetricAlarm",
-      "CreateLogGroup",
-      "CreateBroker",
-      "CreateNamespace",
-      "CreateWorkgroup",
-      "CreateProcessingJob",
-      "CreateEndpoint",
-      "CreateModel",
-      "CreateLabelingJob",
-      "CreateTrainingJob",
-      "CreateTransformJob",
-      "CreateUserProfile",
-      "CreateWorkteam"
+    "$or": [
+      {
+        "eventSource": [
+          "amazonmq.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateBroker"
+        ]
+      },
+      {
+        "eventSource": [
+          "dynamodb.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateTable"
+        ]
+      },
+      {
+        "eventSource": [
+          "ec2.amazonaws.com"
+        ],
+        "eventName": [
+          "AllocateAddress",
+          "CreateInternetGateway",
+          "CreateNatGateway",
+          "CreateSecurityGroup",
+          "CreateSubnet",
+          "CreateTransitGateway",
+          "CreateVolume",
+          "CreateVpc",
+          "CreateVpcEndpoint",
+          "RunInstances"
+        ]
+      },
+      {
+        "eventSource": [
+          "ecs.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateCluster"
+        ]
+      },
+      {
+        "eventSource": [
+          "elasticache.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateCacheCluster",
+          "CreateReplicationGroup",
+          "ModifyReplicationGroupShardConfiguration"
+        ]
+      },
+      {
+        "eventSource": [
+          "elasticfilesystem.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateMountTarget"
+        ]
+      },
+      {
+        "eventSource": [
+          "elasticloadbalancing.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateLoadBalancer"
+        ]
+      },
+      {
+        "eventSource": [
+          "es.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateDomain"
+        ]
+      },
+      {
+        "eventSource": [
+          "glue.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateNamespace"
+        ]
+      },
+      {
+        "eventSource": [
+          "kafka.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateBroker"
+        ]
+      },
+      {
+        "eventSource": [
+          "kms.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateKey"
+        ]
+      },
+      {
+        "eventSource": [
+          "lambda.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateFunction20150331"
+        ]
+      },
+      {
+        "eventSource": [
+          "logs.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateLogGroup"
+        ]
+      },
+      {
+        "eventSource": [
+          "monitoring.amazonaws.com"
+        ],
+        "eventName": [
+          "PutMetricAlarm"
+        ]
+      },
+      {
+        "eventSource": [
+          "rds.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateDBInstance"
+        ]
+      },
+      {
+        "eventSource": [
+          "redshift.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateClusterV2"
+        ]
+      },
+      {
+        "eventSource": [
+          "s3.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateBucket"
+        ]
+      },
+      {
+        "eventSource": [
+          "sagemaker.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateEndpoint",
+          "CreateLabelingJob",
+          "CreateModel",
+          "CreateNotebookInstance",
+          "CreateProcessingJob",
+          "CreateTrainingJob",
+          "CreateTransformJob",
+          "CreateUserProfile",
+          "CreateWorkgroup",
+          "CreateWorkteam"
+        ]
+      },
+      {
+        "eventSource": [
+          "sns.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateTopic"
+        ]
+      },
+      {
+        "eventSource": [
+          "sqs.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateQueue"
+        ]
+      }
     ]
   }
 }
@@ -92,7 +229,10 @@ EOF
 }
 
 #============ Eventbridge Targets ============
+# Direct invocation; replaced by the SQS target in ingestion.tf when
+# enable_sqs_ingestion is set
 resource "aws_cloudwatch_event_target" "lambda" {
+  count      = var.enable_sqs_ingestion ? 0 : 1
   rule       = aws_cloudwatch_event_rule.resource_creation_rule.id
   target_id  = "SendToLambda"
   arn        = aws_lambda_function.autotag.arn
@@ -100,6 +240,7 @@ resource "aws_cloudwatch_event_target" "lambda" {
 }
 
 resource "aws_lambda_permission" "event_bridge_rule" {
+  count         = var.enable_sqs_ingestion ? 0 : 1
   statement_id  = "AllowExecutionFromEventBridgeRule"
   action        = "lambda:InvokeFunction"
   function_name = aws_lambda_function.autotag.function_name
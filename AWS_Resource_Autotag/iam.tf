@@ -71,6 +71,10 @@ data "aws_iam_policy_document" "lambda_inline_policy" {
       "dynamodb:TagResource",
       "dynamodb:DescribeTable",
 
+      # ElastiCache
+      "elasticache:DescribeReplicationGroups",
+      "elasticache:DescribeCacheClusters",
+
       # Lambdas
       "lambda:TagResource",
       "lambda:ListTags",
@@ -81,6 +85,7 @@ data "aws_iam_policy_document" "lambda_inline_policy" {
 
       # EC2
       "ec2:CreateTags",
+      "ec2:DescribeTags",
       "ec2:DescribeNatGateways",
       "ec2:DescribeInternetGateways",
       "ec2:DescribeVolumes",
@@ -152,6 +157,41 @@ data "aws_iam_policy_document" "lambda_inline_policy" {
     ]
     resources = ["*"]
   }
+
+  statement {
+    sid    = "AllowAutotagQueues"
+    effect = "Allow"
+    actions = [
+      "sqs:SendMessage",
+      "sqs:ReceiveMessage",
+      "sqs:DeleteMessage",
+      "sqs:GetQueueAttributes",
+    ]
+    resources = concat([aws_sqs_queue.deferral.arn], aws_sqs_queue.ingestion[*].arn)
+  }
+
+  dynamic "statement" {
+    for_each = aws_dynamodb_table.idempotency[*].arn
+    content {
+      sid    = "AllowIdempotencyTable"
+      effect = "Allow"
+      actions = [
+        "dynamodb:PutItem",
+        "dynamodb:DeleteItem",
+      ]
+      resources = [statement.value]
+    }
+  }
+
+  dynamic "statement" {
+    for_each = aws_dynamodb_table.rate_limit[*].arn
+    content {
+      sid       = "AllowRateLimitTable"
+      effect    = "Allow"
+      actions   = ["dynamodb:UpdateItem"]
+      resources = [statement.value]
+    }
+  }
 }
 
 #======================== Cloudtrail Bucket Policy ========================#
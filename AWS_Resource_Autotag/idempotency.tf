@@ -0,0 +1,19 @@
+#============ Idempotency Table (optional) ============#
+# Shares processed eventIDs and recently tagged ARNs between concurrent
+# containers; without it each warm container only de-duplicates in memory.
+resource "aws_dynamodb_table" "idempotency" {
+  count        = var.enable_idempotency_table ? 1 : 0
+  name         = "${var.autotag_function_name}-idempotency"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires"
+    enabled        = true
+  }
+}
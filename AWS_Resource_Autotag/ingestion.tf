@@ -0,0 +1,96 @@
+#============ SQS Ingestion (optional) ============#
+# EventBridge -> SQS -> Lambda: events are batched on a queue and consumed by
+# a second function whose handler merges them into shared tagging calls.
+resource "aws_sqs_queue" "ingestion_dlq" {
+  count                     = var.enable_sqs_ingestion ? 1 : 0
+  name                      = "${var.autotag_function_name}-ingestion-dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "ingestion" {
+  count                      = var.enable_sqs_ingestion ? 1 : 0
+  name                       = "${var.autotag_function_name}-ingestion"
+  visibility_timeout_seconds = 1800
+  message_retention_seconds  = 345600
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.ingestion_dlq[count.index].arn
+    maxReceiveCount     = 5
+  })
+}
+
+data "aws_iam_policy_document" "ingestion_queue_policy" {
+  count = var.enable_sqs_ingestion ? 1 : 0
+
+  statement {
+    sid    = "AllowEventBridgeSendMessage"
+    effect = "Allow"
+    principals {
+      type        = "Service"
+      identifiers = ["events.amazonaws.com"]
+    }
+    actions   = ["sqs:SendMessage"]
+    resources = [aws_sqs_queue.ingestion[count.index].arn]
+    condition {
+      test     = "ArnEquals"
+      variable = "aws:SourceArn"
+      values   = [aws_cloudwatch_event_rule.resource_creation_rule.arn]
+    }
+  }
+}
+
+resource "aws_sqs_queue_policy" "ingestion" {
+  count     = var.enable_sqs_ingestion ? 1 : 0
+  queue_url = aws_sqs_queue.ingestion[count.index].id
+  policy    = data.aws_iam_policy_document.ingestion_queue_policy[count.index].json
+}
+
+resource "aws_cloudwatch_event_target" "sqs" {
+  count     = var.enable_sqs_ingestion ? 1 : 0
+  rule      = aws_cloudwatch_event_rule.resource_creation_rule.id
+  target_id = "SendToQueue"
+  arn       = aws_sqs_queue.ingestion[count.index].arn
+}
+
+#======================== Batch Lambda Function ========================#
+resource "aws_lambda_function" "autotag_batch" {
+  count         = var.enable_sqs_ingestion ? 1 : 0
+  function_name = "${var.autotag_function_name}-batch"
+  role          = aws_iam_role.lambda_exec_role.arn
+  filename      = local.lambda_package
+
+  source_code_hash = local.lambda_package_hash
+
+  runtime     = "python3.9"
+  handler     = "lambda_function.sqs_handler"
+  timeout     = 300
+  memory_size = 128
+
+  environment {
+    variables = {
+      AUTOTAG_DEFERRAL_QUEUE_URL = aws_sqs_queue.deferral.url
+      AUTOTAG_IDEMPOTENCY_TABLE  = var.enable_idempotency_table ? aws_dynamodb_table.idempotency[0].name : ""
+      AUTOTAG_IDEMPOTENCY_TTL    = var.idempotency_ttl
+      AUTOTAG_QUOTA_TABLE        = var.enable_distributed_rate_limit ? aws_dynamodb_table.rate_limit[0].name : ""
+      AUTOTAG_QUOTA_LIMITS       = local.quota_limits
+      AUTOTAG_ACCOUNT_ID         = data.aws_caller_identity.current.account_id
+      AUTOTAG_LOG_LEVEL          = var.log_level
+      AUTOTAG_LOG_SAMPLE_RATE    = var.log_sample_rate
+    }
+  }
+}
+
+resource "aws_cloudwatch_log_group" "batch_log_grp" {
+  count             = var.enable_sqs_ingestion ? 1 : 0
+  name              = "/aws/lambda/${var.autotag_function_name}-batch"
+  retention_in_days = 30
+}
+
+resource "aws_lambda_event_source_mapping" "ingestion" {
+  count                              = var.enable_sqs_ingestion ? 1 : 0
+  event_source_arn                   = aws_sqs_queue.ingestion[count.index].arn
+  function_name                      = aws_lambda_function.autotag_batch[count.index].arn
+  batch_size                         = var.ingestion_batch_size
+  maximum_batching_window_in_seconds = var.ingestion_batching_window
+  function_response_types            = ["ReportBatchItemFailures"]
+  depends_on                         = [aws_iam_role.lambda_exec_role]
+}
@@ -0,0 +1,26 @@
+#============ Distributed Rate Limit Table (optional) ============#
+# Window counters that every concurrent container leases tag_resources and
+# create_tags tokens from, so that together they stay within the account's
+# API quota instead of each assuming it has the whole of it.
+resource "aws_dynamodb_table" "rate_limit" {
+  count        = var.enable_distributed_rate_limit ? 1 : 0
+  name         = "${var.autotag_function_name}-rate-limit"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires"
+    enabled        = true
+  }
+}
+
+data "aws_caller_identity" "current" {}
+
+locals {
+  quota_limits = join(",", [for api, limit in var.distributed_rate_limits : "${api}=${limit}"])
+}
@@ -16,3 +16,66 @@ variable "autotag_function_name" {
   type        = string
   default     = "autotag"
 }
+
+variable "enable_sqs_ingestion" {
+  description = "Route EventBridge events through an SQS queue and tag them in batches"
+  type        = bool
+  default     = false
+}
+
+variable "ingestion_batch_size" {
+  description = "Maximum number of events handed to one batch invocation"
+  type        = number
+  default     = 100
+}
+
+variable "ingestion_batching_window" {
+  description = "Seconds SQS waits to fill a batch before invoking the batch function"
+  type        = number
+  default     = 10
+}
+
+variable "enable_idempotency_table" {
+  description = "Create a DynamoDB table so concurrent containers share de-duplication state"
+  type        = bool
+  default     = false
+}
+
+variable "idempotency_ttl" {
+  description = "Seconds a processed eventID or tagged ARN is remembered"
+  type        = number
+  default     = 3600
+}
+
+variable "enable_distributed_rate_limit" {
+  description = "Create a DynamoDB table so concurrent containers share one account-wide tagging API budget"
+  type        = bool
+  default     = false
+}
+
+variable "distributed_rate_limits" {
+  description = "Account-wide calls per second per API (service.operation) leased through the rate limit table"
+  type        = map(number)
+  default = {
+    "resourcegroupstaggingapi.tag_resources" = 5
+    "ec2.create_tags"                        = 20
+  }
+}
+
+variable "log_level" {
+  description = "Lowest level the functions log: DEBUG, INFO, WARNING or ERROR. Full events are only logged at DEBUG"
+  type        = string
+  default     = "INFO"
+}
+
+variable "log_sample_rate" {
+  description = "Fraction of invocations (0 to 1) logged at DEBUG regardless of log_level"
+  type        = number
+  default     = 0
+}
+
+variable "lambda_package" {
+  description = "Zip built by tools/build_package.py to deploy instead of zipping lambda-autotag/src. Empty zips the sources"
+  type        = string
+  default     = ""
+}
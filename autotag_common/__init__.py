@@ -0,0 +1,5 @@
+"""Helpers shared by the autotag Lambda functions.
+
+The package is bundled next to each function's ``lambda_function.py`` by the
+``archive_file`` data source in the project's ``lambda.tf``.
+"""
@@ -0,0 +1,77 @@
+import os
+import threading
+
+# Clients and resources live for the lifetime of the container, so warm
+# invocations reuse the same connection pools instead of rebuilding them.
+_POOL = {}
+_LOCK = threading.Lock()
+_CONFIG = None
+
+
+def _boto_config():
+    """Build the botocore config shared by every pooled client.
+
+    botocore does not retry: ratelimit.call(), ratelimit.paginate() and the
+    tagging executor own retries, so a throttle reaches the adaptive bucket
+    and one logical call never multiplies into nested retry loops.
+    """
+    global _CONFIG
+    if _CONFIG is None:
+        from botocore.config import Config
+
+        _CONFIG = Config(
+            max_pool_connections=int(os.environ.get('AUTOTAG_MAX_POOL_CONNECTIONS', '50')),
+            tcp_keepalive=True,
+            connect_timeout=int(os.environ.get('AUTOTAG_CONNECT_TIMEOUT', '5')),
+            read_timeout=int(os.environ.get('AUTOTAG_READ_TIMEOUT', '30')),
+            retries={'mode': 'standard', 'max_attempts': 1}
+        )
+    return _CONFIG
+
+
+def _credentials_key(session):
+    """Identify the credentials a session signs with (None for the default chain)."""
+    if session is None:
+        return None
+    credentials = session.get_credentials()
+    return credentials.access_key if credentials else None
+
+
+def _get(kind, service, region_name, session):
+    key = (kind, service, region_name or None, _credentials_key(session))
+    pooled = _POOL.get(key)
+    if pooled is not None:
+        return pooled
+
+    with _LOCK:
+        pooled = _POOL.get(key)
+        if pooled is None:
+            if session is None:
+                import boto3
+                session = boto3
+            factory = session.client if kind == 'client' else session.resource
+            pooled = factory(service, region_name=region_name, config=_boto_config())
+            _POOL[key] = pooled
+    return pooled
+
+
+def get_client(service, region_name=None, session=None):
+    """Return a pooled boto3 client for (service, region, credentials)."""
+    return _get('client', service, region_name, session)
+
+
+def get_resource(service, region_name=None, session=None):
+    """Return a pooled boto3 resource for (service, region, credentials)."""
+    return _get('resource', service, region_name, session)
+
+
+def install(service, client, region_name=None, session=None):
+    """Seed the pool with a ready-made client, e.g. a fake for local runs."""
+    with _LOCK:
+        _POOL[('client', service, region_name or None, _credentials_key(session))] = client
+
+
+def clear():
+    """Drop every pooled client, e.g. after rotating credentials."""
+    with _LOCK:
+        _POOL.clear()
@@ -0,0 +1,109 @@
+import itertools
+import os
+import threading
+
+# One pool per container, sized by AUTOTAG_MAX_CONCURRENCY. Each service is
+# further capped by AUTOTAG_SERVICE_CONCURRENCY, e.g. "ec2=8,resourcegroupstaggingapi=4".
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_SERVICE_CONCURRENCY = 8
+
+_POOL = None
+_SEMAPHORES = {}
+_LOCK = threading.Lock()
+_local = threading.local()
+
+
+def _executor():
+    global _POOL
+    if _POOL is None:
+        # concurrent.futures is only imported once an event actually fans out
+        from concurrent.futures import ThreadPoolExecutor
+
+        with _LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get('AUTOTAG_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)),
+                    thread_name_prefix='autotag'
+                )
+    return _POOL
+
+
+def _service_limits():
+    limits = {}
+    for item in filter(None, os.environ.get('AUTOTAG_SERVICE_CONCURRENCY', '').split(',')):
+        service, _, limit = item.partition('=')
+        limits[service.strip()] = int(limit)
+    return limits
+
+
+def _semaphore(service):
+    semaphore = _SEMAPHORES.get(service)
+    if semaphore is None:
+        with _LOCK:
+            semaphore = _SEMAPHORES.get(service)
+            if semaphore is None:
+                limit = _service_limits().get(service, DEFAULT_SERVICE_CONCURRENCY)
+                semaphore = _SEMAPHORES[service] = threading.BoundedSemaphore(limit)
+    return semaphore
+
+
+def map_concurrent(fn, items, service=None, limit=None, return_exceptions=False):
+    """Apply fn to every item on the shared pool and return the results in order.
+
+    At most `limit` items of this call, and at most the service's limit
+    across all callers, run at once. Calls made from inside a pool task run
+    inline, so nested fan-outs cannot starve the pool. With
+    return_exceptions=True a failing item yields its exception instead of
+    raising the first one.
+    """
+    items = list(items)
+    if len(items) <= 1 or getattr(_local, 'worker', False) or limit == 1:
+        return [_run_inline(fn, item, return_exceptions) for item in items]
+
+    service_slot = _semaphore(service) if service else None
+
+    def run(item):
+        _local.worker = True
+        if service_slot is not None:
+            service_slot.acquire()
+        try:
+            return fn(item)
+        finally:
+            if service_slot is not None:
+                service_slot.release()
+            _local.worker = False
+
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    # Submit at most `limit` items at a time so this call never parks more
+    # pool threads than it may use
+    pool = _executor()
+    results = [None] * len(items)
+    errors = {}
+    pending = {}
+    queued = iter(enumerate(items))
+    for index, item in itertools.islice(queued, limit or len(items)):
+        pending[pool.submit(run, item)] = index
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                errors[index] = e
+                results[index] = e
+            for next_index, item in itertools.islice(queued, 1):
+                pending[pool.submit(run, item)] = next_index
+    if errors and not return_exceptions:
+        raise errors[min(errors)]
+    return results
+
+
+def _run_inline(fn, item, return_exceptions):
+    try:
+        return fn(item)
+    except Exception as e:
+        if not return_exceptions:
+            raise
+        return e
@@ -0,0 +1,105 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+from autotag_common.clients import get_client
+
+# SQS refuses DelaySeconds above 15 minutes
+MAX_DELAY = 900
+
+
+class NotReady(Exception):
+    """Raised when a resource cannot be tagged yet (still creating or not visible)."""
+
+
+class SqsDelayQueue:
+    """Park events on an SQS queue; the queue's event source mapping redelivers them."""
+
+    def __init__(self, queue_url):
+        self.queue_url = queue_url
+
+    def send(self, body, delay):
+        get_client('sqs').send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(body),
+            DelaySeconds=int(min(delay, MAX_DELAY))
+        )
+
+    def receive(self):
+        # Delivery happens through the Lambda event source mapping
+        return []
+
+
+class LocalDelayQueue:
+    """In-process stand-in for SqsDelayQueue, used in tests and local runs.
+
+    Parked events become visible again once their delay has elapsed and are
+    picked up by the next invocation in the same container.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def send(self, body, delay):
+        import heapq
+
+        with self._lock:
+            heapq.heappush(self._heap, (self.clock() + min(delay, MAX_DELAY), next(self._seq), body))
+
+    def receive(self):
+        import heapq
+
+        now = self.clock()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def __len__(self):
+        return len(self._heap)
+
+
+_QUEUE = None
+
+
+def get_queue():
+    """SQS queue from AUTOTAG_DEFERRAL_QUEUE_URL, else a container-local queue."""
+    global _QUEUE
+    if _QUEUE is None:
+        queue_url = os.environ.get('AUTOTAG_DEFERRAL_QUEUE_URL')
+        _QUEUE = SqsDelayQueue(queue_url) if queue_url else LocalDelayQueue()
+    return _QUEUE
+
+
+def set_queue(queue):
+    """Swap the deferral queue, e.g. for a LocalDelayQueue with a fake clock."""
+    global _QUEUE
+    _QUEUE = queue
+
+
+def backoff(attempt):
+    """Delay before re-checking a parked event, doubling per attempt with jitter."""
+    import random
+
+    base = int(os.environ.get('AUTOTAG_DEFERRAL_BASE_DELAY', '30'))
+    delay = min(MAX_DELAY, base * (2 ** attempt))
+    return int(random.uniform(delay / 2, delay))
+
+
+def defer(event, attempt, queue=None):
+    """Park an event for a later re-check. Returns False once attempts run out."""
+    if attempt >= int(os.environ.get('AUTOTAG_DEFERRAL_MAX_ATTEMPTS', '8')):
+        return False
+    (queue if queue is not None else get_queue()).send({'deferred': True, 'attempt': attempt + 1, 'event': event}, backoff(attempt))
+    return True
+
+
+def is_deferred(body):
+    """True for a message body produced by defer()."""
+    return isinstance(body, dict) and body.get('deferred') is True
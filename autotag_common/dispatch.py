@@ -0,0 +1,88 @@
+"""Route CloudTrail events to handlers by (eventSource, eventName).
+
+The consolidated handlers register for the pairs they support, and each
+event is routed with a dict lookup on detail.eventSource and
+detail.eventName, never by searching the serialised event:
+
+    ROUTER = Router()
+    ROUTER.add('ec2.amazonaws.com', handle_ec2_event, service='ec2')
+    ROUTER.add('dynamodb.amazonaws.com', handle_dynamodb_tags, ['TagResource', 'UntagResource'])
+
+    def lambda_handler(event, context):
+        return ROUTER.dispatch(event, MANDATORY_TAGS)
+
+Handlers are called with the event's detail, then the client of `service`
+when one is given, then the extra arguments passed to dispatch().
+"""
+from collections import namedtuple
+
+from autotag_common.clients import get_client
+
+Route = namedtuple('Route', 'source event_names handler service')
+
+
+def event_detail(event):
+    """The CloudTrail record of an event, with or without the EventBridge envelope."""
+    return event.get('detail', event)
+
+
+def event_source(event, detail=None):
+    """detail.eventSource, or the one implied by the EventBridge source (aws.ec2 -> ec2.amazonaws.com)."""
+    detail = event_detail(event) if detail is None else detail
+    source = detail.get('eventSource')
+    if not source and str(event.get('source', '')).startswith('aws.'):
+        source = event['source'][4:] + '.amazonaws.com'
+    return source
+
+
+class Router:
+    def __init__(self):
+        # (source, eventName) -> Route, with eventName None for every event of a source
+        self.routes = {}
+        self.sources = set()
+
+    def add(self, source, handler, event_names=None, service=None):
+        """Route the events `event_names` of `source` (default: all of them) to `handler`."""
+        route = Route(source, tuple(event_names) if event_names else None, handler, service)
+        for event_name in route.event_names or (None,):
+            key = (source, event_name)
+            if key in self.routes:
+                raise ValueError(f"{source} {event_name or '*'} is already routed to {self.routes[key].handler.__name__}")
+            self.routes[key] = route
+        self.sources.add(source)
+        return route
+
+    def route(self, source, *event_names, service=None):
+        """Decorator form of add()."""
+        def register(handler):
+            self.add(source, handler, event_names, service)
+            return handler
+        return register
+
+    def resolve(self, source, event_name):
+        """Return the Route for (source, eventName), or None if nothing handles it."""
+        routes = self.routes
+        return routes.get((source, event_name)) or routes.get((source, None))
+
+    def dispatch(self, event, *args):
+        """Call the handler registered for the event and return its response.
+
+        Events without a source or name, and events nothing is registered
+        for, get a 400 response.
+        """
+        detail = event_detail(event)
+        source = event_source(event, detail)
+        if not source:
+            return {"statusCode": 400, "body": "Event source not found"}
+        event_name = detail.get('eventName')
+        if not event_name:
+            return {"statusCode": 400, "body": "Event name not found"}
+
+        route = self.resolve(source, event_name)
+        if route is None:
+            if source in self.sources:
+                return {"statusCode": 400, "body": f"Unsupported event: {event_name}"}
+            return {"statusCode": 400, "body": f"Unsupported event source: {source}"}
+        if route.service:
+            return route.handler(detail, get_client(route.service), *args)
+        return route.handler(detail, *args)
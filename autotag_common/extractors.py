@@ -0,0 +1,276 @@
+from collections import namedtuple
+
+from autotag_common.clients import get_client
+from autotag_common.concurrency import map_concurrent
+from autotag_common.deferral import NotReady
+from autotag_common.ratelimit import call, error_code, paginate
+
+# One entry per (source, eventName) the creation lambda tags.
+#   path:          where the identifier lives in event['detail']; "[]" fans out
+#                  over a list. values() is its compiled form
+#   arn:           ARN template filled with region/account and the value, or
+#                  None when the value already is the ARN
+#   resource_type: the resourcegroupstaggingapi resource type of the ARN
+Extractor = namedtuple('Extractor', 'source event_name label resource_type path values arn hook')
+
+
+def _compile_path(path):
+    """Compile 'a.b[].c' into a function returning every value at that path."""
+    steps = tuple((part[:-2], True) if part.endswith('[]') else (part, False)
+                  for part in path.split('.'))
+
+    def values(detail):
+        found = [detail]
+        for key, many in steps:
+            nxt = []
+            for value in found:
+                value = value[key]
+                if value is None:
+                    continue
+                if many:
+                    nxt.extend(value)
+                else:
+                    nxt.append(value)
+            found = nxt
+        return found
+    return values
+
+
+def _compile_arn(template):
+    """Turn an ARN template into a formatter taking (value, region, account)."""
+    if template is None:
+        return lambda value, region, account: value
+    fmt = template.format
+    return lambda value, region, account: fmt(value, region=region, account=account)
+
+
+# describe_volumes accepts at most 200 values per filter
+_MAX_FILTER_VALUES = 200
+
+
+def _instance_attachments(event, instance_ids, arns):
+    """Add the EBS volume and ENI ARNs of newly launched instances.
+
+    Volumes and ENIs listed in the RunInstances response are used as-is; the
+    volumes of any remaining instances come from one batched describe_volumes
+    per 200 instances rather than one lookup per instance, run concurrently.
+    """
+    region = event['region']
+    account = event['account']
+    volume_ids = []
+    unresolved = []
+    for item in event['detail']['responseElements']['instancesSet']['items']:
+        for eni in (item.get('networkInterfaceSet') or {}).get('items', []):
+            arns.append(f"arn:aws:ec2:{region}:{account}:network-interface/{eni['networkInterfaceId']}")
+        mapped = [mapping['ebs']['volumeId']
+                  for mapping in (item.get('blockDeviceMapping') or {}).get('items', [])
+                  if mapping.get('ebs', {}).get('volumeId')]
+        if mapped:
+            volume_ids.extend(mapped)
+        else:
+            unresolved.append(item['instanceId'])
+
+    if unresolved:
+        ec2 = get_client('ec2', region)
+
+        def describe(chunk):
+            return [volume['VolumeId']
+                    for page in paginate(ec2, 'describe_volumes',
+                                         Filters=[{'Name': 'attachment.instance-id', 'Values': chunk}])
+                    for volume in page['Volumes']]
+
+        chunks = [unresolved[i:i + _MAX_FILTER_VALUES] for i in range(0, len(unresolved), _MAX_FILTER_VALUES)]
+        for found in map_concurrent(describe, chunks, service='ec2'):
+            volume_ids.extend(found)
+
+    for volume_id in dict.fromkeys(volume_ids):
+        arns.append(f"arn:aws:ec2:{region}:{account}:volume/{volume_id}")
+    return arns
+
+
+def _table_ready(event, table_arns, arns):
+    """Check once that a new DynamoDB table is ACTIVE instead of blocking on a waiter."""
+    table_name = event['detail']['responseElements']['tableDescription']['tableName']
+    try:
+        table = call(get_client('dynamodb', event['region']), 'describe_table', TableName=table_name)['Table']
+    except Exception as e:
+        if error_code(e) == 'ResourceNotFoundException':
+            raise NotReady(f"DynamoDB table {table_name} not found yet")
+        raise
+    if table['TableStatus'] != 'ACTIVE':
+        raise NotReady(f"DynamoDB table {table_name} is {table['TableStatus']}")
+    return arns
+
+
+def _replication_group_ready(event, cluster_ids, arns):
+    group_id = event['detail']['requestParameters']['replicationGroupId']
+    try:
+        groups = call(get_client('elasticache', event['region']), 'describe_replication_groups',
+                      ReplicationGroupId=group_id)['ReplicationGroups']
+    except Exception as e:
+        if error_code(e) == 'ReplicationGroupNotFoundFault':
+            raise NotReady(f"ElastiCache replication group {group_id} not found yet")
+        raise
+    if not groups or groups[0]['Status'] != 'available':
+        raise NotReady(f"ElastiCache replication group {group_id} is not available yet")
+    return arns
+
+
+def _cache_cluster_ready(event, cluster_arns, arns):
+    cluster_id = event['detail']['responseElements']['cacheClusterId']
+    try:
+        clusters = call(get_client('elasticache', event['region']), 'describe_cache_clusters',
+                        CacheClusterId=cluster_id)['CacheClusters']
+    except Exception as e:
+        if error_code(e) == 'CacheClusterNotFound':
+            raise NotReady(f"ElastiCache cluster {cluster_id} not found yet")
+        raise
+    if not clusters or clusters[0]['CacheClusterStatus'] != 'available':
+        raise NotReady(f"ElastiCache cluster {cluster_id} is not available yet")
+    return arns
+
+
+_SAGEMAKER = 'arn:aws:sagemaker:{region}:{account}:'
+
+# (source, eventName, label, resource type, path, ARN template[, hook])
+_SPECS = (
+    ('aws.ec2', 'RunInstances', 'EC2', 'ec2:instance',
+     'responseElements.instancesSet.items[].instanceId',
+     'arn:aws:ec2:{region}:{account}:instance/{}', _instance_attachments),
+    ('aws.ec2', 'CreateVolume', 'EBS', 'ec2:volume',
+     'responseElements.volumeId',
+     'arn:aws:ec2:{region}:{account}:volume/{}'),
+    ('aws.ec2', 'CreateInternetGateway', 'IGW', 'ec2:internet-gateway',
+     'responseElements.internetGateway.internetGatewayId',
+     'arn:aws:ec2:{region}:{account}:internet-gateway/{}'),
+    ('aws.ec2', 'CreateNatGateway', 'Nat Gateway', 'ec2:natgateway',
+     'responseElements.natGateway.natGatewayId',
+     'arn:aws:ec2:{region}:{account}:natgateway/{}'),
+    ('aws.ec2', 'AllocateAddress', 'EIP', 'ec2:elastic-ip',
+     'responseElements.allocationId',
+     'arn:aws:ec2:{region}:{account}:elastic-ip/{}'),
+    ('aws.ec2', 'CreateVpcEndpoint', 'VPC Endpoint', 'ec2:vpc-endpoint',
+     'responseElements.CreateVpcEndpointResponse.vpcEndpoint.vpcEndpointId',
+     'arn:aws:ec2:{region}:{account}:vpc-endpoint/{}'),
+    ('aws.ec2', 'CreateTransitGateway', 'Transit Gateway', 'ec2:transit-gateway',
+     'responseElements.transitGateway.transitGatewayId',
+     'arn:aws:ec2:{region}:{account}:transit-gateway/{}'),
+    ('aws.ec2', 'CreateVpc', 'VPC', 'ec2:vpc',
+     'responseElements.vpc.vpcId',
+     'arn:aws:ec2:{region}:{account}:vpc/{}'),
+    ('aws.ec2', 'CreateSecurityGroup', 'Security Group', 'ec2:security-group',
+     'responseElements.groupId',
+     'arn:aws:ec2:{region}:{account}:security-group/{}'),
+    ('aws.ec2', 'CreateSubnet', 'Subnet', 'ec2:subnet',
+     'responseElements.subnet.subnetId',
+     'arn:aws:ec2:{region}:{account}:subnet/{}'),
+    ('aws.elasticloadbalancing', 'CreateLoadBalancer', 'LoadBalancer', 'elasticloadbalancing:loadbalancer',
+     'responseElements.loadBalancers[].loadBalancerArn', None),
+    ('aws.rds', 'CreateDBInstance', 'RDS', 'rds:db',
+     'responseElements.dBInstanceArn', None),
+    ('aws.s3', 'CreateBucket', 'S3', 's3',
+     'requestParameters.bucketName',
+     'arn:aws:s3:::{}'),
+    ('aws.lambda', 'CreateFunction20150331', 'Lambda function', 'lambda:function',
+     'responseElements.functionArn', None),
+    ('aws.dynamodb', 'CreateTable', 'DynamoDB table', 'dynamodb:table',
+     'responseElements.tableDescription.tableArn', None, _table_ready),
+    ('aws.kms', 'CreateKey', 'KMS key', 'kms:key',
+     'responseElements.keyMetadata.arn', None),
+    ('aws.sns', 'CreateTopic', 'SNS', 'sns',
+     'requestParameters.name',
+     'arn:aws:sns:{region}:{account}:{}'),
+    ('aws.sqs', 'CreateQueue', 'SQS', 'sqs',
+     'requestParameters.queueName',
+     'arn:aws:sqs:{region}:{account}:{}'),
+    ('aws.elasticfilesystem', 'CreateMountTarget', 'efs', 'elasticfilesystem:file-system',
+     'responseElements.fileSystemId',
+     'arn:aws:elasticfilesystem:{region}:{account}:file-system/{}'),
+    ('aws.es', 'CreateDomain', 'open search', 'es:domain',
+     'responseElements.domainStatus.aRN', None),
+    ('aws.elasticache', 'CreateReplicationGroup', 'ElastiCache cluster', 'elasticache:cluster',
+     'responseElements.memberClusters[]',
+     'arn:aws:elasticache:{region}:{account}:cluster:{}', _replication_group_ready),
+    ('aws.elasticache', 'ModifyReplicationGroupShardConfiguration', 'ElastiCache cluster', 'elasticache:cluster',
+     'responseElements.memberClusters[]',
+     'arn:aws:elasticache:{region}:{account}:cluster:{}', _replication_group_ready),
+    ('aws.elasticache', 'CreateCacheCluster', 'ElastiCache node', 'elasticache:cluster',
+     'responseElements.aRN', None, _cache_cluster_ready),
+    ('aws.redshift', 'CreateClusterV2', 'Redshift Cluster', 'redshift:cluster',
+     'responseElements.cluster.clusterIdentifier',
+     'arn:aws:redshift:{region}:{account}:cluster:{}'),
+    ('aws.sagemaker', 'CreateNotebookInstance', 'SageMaker Notebook Instance', 'sagemaker:notebook-instance',
+     'responseElements.notebookInstanceName', _SAGEMAKER + 'notebook-instance/{}'),
+    ('aws.sagemaker', 'CreateWorkgroup', 'SageMaker Workgroup', 'sagemaker:workgroup',
+     'requestParameters.workgroupName', _SAGEMAKER + 'workgroup/{}'),
+    ('aws.sagemaker', 'CreateProcessingJob', 'SageMaker Processing Job', 'sagemaker:processing-job',
+     'responseElements.processingJobName', _SAGEMAKER + 'processing-job/{}'),
+    ('aws.sagemaker', 'CreateEndpoint', 'SageMaker Endpoint', 'sagemaker:endpoint',
+     'responseElements.endpoint.endpointName', _SAGEMAKER + 'endpoint/{}'),
+    ('aws.sagemaker', 'CreateModel', 'SageMaker Model', 'sagemaker:model',
+     'responseElements.model.modelName', _SAGEMAKER + 'model/{}'),
+    ('aws.sagemaker', 'CreateLabelingJob', 'SageMaker Labeling Job', 'sagemaker:labeling-job',
+     'responseElements.labelingJobName', _SAGEMAKER + 'labeling-job/{}'),
+    ('aws.sagemaker', 'CreateTrainingJob', 'SageMaker Training Job', 'sagemaker:training-job',
+     'responseElements.trainingJobName', _SAGEMAKER + 'training-job/{}'),
+    ('aws.sagemaker', 'CreateTransformJob', 'SageMaker Transform Job', 'sagemaker:transform-job',
+     'responseElements.transformJobName', _SAGEMAKER + 'transform-job/{}'),
+    ('aws.sagemaker', 'CreateUserProfile', 'SageMaker User Profile', 'sagemaker:user-profile',
+     'responseElements.userProfileName', _SAGEMAKER + 'user-profile/{}'),
+    ('aws.sagemaker', 'CreateWorkteam', 'SageMaker Workteam', 'sagemaker:workteam',
+     'responseElements.workteam.workteamName', _SAGEMAKER + 'workteam/{}'),
+    ('aws.ecs', 'CreateCluster', 'ECS Cluster', 'ecs:cluster',
+     'responseElements.cluster.clusterName',
+     'arn:aws:ecs:{region}:{account}:cluster/{}'),
+    ('aws.monitoring', 'PutMetricAlarm', 'CloudWatch Alarm', 'cloudwatch:alarm',
+     'requestParameters.alarmName',
+     'arn:aws:cloudwatch:{region}:{account}:alarm:{}'),
+    ('aws.logs', 'CreateLogGroup', 'CloudWatch Log Group', 'logs:log-group',
+     'requestParameters.logGroupName',
+     'arn:aws:logs:{region}:{account}:log-group:{}'),
+    ('aws.kafka', 'CreateBroker', 'MSK Broker', 'kafka:cluster',
+     'responseElements.broker.brokerId',
+     'arn:aws:kafka:{region}:{account}:cluster/b-{}'),
+    ('aws.amazonmq', 'CreateBroker', 'Amazon MQ Broker', 'mq:broker',
+     'responseElements.broker.brokerId',
+     'arn:aws:mq:{region}:{account}:broker:{}'),
+    ('aws.glue', 'CreateNamespace', 'Glue Namespace', 'glue:namespace',
+     'requestParameters.name',
+     'arn:aws:glue:{region}:{account}:namespace/{}'),
+)
+
+
+def _build(specs):
+    registry = {}
+    for spec in specs:
+        source, event_name, label, resource_type, path, template = spec[:6]
+        hook = spec[6] if len(spec) > 6 else None
+        registry[(source, event_name)] = Extractor(
+            source, event_name, label, resource_type, path,
+            _compile_path(path), _compile_arn(template), hook)
+    return registry
+
+
+EXTRACTORS = _build(_SPECS)
+
+
+def lookup(source, event_name):
+    """Return the extractor for (source, eventName), or None if we don't tag it."""
+    return EXTRACTORS.get((source, event_name))
+
+
+def extract_arns(extractor, event, resolve=True):
+    """Build the ARNs to tag for an event in a single pass over its detail.
+
+    Raises NotReady when the resource cannot be tagged yet. With
+    resolve=False the hooks that call AWS (volume lookups, readiness checks)
+    are skipped, e.g. when replaying historical events.
+    """
+    region = event['region']
+    account = event['account']
+    values = extractor.values(event['detail'])
+    arn = extractor.arn
+    arns = [arn(value, region, account) for value in values]
+    if resolve and extractor.hook is not None and values:
+        arns = extractor.hook(event, values, arns)
+    return arns
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import error_code
+
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETED = 'COMPLETED'
+
+# Tags holding the event's time. They are left out of ARN claim keys, so
+# events that touch the same resource seconds apart share a key
+TIME_TAGS = frozenset(['CreatedOn'])
+
+
+def tag_hash(tags):
+    """Stable digest of a tag set, ignoring TIME_TAGS."""
+    import hashlib
+
+    items = sorted(item for item in tags.items() if item[0] not in TIME_TAGS)
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+
+class LocalBackend:
+    """In-process stand-in for DynamoDBBackend, used in tests and local runs."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, lease):
+        now = self.clock()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] > now:
+                return False
+            self._items[key] = (IN_PROGRESS, now + lease)
+            return True
+
+    def complete(self, key, ttl):
+        with self._lock:
+            self._items[key] = (COMPLETED, self.clock() + ttl)
+
+    def release(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def status(self, key):
+        with self._lock:
+            item = self._items.get(key)
+        return item[0] if item is not None and item[1] > self.clock() else None
+
+
+class DynamoDBBackend:
+    """Claims stored in a DynamoDB table keyed by `pk`, expired through its TTL attribute.
+
+    A claim is written IN_PROGRESS with a short lease and rewritten
+    COMPLETED with the full TTL once its work is done. The condition on
+    `expires` lets a retry take over a claim whose lease ran out.
+    """
+
+    def __init__(self, table_name, clock=time.time):
+        self.table_name = table_name
+        self.clock = clock
+
+    def claim(self, key, lease):
+        now = int(self.clock())
+        try:
+            get_client('dynamodb').put_item(
+                TableName=self.table_name,
+                Item={'pk': {'S': key}, 'status': {'S': IN_PROGRESS}, 'expires': {'N': str(now + lease)}},
+                ConditionExpression='attribute_not_exists(pk) OR expires < :now',
+                ExpressionAttributeValues={':now': {'N': str(now)}}
+            )
+        except Exception as e:
+            if error_code(e) == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def complete(self, key, ttl):
+        get_client('dynamodb').put_item(
+            TableName=self.table_name,
+            Item={'pk': {'S': key}, 'status': {'S': COMPLETED}, 'expires': {'N': str(int(self.clock()) + ttl)}}
+        )
+
+    def release(self, key):
+        get_client('dynamodb').delete_item(TableName=self.table_name, Key={'pk': {'S': key}})
+
+
+class IdempotencyStore:
+    """Drop duplicate events and repeated tagging of the same ARN.
+
+    An event claim starts IN_PROGRESS and holds for `lease` seconds, a
+    little longer than the function timeout, so that the retry of an
+    invocation killed mid-way takes the event over. complete_event()
+    keeps it for `ttl` seconds. Event claims are held in a bounded
+    in-memory map for the warm container and, when a backend is configured,
+    in a shared table so that other containers see them too.
+
+    ARN claims only cover work in flight in this container: they are kept
+    in memory for `lease` seconds, keyed on the ARN and its tags without
+    CreatedOn. Whether a resource is already tagged is read from the
+    resource itself, not remembered here.
+    """
+
+    def __init__(self, backend=None, ttl=3600, lease=330, maxsize=10000, clock=time.time):
+        self.backend = backend
+        self.ttl = ttl
+        self.lease = lease
+        self.maxsize = maxsize
+        self.clock = clock
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _hold(self, key, seconds):
+        with self._lock:
+            self._local[key] = self.clock() + seconds
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _claim(self, key, shared=True):
+        with self._lock:
+            expires = self._local.get(key)
+            if expires is not None and expires > self.clock():
+                return False
+        claimed = not shared or self.backend is None or self.backend.claim(key, self.lease)
+        self._hold(key, self.lease)
+        return claimed
+
+    def _release(self, key, shared=True):
+        with self._lock:
+            self._local.pop(key, None)
+        if shared and self.backend is not None:
+            self.backend.release(key)
+
+    def claim_event(self, event_id):
+        """True if a CloudTrail eventID is neither completed within the TTL nor being processed."""
+        if not event_id:
+            return True
+        return self._claim('event#' + event_id)
+
+    def complete_event(self, event_id):
+        """Mark a claimed event done, so that it is dropped as a duplicate for the whole TTL."""
+        if event_id:
+            key = 'event#' + event_id
+            self._hold(key, self.ttl)
+            if self.backend is not None:
+                self.backend.complete(key, self.ttl)
+
+    def release_event(self, event_id):
+        """Forget an event so that a retry of it is processed again."""
+        if event_id:
+            self._release('event#' + event_id)
+
+    def claim_arns(self, arns, tags):
+        """Return the ARNs no other event in this container is tagging with the same tags."""
+        digest = tag_hash(tags)
+        return [arn for arn in arns if self._claim('arn#' + arn + '#' + digest, shared=False)]
+
+    def release_arns(self, arns, tags):
+        digest = tag_hash(tags)
+        for arn in arns:
+            self._release('arn#' + arn + '#' + digest, shared=False)
+
+
+_STORE = None
+
+
+def get_store():
+    """Store backed by AUTOTAG_IDEMPOTENCY_TABLE if set, else in-memory only."""
+    global _STORE
+    if _STORE is None:
+        table_name = os.environ.get('AUTOTAG_IDEMPOTENCY_TABLE')
+        _STORE = IdempotencyStore(
+            backend=DynamoDBBackend(table_name) if table_name else None,
+            ttl=int(os.environ.get('AUTOTAG_IDEMPOTENCY_TTL', '3600')),
+            lease=int(os.environ.get('AUTOTAG_IDEMPOTENCY_LEASE', '330'))
+        )
+    return _STORE
+
+
+def set_store(store):
+    """Swap the idempotency store, e.g. for one with a LocalBackend."""
+    global _STORE
+    _STORE = store
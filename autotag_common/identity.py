@@ -0,0 +1,7 @@
+def get_created_by_identity(event):
+    """CreatedBy value for a CloudTrail event: the IAM user name, else the principal path of its ARN."""
+    if event['detail']['userIdentity']['type'] == 'IAMUser':
+        return event['detail']['userIdentity']['userName']
+    else:
+        arn_parts = event['detail']["userIdentity"]["arn"].split(":")
+        return "/".join(arn_parts[5:])
@@ -0,0 +1,123 @@
+"""Compact JSON logging shared by the lambdas.
+
+Every record is one JSON line holding a level, a message and whatever key
+fields the caller passes, e.g.
+
+    {"level":"INFO","msg":"invocation","eventID":"…","source":"aws.ec2","eventName":"RunInstances",
+     "arns":["arn:aws:ec2:…"],"outcome":"tagged","status":200,"duration_ms":41.2}
+
+Records below AUTOTAG_LOG_LEVEL (default INFO) are dropped before anything is
+formatted. Whole event payloads are only logged at DEBUG, so they cost
+nothing by default; AUTOTAG_LOG_SAMPLE_RATE (0 to 1, default 0) logs that
+fraction of invocations at DEBUG anyway.
+"""
+import functools
+import json
+import os
+import sys
+import time
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LEVEL = LEVELS.get(os.environ.get('AUTOTAG_LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+SAMPLE_RATE = float(os.environ.get('AUTOTAG_LOG_SAMPLE_RATE', '0'))
+
+# Level of the current invocation (lowered to DEBUG when it is sampled) and
+# the fields its summary record is built from
+_level = LEVEL
+_fields = {}
+_active = False
+
+
+def enabled(level):
+    """Whether records of `level` are written in the current invocation."""
+    return LEVELS[level] >= _level
+
+
+def log(level, message, **fields):
+    if LEVELS[level] < _level:
+        return
+    record = {'level': level, 'msg': message}
+    record.update(fields)
+    # A single write per record so that lines from worker threads never interleave
+    sys.stdout.write(json.dumps(record, default=str, separators=(',', ':')) + '\n')
+
+
+def debug(message, **fields):
+    log('DEBUG', message, **fields)
+
+
+def info(message, **fields):
+    log('INFO', message, **fields)
+
+
+def warning(message, **fields):
+    log('WARNING', message, **fields)
+
+
+def error(message, **fields):
+    log('ERROR', message, **fields)
+
+
+def event_fields(event):
+    """The key fields of an EventBridge event, or the record count of an SQS batch."""
+    if 'Records' in event:
+        return {'records': len(event['Records'])}
+    detail = event.get('detail') or {}
+    fields = {
+        'eventID': detail.get('eventID', event.get('id')),
+        'source': event.get('source', detail.get('eventSource')),
+        'eventName': detail.get('eventName'),
+    }
+    return {key: value for key, value in fields.items() if value is not None}
+
+
+def annotate(**fields):
+    """Add fields (e.g. arns=…, outcome=…) to the current invocation's summary record."""
+    _fields.update(fields)
+
+
+def _sampled():
+    if SAMPLE_RATE <= 0:
+        return False
+    import random
+
+    return random.random() < SAMPLE_RATE
+
+
+def handler(fn):
+    """Wrap a lambda handler so that each invocation writes one summary record.
+
+    The summary holds the event's key fields, anything passed to annotate(),
+    the returned statusCode and the duration. The full event is only logged
+    at DEBUG. Sampled invocations log everything at DEBUG. A handler called
+    from another wrapped handler is part of the outer invocation.
+    """
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        global _level, _fields, _active
+        if _active:
+            return fn(event, context)
+        _active = True
+        _level = LEVELS['DEBUG'] if LEVEL > LEVELS['DEBUG'] and _sampled() else LEVEL
+        _fields = event_fields(event)
+        if _level < LEVEL:
+            _fields['sampled'] = True
+        debug('event', event=event)
+        started = time.perf_counter()
+        try:
+            response = fn(event, context)
+        except Exception as e:
+            _fields.update(outcome='error', error=str(e))
+            error('invocation', **_fields, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+            raise
+        finally:
+            _level = LEVEL
+            _active = False
+        if isinstance(response, dict) and 'statusCode' in response:
+            _fields.setdefault('status', response['statusCode'])
+        level = 'ERROR' if _fields.get('status', 200) >= 500 else 'INFO'
+        log(level, 'invocation', **_fields, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        return response
+
+    return wrapper
@@ -0,0 +1,166 @@
+"""CloudWatch Embedded Metric Format (EMF) records, written to stdout.
+
+Counters and timings are buffered per set of dimensions during an
+invocation. handler() flushes them as EMF JSON lines when the invocation
+ends, and CloudWatch Logs turns those lines into metrics, so no extra API
+calls are made. Every record also carries the Function dimension.
+
+    metrics.count('ApiCalls', Service='ec2', Operation='create_tags')
+    with metrics.stage('write'):
+        ...
+
+AUTOTAG_METRICS_NAMESPACE sets the namespace (default Autotag), and
+AUTOTAG_METRICS=off disables the records.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+NAMESPACE = os.environ.get('AUTOTAG_METRICS_NAMESPACE', 'Autotag')
+ENABLED = os.environ.get('AUTOTAG_METRICS', 'on').lower() != 'off'
+
+# EMF accepts at most 100 values per metric in one record
+_MAX_VALUES = 100
+
+
+class Metrics:
+    """Buffer of counters and timings, keyed by their dimensions."""
+
+    def __init__(self, namespace=NAMESPACE, enabled=ENABLED, stream=None):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.stream = stream
+        self._counts = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **dimensions):
+        if not self.enabled or not value:
+            return
+        key = (tuple(sorted(dimensions.items())), name)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + value
+
+    def timing(self, name, milliseconds, **dimensions):
+        if not self.enabled:
+            return
+        key = (tuple(sorted(dimensions.items())), name)
+        with self._lock:
+            self._timings.setdefault(key, []).append(round(milliseconds, 3))
+
+    def stage(self, stage):
+        """Context manager recording the StageLatency of one stage (parse, extract, read or write)."""
+        return _Stage(self, stage)
+
+    def records(self, timestamp=None):
+        """Take the buffered metrics as EMF records, one per set of dimensions."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            timings, self._timings = self._timings, {}
+        groups = {}
+        for (dimensions, name), value in counts.items():
+            groups.setdefault(dimensions, {})[name] = ('Count', [value])
+        for (dimensions, name), values in timings.items():
+            groups.setdefault(dimensions, {})[name] = ('Milliseconds', values)
+
+        function = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+        timestamp = int((timestamp or time.time()) * 1000)
+        records = []
+        for dimensions, metrics in groups.items():
+            dimensions = (('Function', function),) + dimensions
+            longest = max(len(values) for _, values in metrics.values())
+            for start in range(0, longest, _MAX_VALUES):
+                record = dict(dimensions)
+                definitions = []
+                for name, (unit, values) in sorted(metrics.items()):
+                    chunk = values[start:start + _MAX_VALUES]
+                    if not chunk:
+                        continue
+                    record[name] = chunk[0] if len(chunk) == 1 else chunk
+                    definitions.append({'Name': name, 'Unit': unit})
+                record['_aws'] = {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [[key for key, _ in dimensions]],
+                        'Metrics': definitions,
+                    }],
+                }
+                records.append(record)
+        return records
+
+    def flush(self):
+        """Write the buffered metrics as EMF lines."""
+        stream = self.stream or sys.stdout
+        for record in self.records():
+            stream.write(json.dumps(record, default=str, separators=(',', ':')) + '\n')
+
+
+class _Stage:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.timing('StageLatency', (time.perf_counter() - self.started) * 1000, Stage=self.stage)
+        return False
+
+
+METRICS = Metrics()
+
+
+def count(name, value=1, **dimensions):
+    METRICS.count(name, value, **dimensions)
+
+
+def timing(name, milliseconds, **dimensions):
+    METRICS.timing(name, milliseconds, **dimensions)
+
+
+def stage(name):
+    return METRICS.stage(name)
+
+
+def flush():
+    METRICS.flush()
+
+
+_active = False
+
+
+def handler(fn):
+    """Wrap a lambda handler so that its metrics are flushed when each invocation ends.
+
+    EventBridge events are counted as Events per (Source, EventName); SQS
+    batches count their records where they are parsed. A handler called from
+    another wrapped handler is part of the outer invocation.
+    """
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        global _active
+        if _active:
+            return fn(event, context)
+        _active = True
+        if 'Records' not in event:
+            count_event(event)
+        try:
+            return fn(event, context)
+        finally:
+            _active = False
+            flush()
+
+    return wrapper
+
+
+def count_event(event):
+    """Count one EventBridge event as Events per (Source, EventName)."""
+    detail = event.get('detail') or {}
+    count('Events', Source=event.get('source', detail.get('eventSource', 'unknown')),
+          EventName=detail.get('eventName', 'unknown'))
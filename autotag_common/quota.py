@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+
+from autotag_common import log
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import error_code, jitter
+
+# Account-wide calls per second leased through the shared table, by default
+# only for the write APIs whose quotas concurrent containers compete for.
+# AUTOTAG_QUOTA_LIMITS="ec2.create_tags=20,resourcegroupstaggingapi.tag_resources=5" overrides them.
+_DEFAULT_LIMITS = {
+    ('resourcegroupstaggingapi', 'tag_resources'): 5,
+    ('ec2', 'create_tags'): 20,
+}
+
+
+class LocalQuotaBackend:
+    """In-process stand-in for DynamoDBQuotaBackend, used in tests and local runs."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._used = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, n, limit, ttl):
+        now = self.clock()
+        with self._lock:
+            used, expires = self._used.get(key, (0, now + ttl))
+            if used + n > limit:
+                return False
+            self._used[key] = (used + n, expires)
+            if len(self._used) > 1024:
+                self._used = {k: v for k, v in self._used.items() if v[1] > now}
+            return True
+
+
+class DynamoDBQuotaBackend:
+    """Window counters in a DynamoDB table keyed by `pk`, expired through its TTL attribute.
+
+    A take is one conditional ADD, so concurrent containers can never push a
+    window's counter past its limit.
+    """
+
+    def __init__(self, table_name, clock=time.time):
+        self.table_name = table_name
+        self.clock = clock
+
+    def take(self, key, n, limit, ttl):
+        try:
+            get_client('dynamodb').update_item(
+                TableName=self.table_name,
+                Key={'pk': {'S': key}},
+                UpdateExpression='ADD used :n SET expires = if_not_exists(expires, :expires)',
+                ConditionExpression='attribute_not_exists(used) OR used <= :max',
+                ExpressionAttributeValues={
+                    ':n': {'N': str(n)},
+                    ':max': {'N': str(limit - n)},
+                    ':expires': {'N': str(int(self.clock()) + ttl)}
+                }
+            )
+        except Exception as e:
+            if error_code(e) == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+
+class DistributedLimiter:
+    """Token budget per (account, region, API) shared by every concurrent container.
+
+    Tokens are counted per fixed window of `period` seconds. A container
+    leases up to `lease_size` tokens from the backend at a time and spends
+    them locally within the same window. When a window is used up, callers
+    wait for the next one, and after `max_wait` seconds they go ahead anyway
+    so that the adaptive limiter and retries take over. Backend errors fail
+    open for the same reason.
+    """
+
+    def __init__(self, backend, limits, period=1.0, lease_size=1, max_wait=30.0,
+                 clock=time.time, sleep=time.sleep):
+        self.backend = backend
+        self.limits = dict(limits)
+        self.period = period
+        self.lease_size = lease_size
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.waits = 0
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def _take_local(self, key, window):
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease[0] == window and lease[1] > 0:
+                lease[1] -= 1
+                return True
+        return False
+
+    def acquire(self, account, region, service, operation):
+        """Wait for a token of (account, region, service.operation). Returns False if it gave up."""
+        limit = self.limits.get((service, operation))
+        if limit is None:
+            return True
+        per_window = max(1, int(limit * self.period))
+        key = f'quota#{account}#{region}#{service}.{operation}'
+        deadline = self.clock() + self.max_wait
+        while True:
+            now = self.clock()
+            window = int(now // self.period)
+            if self._take_local(key, window):
+                return True
+            size = min(self.lease_size, per_window)
+            try:
+                for n in sorted({size, 1}, reverse=True):
+                    if self.backend.take(f'{key}#{window}', n, per_window, ttl=int(self.period) + 60):
+                        with self._lock:
+                            self._leases[key] = [window, n - 1]
+                        return True
+            except Exception as e:
+                log.warning('distributed rate limit unavailable; continuing without it', error=str(e))
+                return True
+            if now >= deadline:
+                return False
+            self.waits += 1
+            self.sleep((window + 1) * self.period - now + jitter(1, self.period / 8))
+
+
+def _configured_limits():
+    limits = dict(_DEFAULT_LIMITS)
+    for item in filter(None, os.environ.get('AUTOTAG_QUOTA_LIMITS', '').split(',')):
+        name, _, limit = item.partition('=')
+        service, _, operation = name.strip().partition('.')
+        limits[(service, operation)] = float(limit)
+    return limits
+
+
+_QUOTA = None
+_ACCOUNT = None
+
+
+def get_quota():
+    """Limiter backed by AUTOTAG_QUOTA_TABLE if set, else None (local limits only)."""
+    global _QUOTA
+    if _QUOTA is None:
+        table_name = os.environ.get('AUTOTAG_QUOTA_TABLE')
+        if not table_name:
+            return None
+        _QUOTA = DistributedLimiter(
+            DynamoDBQuotaBackend(table_name), _configured_limits(),
+            lease_size=int(os.environ.get('AUTOTAG_QUOTA_LEASE', '1'))
+        )
+    return _QUOTA
+
+
+def set_quota(quota):
+    """Swap the distributed limiter, e.g. for one with a LocalQuotaBackend."""
+    global _QUOTA
+    _QUOTA = quota
+
+
+def get_account():
+    """Account the container runs in: AUTOTAG_ACCOUNT_ID, else one STS call per container."""
+    global _ACCOUNT
+    if _ACCOUNT is None:
+        _ACCOUNT = os.environ.get('AUTOTAG_ACCOUNT_ID') or get_client('sts').get_caller_identity()['Account']
+    return _ACCOUNT
+
+
+def lease(service, operation, region, account=None):
+    """Take an account-wide token for an API call, if a distributed limiter is configured."""
+    quota = get_quota()
+    if quota is not None:
+        quota.acquire(account or get_account(), region or os.environ.get('AWS_REGION', ''), service, operation)
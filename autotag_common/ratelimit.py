@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+
+from autotag_common import log, metrics
+
+# Error codes AWS returns when a caller exceeds its request rate
+THROTTLE_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'ProvisionedThroughputExceededException',
+    'SlowDown',
+])
+
+# Server-side errors worth retrying without slowing down
+TRANSIENT_CODES = frozenset([
+    'InternalServiceException',
+    'InternalError',
+    'InternalFailure',
+    'ServiceUnavailable',
+])
+
+DEFAULT_RATE = 10.0
+
+# Calls per second each (service, operation) starts at and never exceeds.
+# AUTOTAG_RATE_LIMITS="ec2.create_tags=20,s3.put_bucket_tagging=5" overrides them.
+_DEFAULT_RATES = {
+    ('resourcegroupstaggingapi', 'tag_resources'): 5.0,
+    ('resourcegroupstaggingapi', 'get_resources'): 10.0,
+    ('ec2', 'create_tags'): 20.0,
+    ('ec2', 'describe_tags'): 20.0,
+    ('ec2', 'describe_volumes'): 20.0,
+    ('s3', 'get_bucket_tagging'): 20.0,
+    ('s3', 'put_bucket_tagging'): 10.0,
+}
+
+
+def error_code(exc):
+    """The AWS error code of a botocore ClientError, or None."""
+    return getattr(exc, 'response', {}).get('Error', {}).get('Code')
+
+
+def is_throttle(code):
+    return code in THROTTLE_CODES
+
+
+def is_retryable(code):
+    return code in THROTTLE_CODES or code in TRANSIENT_CODES
+
+
+def jitter(attempt, base_delay, cap=20.0):
+    """Full-jitter exponential backoff delay for a retry attempt (1-based)."""
+    import random
+
+    return random.uniform(0, min(cap, base_delay * (2 ** attempt)))
+
+
+class AdaptiveBucket:
+    """Token bucket whose refill rate follows AIMD.
+
+    Every throttle halves the rate (down to `min_rate`); every success adds
+    `increase` calls per second back, up to the configured `max_rate`.
+    """
+
+    def __init__(self, rate, min_rate=None, increase=None, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.min_rate = min_rate if min_rate is not None else min(0.5, self.max_rate)
+        self.increase = increase if increase is not None else max(0.05, self.max_rate / 20)
+        self.capacity = max(1.0, self.max_rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.throttles = 0
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+def _configured_rates():
+    rates = dict(_DEFAULT_RATES)
+    if 'AUTOTAG_TAG_RATE' in os.environ:
+        rates[('resourcegroupstaggingapi', 'tag_resources')] = float(os.environ['AUTOTAG_TAG_RATE'])
+    for item in filter(None, os.environ.get('AUTOTAG_RATE_LIMITS', '').split(',')):
+        name, _, rate = item.partition('=')
+        service, _, operation = name.strip().partition('.')
+        rates[(service, operation)] = float(rate)
+    return rates
+
+
+class RateLimiter:
+    """One AdaptiveBucket per (service, operation), shared by every caller in the container."""
+
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE):
+        self.rates = _configured_rates() if rates is None else dict(rates)
+        self.default_rate = default_rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, service, operation):
+        key = (service, operation)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = AdaptiveBucket(self.rates.get(key, self.default_rate))
+        return bucket
+
+    def stats(self):
+        with self._lock:
+            return {f'{service}.{operation}': {'rate': round(bucket.rate, 2), 'throttles': bucket.throttles}
+                    for (service, operation), bucket in self._buckets.items()}
+
+
+LIMITER = RateLimiter()
+
+
+def service_name(client):
+    """Service a boto3 client talks to, e.g. 'ec2' or 'resourcegroupstaggingapi'."""
+    name = getattr(getattr(getattr(client, 'meta', None), 'service_model', None), 'service_name', None)
+    return name if isinstance(name, str) else type(client).__name__
+
+
+def _attempts():
+    """(max attempts, base backoff delay) from AUTOTAG_THROTTLE_ATTEMPTS and AUTOTAG_THROTTLE_BASE_DELAY."""
+    return (int(os.environ.get('AUTOTAG_THROTTLE_ATTEMPTS', '6')),
+            float(os.environ.get('AUTOTAG_THROTTLE_BASE_DELAY', '0.2')))
+
+
+def _on_error(e, bucket, service, operation, attempt, max_attempts):
+    """Account for a failed attempt; raise `e` unless it is worth another one."""
+    code = error_code(e)
+    if is_throttle(code):
+        bucket.on_throttle()
+        metrics.count('Throttles', Service=service, Operation=operation)
+    if not is_retryable(code) or attempt == max_attempts - 1:
+        raise e
+    log.warning('retrying', operation=f'{service}.{operation}', code=code, attempt=attempt + 1)
+
+
+def call(client, operation, **kwargs):
+    """Call client.<operation>(**kwargs) under the shared limiter.
+
+    Throttled calls slow their bucket down and are retried with jittered
+    backoff, as are transient server errors; anything else is raised at
+    once. AUTOTAG_THROTTLE_ATTEMPTS bounds the attempts (default 6). Each
+    attempt also leases an account-wide token when quota.get_quota() is
+    configured.
+    """
+    # Imported here because quota depends on this module
+    from autotag_common.quota import lease
+
+    service = service_name(client)
+    region = getattr(getattr(client, 'meta', None), 'region_name', None)
+    bucket = LIMITER.bucket(service, operation)
+    method = getattr(client, operation)
+    max_attempts, base_delay = _attempts()
+    for attempt in range(max_attempts):
+        if attempt:
+            time.sleep(jitter(attempt, base_delay))
+        bucket.acquire()
+        lease(service, operation, region if isinstance(region, str) else None)
+        metrics.count('ApiCalls', Service=service, Operation=operation)
+        try:
+            response = method(**kwargs)
+        except Exception as e:
+            _on_error(e, bucket, service, operation, attempt, max_attempts)
+            continue
+        bucket.on_success()
+        return response
+
+
+def paginate(client, operation, **kwargs):
+    """Yield the pages of a paginated operation, taking a token from its bucket per page.
+
+    A page that fails is retried like call() retries a call: the paginator
+    is restarted from the resume token of the last page it returned.
+    """
+    service = service_name(client)
+    bucket = LIMITER.bucket(service, operation)
+    max_attempts, base_delay = _attempts()
+    paginator = client.get_paginator(operation)
+    config = dict(kwargs.pop('PaginationConfig', None) or {})
+    iterator = paginator.paginate(PaginationConfig=config, **kwargs)
+    pages = iter(iterator)
+    attempt = 0
+    while True:
+        bucket.acquire()
+        try:
+            page = next(pages)
+        except StopIteration:
+            # The paginator stops without another request once a page has no token
+            return
+        except Exception as e:
+            metrics.count('ApiCalls', Service=service, Operation=operation)
+            _on_error(e, bucket, service, operation, attempt, max_attempts)
+            attempt += 1
+            time.sleep(jitter(attempt, base_delay))
+            token = getattr(iterator, 'resume_token', None)
+            if token:
+                config['StartingToken'] = token
+            iterator = paginator.paginate(PaginationConfig=config, **kwargs)
+            pages = iter(iterator)
+            continue
+        metrics.count('ApiCalls', Service=service, Operation=operation)
+        attempt = 0
+        bucket.on_success()
+        yield page
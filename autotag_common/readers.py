@@ -0,0 +1,130 @@
+"""Bulk tag reads, for work that needs the tags of many resources at once.
+
+read_tags() answers what it can from TAG_CACHE and fetches the rest in as
+few calls as possible. EC2 ARNs go through describe_tags, 200 resource
+IDs per filter. Every other ARN goes through
+resourcegroupstaggingapi.get_resources(ResourceARNList=...), 100 ARNs per
+call. Both cost one call per batch, where the per-service reads they
+replace (get_bucket_tagging, list_tags_of_resource, ...) cost one call per
+resource. Results are yielded batch by batch as they arrive, and each one
+is put in TAG_CACHE:
+
+    for arn, current in readers.read_tags(arns):
+        delta = missing(current, required)
+
+get_resources leaves out resources that have never been tagged, so an ARN
+it does not return is read as having no tags.
+"""
+from autotag_common import metrics
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import call, paginate
+from autotag_common.tag_cache import TAG_CACHE
+from autotag_common.tagging import _region_of
+from autotag_common.tags import as_dict
+from autotag_common.writers import Ec2Writer
+
+# get_resources accepts at most 100 ARNs, and describe_tags at most 200
+# values per filter
+MAX_ARNS_PER_READ = 100
+MAX_FILTER_VALUES = 200
+
+
+def _resource_id(arn):
+    return arn.split(':', 5)[5].partition('/')[2]
+
+
+def describe_ec2_tags(ec2_client, resource_ids):
+    """Current tags of many EC2 resources as {resource_id: {Key: Value}}.
+
+    One paged describe_tags per 200 IDs, rather than one call per resource.
+    """
+    current = {resource_id: {} for resource_id in resource_ids}
+    for start in range(0, len(resource_ids), MAX_FILTER_VALUES):
+        chunk = resource_ids[start:start + MAX_FILTER_VALUES]
+        for page in paginate(ec2_client, 'describe_tags',
+                             Filters=[{'Name': 'resource-id', 'Values': chunk}],
+                             PaginationConfig={'PageSize': 1000}):
+            for tag in page.get('Tags', []):
+                current[tag['ResourceId']][tag['Key']] = tag['Value']
+    return current
+
+
+class TaggingApiReader:
+    """get_resources, for any ARN. read() returns {arn: {Key: Value}} for one batch of a region's ARNs."""
+
+    service = 'resourcegroupstaggingapi'
+    max_batch = MAX_ARNS_PER_READ
+
+    def accepts(self, arn):
+        return True
+
+    def read(self, region, arns):
+        response = call(get_client(self.service, region), 'get_resources', ResourceARNList=arns)
+        found = {mapping['ResourceARN']: as_dict(mapping.get('Tags', []))
+                 for mapping in response.get('ResourceTagMappingList', [])}
+        return {arn: found.get(arn, {}) for arn in arns}
+
+
+class Ec2Reader:
+    """describe_tags, for the EC2 resource types create_tags can also write."""
+
+    service = 'ec2'
+    max_batch = MAX_FILTER_VALUES
+
+    def accepts(self, arn):
+        parts = arn.split(':', 5)
+        if len(parts) < 6 or parts[2] != 'ec2':
+            return False
+        resource_type, _, resource_id = parts[5].partition('/')
+        return bool(resource_id) and resource_type in Ec2Writer.RESOURCE_TYPES
+
+    def read(self, region, arns):
+        ids = {_resource_id(arn): arn for arn in arns}
+        current = describe_ec2_tags(get_client(self.service, region), list(ids))
+        return {ids[resource_id]: tags for resource_id, tags in current.items()}
+
+
+READERS = {'ec2': Ec2Reader()}
+DEFAULT_READER = TaggingApiReader()
+
+
+def plan_reads(arns, readers=None):
+    """Group ARNs by (reader, region) and chunk them. Returns a list of (reader, region, arns)."""
+    readers = READERS if readers is None else readers
+    groups = {}
+    for arn in arns:
+        parts = arn.split(':', 3)
+        reader = readers.get(parts[2]) if len(parts) > 3 else None
+        if reader is None or not reader.accepts(arn):
+            reader = DEFAULT_READER
+        groups.setdefault((reader, _region_of(arn)), {})[arn] = None
+    batches = []
+    for (reader, region), group in groups.items():
+        group = list(group)
+        for start in range(0, len(group), reader.max_batch):
+            batches.append((reader, region, group[start:start + reader.max_batch]))
+    return batches
+
+
+def read_tags(arns, cache=TAG_CACHE, readers=None):
+    """Yield (arn, {Key: Value}) for every ARN, cached ones first, the rest batch by batch.
+
+    Fetched tags are put in `cache`; pass cache=None to always read.
+    """
+    pending = []
+    for arn in dict.fromkeys(arns):
+        cached = cache.get(arn) if cache is not None else None
+        if cached is None:
+            pending.append(arn)
+        else:
+            yield arn, cached
+
+    for reader, region, batch in plan_reads(pending, readers):
+        with metrics.stage('read'):
+            current = reader.read(region, batch)
+        metrics.count('ResourcesRead', len(batch), Service=reader.service)
+        for arn, tags in current.items():
+            if cache is not None:
+                cache.put(arn, tags)
+            yield arn, tags
+
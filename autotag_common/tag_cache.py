@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TagCache:
+    """Bounded LRU cache of the last known tags of each resource.
+
+    Entries expire `ttl` seconds after they were last written. Tags are kept
+    as {Key: Value} dicts and copies are handed out, so callers may mutate
+    what they get back. `hits` and `misses` count get() outcomes for sizing.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key, tags):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, dict(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def merge(self, key, tags):
+        """Apply added or overwritten tags to a cached entry, if there is one."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                entry[1].update(tags)
+
+    def remove(self, key, tag_keys, values=None):
+        """Drop deleted tag keys from a cached entry, if there is one.
+
+        A key listed in `values` is only dropped when its cached value
+        matches, like EC2 DeleteTags called with a value.
+        """
+        values = values or {}
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                for tag_key in tag_keys:
+                    if tag_key not in values or entry[1].get(tag_key) == values[tag_key]:
+                        entry[1].pop(tag_key, None)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
+
+
+TAG_CACHE = TagCache(
+    maxsize=int(os.environ.get('AUTOTAG_TAG_CACHE_SIZE', '1024')),
+    ttl=float(os.environ.get('AUTOTAG_TAG_CACHE_TTL', '300'))
+)
+
+
+def cached_tags(key, loader):
+    """Return the cached tags of `key`, calling loader() and caching its result on a miss."""
+    tags = TAG_CACHE.get(key)
+    if tags is None:
+        tags = loader()
+        TAG_CACHE.put(key, tags)
+    return tags
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+
+from autotag_common import metrics, writers
+from autotag_common.clients import get_client
+from autotag_common.concurrency import map_concurrent
+from autotag_common.quota import lease
+from autotag_common.ratelimit import LIMITER, AdaptiveBucket, error_code, is_retryable, is_throttle, jitter
+
+# resourcegroupstaggingapi.tag_resources accepts at most 20 ARNs per call
+MAX_ARNS_PER_CALL = 20
+
+
+def _region_of(arn):
+    """Region field of an ARN; None for global ARNs such as S3 buckets."""
+    parts = arn.split(':', 4)
+    return (parts[3] or None) if len(parts) > 3 else None
+
+
+def _account_of(arn):
+    """Account field of an ARN; None for ARNs without one, such as S3 buckets."""
+    parts = arn.split(':', 5)
+    return (parts[4] or None) if len(parts) > 4 else None
+
+
+def _service_of(arn):
+    return arn.split(':', 3)[2]
+
+
+def _retryable(failure):
+    return failure.get('StatusCode', 0) >= 500 or is_retryable(failure.get('ErrorCode'))
+
+
+def plan_batches(work, size=MAX_ARNS_PER_CALL, by_service=False):
+    """Group (arn, tags) pairs by region and identical tag set, then chunk.
+
+    With by_service=True each batch also holds a single service's ARNs, so
+    that it can be charged to that service's rate budget. Returns a list of
+    (region, tags, arns) with at most `size` ARNs each.
+    """
+    groups = {}
+    for arn, tags in work:
+        key = (_region_of(arn), _service_of(arn) if by_service else None, frozenset(tags.items()))
+        arns = groups.setdefault(key, {})
+        arns[arn] = None
+    batches = []
+    for (region, _, tags), arns in groups.items():
+        arns = list(arns)
+        for i in range(0, len(arns), size):
+            batches.append((region, dict(tags), arns[i:i + size]))
+    return batches
+
+
+def _tag_batch(region, tags, arns, budget, max_attempts, base_delay):
+    """Tag one batch, retrying only the ARNs that failed with a retryable error."""
+    client = get_client('resourcegroupstaggingapi', region)
+    account = _account_of(arns[0])
+    pending = arns
+    failed = {}
+    for attempt in range(max_attempts):
+        if attempt:
+            time.sleep(jitter(attempt, base_delay))
+        budget.acquire()
+        lease('resourcegroupstaggingapi', 'tag_resources', region, account)
+        metrics.count('ApiCalls', Service='resourcegroupstaggingapi', Operation='tag_resources')
+        try:
+            response = client.tag_resources(ResourceARNList=pending, Tags=tags)
+        except Exception as e:
+            code = error_code(e)
+            if is_throttle(code):
+                budget.on_throttle()
+                metrics.count('Throttles', Service='resourcegroupstaggingapi', Operation='tag_resources')
+            if not is_retryable(code) or attempt == max_attempts - 1:
+                for arn in pending:
+                    failed[arn] = {'ErrorCode': code or type(e).__name__, 'ErrorMessage': str(e)}
+                return failed
+            continue
+
+        failures = response.get('FailedResourcesMap') or {}
+        if any(is_throttle(failure.get('ErrorCode')) for failure in failures.values()):
+            budget.on_throttle()
+            metrics.count('Throttles', Service='resourcegroupstaggingapi', Operation='tag_resources')
+        else:
+            budget.on_success()
+        retry = []
+        for arn, failure in failures.items():
+            if _retryable(failure) and attempt < max_attempts - 1:
+                retry.append(arn)
+            else:
+                failed[arn] = failure
+        if not retry:
+            return failed
+        pending = retry
+    return failed
+
+
+def _write_native(native, max_workers):
+    """Tag the pairs routed to native writers, in batches of each writer's max_batch.
+
+    Returns (tagged batches as (tags, arns), pairs to fail over to tag_resources).
+    """
+    tagged = []
+    failover = []
+    for writer, pairs in native.items():
+        batches = plan_batches(pairs, size=writer.max_batch)
+
+        def run(batch, writer=writer):
+            region, tags, arns = batch
+            writer.write(region, tags, arns)
+
+        outcomes = map_concurrent(run, batches, service=writer.service, limit=max_workers,
+                                  return_exceptions=True)
+        for (_, tags, arns), outcome in zip(batches, outcomes):
+            if isinstance(outcome, Exception):
+                metrics.count('WriterFailovers', len(arns), Service=writer.service)
+                failover.extend((arn, tags) for arn in arns)
+            else:
+                tagged.append((tags, arns))
+    return tagged, failover
+
+
+def tag_resources(work, max_workers=None, rate=None, max_attempts=4, base_delay=0.2, rates=None,
+                  native=True):
+    """Tag (arn, tags) pairs in maximal tag_resources batches.
+
+    Batches run concurrently on the shared pool, within the
+    resourcegroupstaggingapi concurrency limit and at most `max_workers`
+    (AUTOTAG_TAG_WORKERS) at a time. Only the ARNs reported in
+    FailedResourcesMap with a retryable error are retried, with jittered
+    exponential backoff.
+    By default every batch draws on the container-wide tag_resources bucket
+    of ratelimit.LIMITER. An explicit `rate`, or `rates` ({service: calls
+    per second}) for a bucket per service, gives this run budgets of its
+    own. Returns {'tagged': [...], 'failed': {arn: failure}}.
+
+    With native=True, ARNs a writers.WRITERS entry accepts (EC2 resources,
+    1000 per create_tags) go through that service's own API first; a
+    batch whose native call fails falls back to tag_resources.
+    """
+    if max_workers is None and os.environ.get('AUTOTAG_TAG_WORKERS'):
+        max_workers = int(os.environ['AUTOTAG_TAG_WORKERS'])
+    budgets = {}
+    budget_lock = threading.Lock()
+
+    def budget_for(arns):
+        if rate is None and rates is None:
+            return LIMITER.bucket('resourcegroupstaggingapi', 'tag_resources')
+        service = _service_of(arns[0]) if rates is not None else None
+        with budget_lock:
+            budget = budgets.get(service)
+            if budget is None:
+                default = rate if rate is not None else LIMITER.bucket(
+                    'resourcegroupstaggingapi', 'tag_resources').max_rate
+                budget = budgets[service] = AdaptiveBucket((rates or {}).get(service, default))
+        return budget
+
+    result = {'tagged': [], 'failed': {}}
+    if native:
+        routed, work = writers.route(work)
+        tagged, failover = _write_native(routed, max_workers)
+        for tags, arns in tagged:
+            result['tagged'].extend(arns)
+            metrics.count('ResourcesTagged', len(arns))
+            metrics.count('TagsWritten', len(arns) * len(tags))
+        work = work + failover
+
+    batches = plan_batches(work, by_service=rates is not None)
+    if not batches:
+        return result
+
+    def run(batch):
+        region, tags, arns = batch
+        return arns, _tag_batch(region, tags, arns, budget_for(arns), max_attempts, base_delay)
+
+    outcomes = map_concurrent(run, batches, service='resourcegroupstaggingapi', limit=max_workers)
+
+    for (_, tags, _), (arns, failed) in zip(batches, outcomes):
+        result['failed'].update(failed)
+        tagged = [arn for arn in arns if arn not in failed]
+        result['tagged'].extend(tagged)
+        metrics.count('ResourcesTagged', len(tagged))
+        metrics.count('TagsWritten', len(tagged) * len(tags))
+    metrics.count('TagFailures', len(result['failed']))
+    return result
@@ -0,0 +1,101 @@
+"""The mandatory tags and the minimal writes that enforce them.
+
+missing() compares a resource's current tags ({Key: Value}) with the frozen
+MANDATORY_TAGS and returns only what has to be written. enforce() wraps a
+handler's write call: it is skipped entirely when nothing is missing, which
+is counted as WritesSkipped and noted in the invocation summary.
+
+    def write(delta):
+        call(client, 'tag_resource', ResourceId=resource_id, Tags=tags.as_list(delta))
+
+    written = tags.enforce(current, write)
+
+Tagging events usually say enough to decide without reading the resource's
+tags first. from_event() works out the missing tags from an event's payload,
+and it returns None when the payload cannot decide. AUTOTAG_EVENT_RECONCILE=off
+always falls back to the read.
+"""
+import os
+from types import MappingProxyType
+
+from autotag_common import log, metrics
+
+# Tags every resource must carry. Read-only, so no handler can alter them
+MANDATORY_TAGS = MappingProxyType({'Division': 'CD', 'Studio': 'Ajax'})
+
+EVENT_RECONCILE = os.environ.get('AUTOTAG_EVENT_RECONCILE', 'on').lower() != 'off'
+
+
+def as_dict(tag_list, key='Key', value='Value'):
+    """[{'Key': k, 'Value': v}, ...] as {k: v}; key/value name the fields (e.g. 'key'/'value' in CloudTrail)."""
+    return {tag[key]: tag.get(value, '') for tag in tag_list}
+
+
+def as_list(tags, key='Key', value='Value'):
+    """{k: v} as the [{'Key': k, 'Value': v}, ...] the tagging APIs take."""
+    return [{key: k, value: v} for k, v in tags.items()]
+
+
+def missing(current, required=MANDATORY_TAGS, overwrite=False):
+    """The tags of `required` that must be written for `current` to carry them.
+
+    Keys already present keep their value, unless overwrite=True, in which
+    case differing values are corrected as well.
+    """
+    if overwrite:
+        return {key: value for key, value in required.items() if current.get(key) != value}
+    return {key: value for key, value in required.items() if key not in current}
+
+
+def from_event(added=None, removed=None, replaced=None, required=MANDATORY_TAGS):
+    """The tags to write, decided from an event's payload alone, or None if it cannot tell.
+
+    added:    {Key: Value} set by CreateTags or TagResource. Decides only
+              when it covers every required key, and then nothing is written.
+    removed:  keys deleted by DeleteTags or UntagResource. The required keys
+              among them are written back. A delete that touched no
+              required key needs nothing.
+    replaced: the complete new tag set, e.g. from PutBucketTagging, or {}
+              after every tag was deleted.
+
+    A decision counts a ReadsSkipped.
+    """
+    if not EVENT_RECONCILE:
+        return None
+    if replaced is not None:
+        delta = missing(replaced, required)
+    elif removed is not None:
+        delta = {key: required[key] for key in removed if key in required}
+    elif added is not None and all(key in added for key in required):
+        delta = {}
+    else:
+        return None
+    log.annotate(decided='event')
+    metrics.count('ReadsSkipped')
+    return delta
+
+
+def write_missing(delta, write, required=MANDATORY_TAGS, outcome='tagged', resources=1):
+    """Call write(delta), or skip the call when `delta` is empty.
+
+    `resources` is how many resources the call covers, for the metrics.
+    Returns the delta written ({} when the write was skipped).
+    """
+    if not delta:
+        log.annotate(outcome='unchanged', skipped=sorted(required))
+        metrics.count('WritesSkipped', resources)
+        return delta
+    with metrics.stage('write'):
+        write(delta)
+    log.annotate(outcome=outcome, added=sorted(delta))
+    metrics.count('ResourcesTagged', resources)
+    metrics.count('TagsWritten', len(delta) * resources)
+    return delta
+
+
+def enforce(current, write, required=MANDATORY_TAGS, overwrite=False, outcome='tagged'):
+    """Call write(delta) with the tags `current` lacks, or skip the call when there are none.
+
+    Returns the delta written ({} when the write was skipped).
+    """
+    return write_missing(missing(current, required, overwrite), write, required, outcome)
@@ -0,0 +1,90 @@
+import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+DEFAULT_ZONE = 'Asia/Kolkata'
+DEFAULT_FORMAT = '%Y-%m-%d %H:%M:%S %Z'
+
+# Zones without DST that the lambdas use, so they resolve without zoneinfo data
+_FIXED_ZONES = {
+    'UTC': timezone.utc,
+    'Asia/Kolkata': timezone(timedelta(hours=5, minutes=30), 'IST'),
+}
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """tzinfo for an IANA zone name, resolved once per container."""
+    zone = _FIXED_ZONES.get(name)
+    if zone is None:
+        from zoneinfo import ZoneInfo
+        zone = ZoneInfo(name)
+    return zone
+
+
+def parse_event_time(value):
+    """Parse a CloudTrail eventTime such as '2024-10-24T08:59:04Z' into an aware UTC datetime.
+
+    The fixed CloudTrail shape is sliced directly; anything else goes through
+    fromisoformat, with naive values taken as UTC.
+    """
+    if len(value) == 20 and value[10] == 'T' and value[19] == 'Z':
+        return datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19]),
+            tzinfo=timezone.utc
+        )
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+class TimeConverter:
+    """Format CloudTrail event times in a target zone.
+
+    Results are memoised per input string, since events of a burst share
+    their eventTime down to the second.
+    """
+
+    def __init__(self, zone=DEFAULT_ZONE, fmt=DEFAULT_FORMAT, cache_size=4096):
+        self.zone = get_zone(zone)
+        self.fmt = fmt
+        self.convert = lru_cache(maxsize=cache_size)(self._convert)
+
+    def _convert(self, value):
+        return parse_event_time(value).astimezone(self.zone).strftime(self.fmt)
+
+    def convert_many(self, values):
+        """Convert an iterable of event times, formatting each distinct value once."""
+        seen = {}
+        out = []
+        for value in values:
+            converted = seen.get(value)
+            if converted is None:
+                converted = seen[value] = self._convert(value)
+            out.append(converted)
+        return out
+
+
+_CONVERTER = None
+
+
+def get_converter():
+    """Converter for AUTOTAG_TIMEZONE and AUTOTAG_TIME_FORMAT, defaulting to IST."""
+    global _CONVERTER
+    if _CONVERTER is None:
+        _CONVERTER = TimeConverter(
+            zone=os.environ.get('AUTOTAG_TIMEZONE', DEFAULT_ZONE),
+            fmt=os.environ.get('AUTOTAG_TIME_FORMAT', DEFAULT_FORMAT)
+        )
+    return _CONVERTER
+
+
+def convert_event_time(value):
+    """CreatedOn value for a CloudTrail eventTime."""
+    return get_converter().convert(value)
+
+
+def convert_many(values):
+    return get_converter().convert_many(values)
@@ -0,0 +1,77 @@
+"""Native tag writers, picked per service to tag each batch with the fewest calls.
+
+resourcegroupstaggingapi.tag_resources tags any ARN, but only 20 per call
+and at a low rate. A service whose own tag API takes larger batches has a
+writer in WRITERS. route() hands each writer the ARNs it accepts and
+leaves the rest to the tagging API. tagging.tag_resources() runs both,
+and fails a native batch over to the tagging API when the native call
+raises, for example on a resource type it rejects.
+
+EC2's create_tags takes up to 1000 resource IDs of any EC2 resource type
+per call. ElastiCache and RDS have tag APIs too, but those take a single
+ARN per call, so the tagging API stays the cheaper path for them.
+AUTOTAG_NATIVE_WRITERS=off sends everything through the tagging API.
+"""
+import os
+
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import call
+from autotag_common.tags import as_list
+
+ENABLED = os.environ.get('AUTOTAG_NATIVE_WRITERS', 'on').lower() != 'off'
+
+
+class Ec2Writer:
+    """EC2's create_tags. Like every writer, it names its `service`,
+    `operation` and `max_batch`, tells with accepts(arn) which ARNs it can
+    tag, and tags one batch with write(region, tags, arns), raising if the
+    call fails.
+    """
+
+    service = 'ec2'
+    operation = 'create_tags'
+    max_batch = 1000
+
+    # ARN resource types create_tags accepts by resource ID
+    RESOURCE_TYPES = frozenset([
+        'instance', 'volume', 'snapshot', 'image', 'network-interface', 'subnet', 'vpc',
+        'security-group', 'vpc-endpoint', 'vpc-peering-connection', 'internet-gateway',
+        'egress-only-internet-gateway', 'natgateway', 'route-table', 'network-acl',
+        'dhcp-options', 'elastic-ip', 'launch-template', 'key-pair',
+        'customer-gateway', 'vpn-gateway', 'vpn-connection', 'transit-gateway',
+        'transit-gateway-attachment', 'transit-gateway-route-table', 'capacity-reservation',
+        'placement-group',
+    ])
+
+    def accepts(self, arn):
+        parts = arn.split(':', 5)
+        if len(parts) < 6 or parts[2] != 'ec2':
+            return False
+        resource_type, _, resource_id = parts[5].partition('/')
+        return bool(resource_id) and resource_type in self.RESOURCE_TYPES
+
+    def write(self, region, tags, arns):
+        call(get_client('ec2', region), 'create_tags',
+            Resources=[arn.split(':', 5)[5].partition('/')[2] for arn in arns],
+            Tags=as_list(tags)
+        )
+
+
+WRITERS = {'ec2': Ec2Writer()}
+
+
+def route(work, writers=None):
+    """Split (arn, tags) pairs into ({writer: pairs}, pairs for the tagging API)."""
+    writers = WRITERS if writers is None else writers
+    native = {}
+    rest = []
+    if not ENABLED or not writers:
+        return native, list(work)
+    for arn, tags in work:
+        parts = arn.split(':', 3)
+        writer = writers.get(parts[2]) if len(parts) > 3 else None
+        if writer is not None and writer.accepts(arn):
+            native.setdefault(writer, []).append((arn, tags))
+        else:
+            rest.append((arn, tags))
+    return native, rest
@@ -1,153 +1,117 @@
-import boto3
+from autotag_common import dispatch, log, metrics
+from autotag_common.ratelimit import call
+from autotag_common.readers import describe_ec2_tags
+from autotag_common.tags import as_dict, as_list, enforce, missing, write_missing
 
-# Lambda function for handling EC2 tags
-def handle_ec2_tags(event):
-    ec2_client = boto3.client('ec2')
-    print(f"Received event for EC2: {event}")
+# create_tags accepts at most 1000 resources per call
+MAX_RESOURCES_PER_CALL = 1000
+
+# Resource IDs listed in an invocation's summary record
+MAX_LOGGED_RESOURCES = 20
 
-    try:
-        if 'detail' not in event:
-            print("Missing 'detail' in event")
-            return {"statusCode": 400, "body": "Missing 'detail' in event"}
 
-        event_name = event['detail'].get('eventName')
-        print(f"Event name: {event_name}")
+def create_tags(ec2_client, resource_ids, delta):
+    """Write the same tags to many resources, 1000 per create_tags call."""
+    for start in range(0, len(resource_ids), MAX_RESOURCES_PER_CALL):
+        call(ec2_client, 'create_tags',
+            Resources=resource_ids[start:start + MAX_RESOURCES_PER_CALL],
+            Tags=as_list(delta)
+        )
 
-        user_identity = event['detail'].get('userIdentity', {})
+# Lambda function for handling EC2 tags
+def handle_ec2_tags(event_detail, ec2_client):
+    try:
+        user_identity = event_detail.get('userIdentity', {})
         if user_identity.get('type') == "AssumedRole" and "autotag" in user_identity.get('arn', ''):
-            print("Event triggered by Lambda itself; skipping to avoid loop.")
+            log.annotate(outcome='ignored own change')
             return {"statusCode": 200, "body": "Ignored event to prevent infinite loop"}
 
-        if event_name not in ['CreateTags', 'DeleteTags']:
-            print(f"Unsupported event: {event_name}")
-            return {"statusCode": 400, "body": f"Unsupported event: {event_name}"}
-
-        resource_items = event["detail"]["requestParameters"]["resourcesSet"]["items"]
-        if not resource_items or "resourceId" not in resource_items[0]:
-            print("Resource ID not found in the event")
+        event_name = event_detail['eventName']
+        # One call can tag many resources; handle all of them
+        resource_items = event_detail["requestParameters"]["resourcesSet"]["items"]
+        resource_ids = list(dict.fromkeys(item["resourceId"] for item in resource_items or [] if "resourceId" in item))
+        if not resource_ids:
+            log.annotate(outcome='no resource')
             return {"statusCode": 400, "body": "Resource ID not found in the event"}
 
-        resource_id = resource_items[0]["resourceId"]
-        print(f"Resource ID: {resource_id}")
+        log.annotate(resources=resource_ids[:MAX_LOGGED_RESOURCES], resource_count=len(resource_ids))
 
-        current_tags_response = ec2_client.describe_tags(
-            Filters=[{'Name': 'resource-id', 'Values': [resource_id]}]
-        )
-        current_tags = current_tags_response.get('Tags', [])
-        current_tags_dict = {tag['Key']: tag['Value'] for tag in current_tags}
+        # Current tags of every resource, with one paged describe_tags per 200 IDs
+        with metrics.stage('read'):
+            current_tags = describe_ec2_tags(ec2_client, resource_ids)
 
-        mandatory_tags = [
-            {'Key': 'Division', 'Value': 'CD'},
-            {'Key': 'Studio', 'Value': 'Ajax'}
-        ]
+        # Write only the mandatory tags the resources lack, with one
+        # create_tags per distinct set of missing tags
+        groups = {}
+        for resource_id, resource_tags in current_tags.items():
+            groups.setdefault(tuple(sorted(missing(resource_tags).items())), []).append(resource_id)
 
+        outcome = 'reapplied' if event_name == 'DeleteTags' else 'tagged'
+        for tags_to_apply, group in sorted(groups.items(), key=lambda item: len(item[0])):
+            log.debug('missing tags', resources=group, tags=dict(tags_to_apply))
+            write_missing(dict(tags_to_apply), lambda delta: create_tags(ec2_client, group, delta),
+                          outcome=outcome, resources=len(group))
+
+        described = resource_ids[0] if len(resource_ids) == 1 else f"{len(resource_ids)} resources"
         if event_name == 'DeleteTags':
-            print(f"Handling DeleteTags for {resource_id}")
-            ec2_client.create_tags(
-                Resources=[resource_id],
-                Tags=[tag for tag in mandatory_tags if tag['Key'] not in current_tags_dict]
-            )
-            print(f"Re-applied mandatory tags for {resource_id}")
-            return {"statusCode": 200, "body": f"Re-applied mandatory tags for {resource_id}"}
-
-        elif event_name == 'CreateTags':
-            print(f"Handling CreateTags for {resource_id}")
-            tags_to_apply = []
-            for mandatory_tag in mandatory_tags:
-                if mandatory_tag['Key'] not in current_tags_dict:
-                    tags_to_apply.append(mandatory_tag)
-
-            if tags_to_apply:
-                ec2_client.create_tags(
-                    Resources=[resource_id],
-                    Tags=tags_to_apply
-                )
-                print(f"Added missing mandatory tags: {tags_to_apply}")
-            else:
-                print("All mandatory tags are already present.")
-            return {"statusCode": 200, "body": f"Tags validated for {resource_id}"}
+            return {"statusCode": 200, "body": f"Re-applied mandatory tags for {described}"}
+        return {"statusCode": 200, "body": f"Tags validated for {described}"}
 
     except Exception as e:
-        print(f"Error: {e}")
+        log.annotate(error=str(e))
         return {"statusCode": 500, "body": str(e)}
 
 # Lambda function for handling DynamoDB tags
-def handle_dynamodb_tags(event):
-    dynamodb_client = boto3.client('dynamodb')
-    print(f"Received event for DynamoDB: {event}")
-
+def handle_dynamodb_tags(event_detail, dynamodb_client):
     try:
-        event_detail = event.get('detail', event)
-        event_name = event_detail.get('eventName')
-        if not event_name:
-            print("Event name not found in event")
-            return {"statusCode": 400, "body": "Event name not found"}
-
-        print(f"Event name: {event_name}")
-
+        event_name = event_detail['eventName']
         user_identity = event_detail.get('userIdentity', {})
         if user_identity.get('type') == "AssumedRole" and "autotag" in user_identity.get('arn', '') and event_name == "TagResource":
-            print("Event triggered by Lambda itself; skipping to avoid loop.")
+            log.annotate(outcome='ignored own change')
             return {"statusCode": 200, "body": "Ignored event to prevent infinite loop"}
 
-        if event_name not in ['TagResource', 'UntagResource']:
-            print(f"Unsupported event: {event_name}")
-            return {"statusCode": 400, "body": f"Unsupported event: {event_name}"}
-
         resource_arn = event_detail.get("requestParameters", {}).get("resourceArn")
         if not resource_arn:
-            print("ResourceArn not found in the event")
+            log.annotate(outcome='no resource')
             return {"statusCode": 400, "body": "ResourceArn not found in the event"}
 
-        print(f"ResourceArn: {resource_arn}")
+        log.annotate(arns=[resource_arn])
 
         try:
-            current_tags_response = dynamodb_client.list_tags_of_resource(ResourceArn=resource_arn)
-            current_tags = current_tags_response.get('Tags', [])
+            with metrics.stage('read'):
+                current_tags_response = call(dynamodb_client, 'list_tags_of_resource', ResourceArn=resource_arn)
+            current_tags_dict = as_dict(current_tags_response.get('Tags', []))
         except dynamodb_client.exceptions.ClientError as e:
-            print(f"Error fetching current tags: {e}")
+            log.error('failed to fetch current tags', error=str(e))
             return {"statusCode": 500, "body": f"Error fetching tags: {str(e)}"}
+        log.debug('current tags', tags=current_tags_dict)
 
-        mandatory_tags = [
-            {'Key': 'Division', 'Value': 'CD'},
-            {'Key': 'Studio', 'Value': 'Ajax'}
-        ]
-        current_tags_dict = {tag['Key']: tag['Value'] for tag in current_tags}
-
-        if event_name == 'UntagResource':
-            print(f"Handling UntagResource for {resource_arn}")
-            dynamodb_client.tag_resource(
+        # Write only the mandatory tags the table lacks; TagResource adds to
+        # the existing tags, so they never need to be sent again
+        def write(delta):
+            call(dynamodb_client, 'tag_resource',
                 ResourceArn=resource_arn,
-                Tags=mandatory_tags
+                Tags=as_list(delta)
             )
-            print(f"Re-applied tags for {resource_arn}")
-            return {"statusCode": 200, "body": f"Tags re-applied for {resource_arn}"}
 
-        elif event_name == 'TagResource':
-            print(f"Handling TagResource for {resource_arn}")
-            tags_to_apply = current_tags.copy()
-            for mandatory_tag in mandatory_tags:
-                if mandatory_tag['Key'] not in current_tags_dict:
-                    print(f"Adding missing mandatory tag: {mandatory_tag}")
-                    tags_to_apply.append(mandatory_tag)
+        enforce(current_tags_dict, write, outcome='reapplied' if event_name == 'UntagResource' else 'tagged')
 
-            dynamodb_client.tag_resource(
-                ResourceArn=resource_arn,
-                Tags=tags_to_apply
-            )
-            print(f"Tags applied for {resource_arn}: {tags_to_apply}")
-            return {"statusCode": 200, "body": f"Tags handled for {resource_arn}"}
+        if event_name == 'UntagResource':
+            return {"statusCode": 200, "body": f"Tags re-applied for {resource_arn}"}
+        return {"statusCode": 200, "body": f"Tags handled for {resource_arn}"}
 
     except Exception as e:
-        print(f"Error: {e}")
+        log.annotate(error=str(e))
         return {"statusCode": 500, "body": str(e)}
 
-# Combined handler
+# Combined handler: routed on (eventSource, eventName) rather than by
+# searching the event for a service name
+ROUTER = dispatch.Router()
+ROUTER.add('ec2.amazonaws.com', handle_ec2_tags, ['CreateTags', 'DeleteTags'], service='ec2')
+ROUTER.add('dynamodb.amazonaws.com', handle_dynamodb_tags, ['TagResource', 'UntagResource'], service='dynamodb')
+
+
+@metrics.handler
+@log.handler
 def lambda_handler(event, context):
-    # Determine service based on event details
-    if 'ec2' in str(event).lower():
-        return handle_ec2_tags(event)
-    elif 'dynamodb' in str(event).lower():
-        return handle_dynamodb_tags(event)
-    else:
-        return {"statusCode": 400, "body": "Unsupported service in event"}
+    return ROUTER.dispatch(event)
@@ -5,24 +5,27 @@ resource "aws_cloudwatch_event_rule" "resource_creation_rule" {
   event_pattern = <<EOF
 {
   "source": [
-    "aws.s3", 
-    "aws.dynamodb", 
-    "aws.elasticfilesystem"
+    "aws.dynamodb"
+  ],
+  "detail-type": [
+    "AWS API Call via CloudTrail"
   ],
-  "detail-type": ["AWS API Call via CloudTrail"],
   "detail": {
+    "errorCode": [
+      {
+        "exists": false
+      }
+    ],
+    "readOnly": [
+      false,
+      {
+        "exists": false
+      }
+    ],
     "eventSource": [
-      
-      "s3.amazonaws.com",
-      "rds.amazonaws.com",
-      
-      "dynamodb.amazonaws.com",
-      "elasticfilesystem.amazonaws.com",
-      "es.amazonaws.com"
+      "dynamodb.amazonaws.com"
     ],
     "eventName": [
-      "PutBucketTagging",
-      "DeleteBucketTagging",
       "TagResource",
       "UntagResource"
     ]
@@ -1,10 +1,17 @@
-import boto3
+from autotag_common import log, metrics, tags
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import call
+from autotag_common.tag_cache import TAG_CACHE
 
-def lambda_handler(event, context):
-    # Initialize DynamoDB client
-    dynamodb_client = boto3.client('dynamodb')
+# The events this function handles, by EventBridge source. eventbridge.tf is
+# generated from them with tools/gen_eventbridge.py
+EVENTS = {'aws.dynamodb': ('TagResource', 'UntagResource')}
 
-    print(f"Received event: {event}")
+@metrics.handler
+@log.handler
+def lambda_handler(event, context):
+    # Reuse the pooled DynamoDB client across warm invocations
+    dynamodb_client = get_client('dynamodb')
 
     try:
         # Extract event details
@@ -13,73 +20,75 @@ def lambda_handler(event, context):
         # Capture event name
         event_name = event_detail.get('eventName')
         if not event_name:
-            print("Event name not found in event")
+            log.annotate(outcome='no event name')
             return {"statusCode": 400, "body": "Event name not found"}
 
-        print(f"Event name: {event_name}")
-
         # Prevent infinite loops
         user_identity = event_detail.get('userIdentity', {})
         if user_identity.get('type') == "AssumedRole" and "autotag" in user_identity.get('arn', '') and event_name == "TagResource":
-            print("Event triggered by Lambda itself; skipping to avoid loop.")
+            log.annotate(outcome='ignored own change')
             return {"statusCode": 200, "body": "Ignored event to prevent infinite loop"}
 
         # Supported events
-        if event_name not in ['TagResource', 'UntagResource']:
-            print(f"Unsupported event: {event_name}")
+        if event_name not in EVENTS['aws.dynamodb']:
+            log.annotate(outcome='unsupported')
             return {"statusCode": 400, "body": f"Unsupported event: {event_name}"}
 
         # Retrieve resource ARN
         resource_arn = event_detail.get("requestParameters", {}).get("resourceArn")
         if not resource_arn:
-            print("ResourceArn not found in the event")
+            log.annotate(outcome='no resource')
             return {"statusCode": 400, "body": "ResourceArn not found in the event"}
 
-        print(f"ResourceArn: {resource_arn}")
+        log.annotate(arns=[resource_arn])
 
-        # Get current tags
-        try:
-            current_tags_response = dynamodb_client.list_tags_of_resource(ResourceArn=resource_arn)
-            current_tags = current_tags_response.get('Tags', [])
-        except dynamodb_client.exceptions.ClientError as e:
-            print(f"Error fetching current tags: {e}")
-            return {"statusCode": 500, "body": f"Error fetching tags: {str(e)}"}
+        # Apply the tag changes carried by the event to the cached state, and
+        # decide from them alone where they are enough
+        request_parameters = event_detail.get("requestParameters", {})
+        if not tags.EVENT_RECONCILE:
+            # The change is not applied from the event, so the cached state is stale
+            TAG_CACHE.invalidate(resource_arn)
+            delta = None
+        elif event_name == 'TagResource':
+            added = tags.as_dict(request_parameters.get('tags', []), 'key', 'value')
+            TAG_CACHE.merge(resource_arn, added)
+            delta = tags.from_event(added=added)
+        else:
+            removed = request_parameters.get('tagKeys', [])
+            TAG_CACHE.remove(resource_arn, removed)
+            delta = tags.from_event(removed=removed)
 
-        # Define mandatory tags
-        mandatory_tags = [
-            {'Key': 'Division', 'Value': 'CD'},
-            {'Key': 'Studio', 'Value': 'Ajax'}
-        ]
-        current_tags_dict = {tag['Key']: tag['Value'] for tag in current_tags}
+        # Otherwise compare with the current tags of the resource
+        if delta is None:
+            current_tags_set = TAG_CACHE.get(resource_arn)
+            if current_tags_set is None:
+                try:
+                    with metrics.stage('read'):
+                        current_tags_response = call(dynamodb_client, 'list_tags_of_resource', ResourceArn=resource_arn)
+                    current_tags_set = tags.as_dict(current_tags_response.get('Tags', []))
+                except dynamodb_client.exceptions.ClientError as e:
+                    log.error('failed to fetch current tags', error=str(e))
+                    return {"statusCode": 500, "body": f"Error fetching tags: {str(e)}"}
+                TAG_CACHE.put(resource_arn, current_tags_set)
+            delta = tags.missing(current_tags_set)
+        log.debug('tag cache', **TAG_CACHE.stats())
 
-        # Handle UntagResource
-        if event_name == 'UntagResource':
-            print(f"Handling UntagResource for {resource_arn}")
-            # Reapply mandatory tags
-            dynamodb_client.tag_resource(
+        # Write only the mandatory tags the table lacks; TagResource adds to
+        # the existing tags, so they never need to be sent again
+        def write(delta):
+            call(dynamodb_client, 'tag_resource',
                 ResourceArn=resource_arn,
-                Tags=mandatory_tags
+                Tags=tags.as_list(delta)
             )
-            print(f"Re-applied tags for {resource_arn}")
-            return {"statusCode": 200, "body": f"Tags re-applied for {resource_arn}"}
 
-        # Handle TagResource
-        elif event_name == 'TagResource':
-            print(f"Handling TagResource for {resource_arn}")
-            # Ensure mandatory tags are present
-            tags_to_apply = current_tags.copy()
-            for mandatory_tag in mandatory_tags:
-                if mandatory_tag['Key'] not in current_tags_dict:
-                    print(f"Adding missing mandatory tag: {mandatory_tag}")
-                    tags_to_apply.append(mandatory_tag)
+        written = tags.write_missing(delta, write,
+                                     outcome='reapplied' if event_name == 'UntagResource' else 'tagged')
+        TAG_CACHE.merge(resource_arn, written)
 
-            dynamodb_client.tag_resource(
-                ResourceArn=resource_arn,
-                Tags=tags_to_apply
-            )
-            print(f"Tags applied for {resource_arn}: {tags_to_apply}")
-            return {"statusCode": 200, "body": f"Tags handled for {resource_arn}"}
+        if event_name == 'UntagResource':
+            return {"statusCode": 200, "body": f"Tags re-applied for {resource_arn}"}
+        return {"statusCode": 200, "body": f"Tags handled for {resource_arn}"}
 
     except Exception as e:
-        print(f"Error: {e}")
+        log.annotate(error=str(e))
         return {"statusCode": 500, "body": str(e)}
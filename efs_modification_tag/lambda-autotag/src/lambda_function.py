@@ -1,10 +1,17 @@
-import boto3
+from autotag_common import log, metrics, tags
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import call
+from autotag_common.tag_cache import TAG_CACHE
 
-def lambda_handler(event, context):
-    # Initialize EFS client
-    efs_client = boto3.client('efs')
+# The events this function handles, by EventBridge source. eventbridge.tf is
+# generated from them with tools/gen_eventbridge.py
+EVENTS = {'aws.elasticfilesystem': ('TagResource', 'UntagResource')}
 
-    print(f"Received event: {event}")
+@metrics.handler
+@log.handler
+def lambda_handler(event, context):
+    # Reuse the pooled EFS client across warm invocations
+    efs_client = get_client('efs')
 
     try:
         # Handle two possible structures: with or without 'detail'
@@ -13,69 +20,74 @@ def lambda_handler(event, context):
         # Capture event name
         event_name = event_detail.get('eventName')
         if not event_name:
-            print("Event name not found in event")
+            log.annotate(outcome='no event name')
             return {"statusCode": 400, "body": "Event name not found"}
 
-        print(f"Event name: {event_name}")
-
         # Avoid infinite loop
         user_identity = event_detail.get('userIdentity', {})
         if user_identity.get('type') == "AssumedRole" and "autotag" in user_identity.get('arn', '') and event_name == "TagResource":
-            print("Event triggered by Lambda itself; skipping to avoid loop.")
+            log.annotate(outcome='ignored own change')
             return {"statusCode": 200, "body": "Ignored event to prevent infinite loop"}
 
         # Handle specific events
-        if event_name not in ['TagResource', 'UntagResource']:
-            print(f"Unsupported event: {event_name}")
+        if event_name not in EVENTS['aws.elasticfilesystem']:
+            log.annotate(outcome='unsupported')
             return {"statusCode": 400, "body": f"Unsupported event: {event_name}"}
 
         # Retrieve ResourceId
         resource_id = event_detail.get("requestParameters", {}).get("resourceId")
         if not resource_id:
-            print("ResourceId not found in the event")
+            log.annotate(outcome='no resource')
             return {"statusCode": 400, "body": "ResourceId not found in the event"}
 
-        print(f"ResourceId: {resource_id}")
+        log.annotate(resources=[resource_id])
 
-        # Get current tags
-        try:
-            current_tags_response = efs_client.describe_tags(FileSystemId=resource_id)
-            current_tags = current_tags_response.get('Tags', [])
-        except efs_client.exceptions.ClientError as e:
-            print(f"Error fetching current tags: {e}")
-            return {"statusCode": 500, "body": str(e)}
-
-        # Define mandatory tags
-        mandatory_tags = [
-            {'Key': 'Division', 'Value': 'CD'},
-            {'Key': 'Studio', 'Value': 'Ajax'}
-        ]
+        # Apply the tag changes carried by the event to the cached state, and
+        # decide from them alone where they are enough
+        request_parameters = event_detail.get("requestParameters", {})
+        if not tags.EVENT_RECONCILE:
+            # The change is not applied from the event, so the cached state is stale
+            TAG_CACHE.invalidate(resource_id)
+            delta = None
+        elif event_name == 'TagResource':
+            added = tags.as_dict(request_parameters.get('tags', []), 'key', 'value')
+            TAG_CACHE.merge(resource_id, added)
+            delta = tags.from_event(added=added)
+        else:
+            removed = request_parameters.get('tagKeys', [])
+            TAG_CACHE.remove(resource_id, removed)
+            delta = tags.from_event(removed=removed)
 
-        current_tags_set = {tag['Key']: tag['Value'] for tag in current_tags}
+        # Otherwise compare with the current tags of the resource
+        if delta is None:
+            current_tags_set = TAG_CACHE.get(resource_id)
+            if current_tags_set is None:
+                try:
+                    with metrics.stage('read'):
+                        current_tags_response = call(efs_client, 'describe_tags', FileSystemId=resource_id)
+                    current_tags_set = tags.as_dict(current_tags_response.get('Tags', []))
+                except efs_client.exceptions.ClientError as e:
+                    log.error('failed to fetch current tags', error=str(e))
+                    return {"statusCode": 500, "body": str(e)}
+                TAG_CACHE.put(resource_id, current_tags_set)
+            delta = tags.missing(current_tags_set)
+        log.debug('tag cache', **TAG_CACHE.stats())
 
-        # Handle UntagResource
-        if event_name == 'UntagResource':
-            efs_client.tag_resource(
+        # Write only the mandatory tags the file system lacks
+        def write(delta):
+            call(efs_client, 'tag_resource',
                 ResourceId=resource_id,
-                Tags=mandatory_tags
+                Tags=tags.as_list(delta)
             )
-            print(f"Re-applied tags for {resource_id}")
-            return {"statusCode": 200, "body": f"Tags re-applied for {resource_id}"}
 
-        # Handle TagResource
-        elif event_name == 'TagResource':
-            for mandatory_tag in mandatory_tags:
-                if mandatory_tag['Key'] not in current_tags_set:
-                    print(f"Mandatory tag {mandatory_tag['Key']} not found, adding...")
-                    current_tags.append(mandatory_tag)
+        written = tags.write_missing(delta, write,
+                                     outcome='reapplied' if event_name == 'UntagResource' else 'tagged')
+        TAG_CACHE.merge(resource_id, written)
 
-            efs_client.tag_resource(
-                ResourceId=resource_id,
-                Tags=current_tags
-            )
-            print(f"Tags applied for {resource_id}: {current_tags}")
-            return {"statusCode": 200, "body": f"Tags handled for {resource_id}"}
+        if event_name == 'UntagResource':
+            return {"statusCode": 200, "body": f"Tags re-applied for {resource_id}"}
+        return {"statusCode": 200, "body": f"Tags handled for {resource_id}"}
 
     except Exception as e:
-        print(f"Error: {e}")
+        log.annotate(error=str(e))
         return {"statusCode": 500, "body": str(e)}
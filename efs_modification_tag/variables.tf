@@ -16,3 +16,9 @@ variable "autotag_function_name" {
   type        = string
   default     = "autotag"
 }
+
+variable "lambda_package" {
+  description = "Zip built by tools/build_package.py to deploy instead of zipping lambda-autotag/src. Empty zips the sources"
+  type        = string
+  default     = ""
+}
@@ -5,26 +5,29 @@ resource "aws_cloudwatch_event_rule" "resource_creation_rule" {
   event_pattern = <<EOF
 {
   "source": [
-    "aws.s3", 
-    "aws.dynamodb", 
-    "aws.elasticfilesystem"
+    "aws.s3"
+  ],
+  "detail-type": [
+    "AWS API Call via CloudTrail"
   ],
-  "detail-type": ["AWS API Call via CloudTrail"],
   "detail": {
+    "errorCode": [
+      {
+        "exists": false
+      }
+    ],
+    "readOnly": [
+      false,
+      {
+        "exists": false
+      }
+    ],
     "eventSource": [
-      
-      "s3.amazonaws.com",
-      "rds.amazonaws.com",
-      
-      "dynamodb.amazonaws.com",
-      "elasticfilesystem.amazonaws.com",
-      "es.amazonaws.com"
+      "s3.amazonaws.com"
     ],
     "eventName": [
-      "PutBucketTagging",
       "DeleteBucketTagging",
-      "TagResource",
-      "UntagResource"
+      "PutBucketTagging"
     ]
   }
 }
@@ -1,96 +1,117 @@
-import boto3
+from autotag_common import log, metrics, tags
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import call
+from autotag_common.tag_cache import TAG_CACHE
 
+# The events this function handles, by EventBridge source. eventbridge.tf is
+# generated from them with tools/gen_eventbridge.py
+EVENTS = {'aws.s3': ('PutBucketTagging', 'DeleteBucketTagging')}
+
+def get_event_tag_set(request_parameters):
+    """Tags set by a PutBucketTagging call as {Key: Value}, or None if absent."""
+    tag_set = (request_parameters.get('Tagging') or {}).get('TagSet')
+    if not isinstance(tag_set, dict):
+        return None
+    tags = tag_set.get('Tag') or []
+    if isinstance(tags, dict):
+        tags = [tags]
+    return {tag['Key']: tag['Value'] for tag in tags}
+
+@metrics.handler
+@log.handler
 def lambda_handler(event, context):
-    # Initialize the S3 client inside the handler function
-    s3_client = boto3.client('s3')
-    
-    # Log the entire incoming event
-    print(f"Received event: {event}")  
+    # Reuse the pooled S3 client across warm invocations
+    s3_client = get_client('s3')
 
     try:
         # Check if 'detail' is in the event
         if 'detail' not in event:
-            print("Missing 'detail' in event")  # Log missing detail
+            log.annotate(outcome='no detail')
             return {"statusCode": 400, "body": "Missing 'detail' in event"}
 
         # Capture event name from the nested 'detail' key
         event_name = event['detail'].get('eventName')
-        print(f"Event name: {event_name}")  # Log the event name
         
         if 'userIdentity' in event['detail']:
             user_identity = event['detail']['userIdentity']['type']
             role_arn = event['detail']['userIdentity']['arn']
             if user_identity == "AssumedRole" and "autotag" in role_arn and event_name == "PutBucketTagging":
-                print("Event triggered by Lambda itself; skipping to avoid loop.")
+                log.annotate(outcome='ignored own change')
                 return {"statusCode": 200, "body": "Ignored event to prevent infinite loop"}
 
         # Handle only specific events
-        if event_name not in ['PutBucketTagging', 'DeleteBucketTagging']:
-            print(f"Unsupported event: {event_name}")  # Log unsupported event
+        if event_name not in EVENTS['aws.s3']:
+            log.annotate(outcome='unsupported')
             return {"statusCode": 400, "body": f"Unsupported event: {event_name}"}
 
         # Extract bucket name from the 'requestParameters' key within 'detail'
         bucket_name = event["detail"]["requestParameters"].get("bucketName")
-        print(f"Bucket name: {bucket_name}")  # Log the bucket name
 
         # Check if bucket_name was extracted correctly
         if not bucket_name:
-            print("Bucket name not found in the event")  # Log missing bucket name
+            log.annotate(outcome='no resource')
             return {"statusCode": 400, "body": "Bucket name not found in the event"}
 
+        # Both events carry the bucket's complete tag set, so refresh the cached
+        # state from them unless AUTOTAG_EVENT_RECONCILE=off
+        bucket_arn = 'arn:aws:s3:::' + bucket_name
+        log.annotate(arns=[bucket_arn])
+        if event_name == 'DeleteBucketTagging':
+            event_tags = {}
+        else:
+            event_tags = get_event_tag_set(event["detail"]["requestParameters"])
+        current_tags_set = None
+        if event_tags is not None and tags.EVENT_RECONCILE:
+            TAG_CACHE.put(bucket_arn, event_tags)
+            # The event alone decides what is missing, so nothing needs to be read
+            if tags.from_event(replaced=event_tags) is not None:
+                current_tags_set = event_tags
+        else:
+            # The change is not applied from the event, so the cached state is stale
+            TAG_CACHE.invalidate(bucket_arn)
+
         # Retrieve current tags to check if the Lambda has already processed this bucket
-        try:
-            current_tags_response = s3_client.get_bucket_tagging(Bucket=bucket_name)
-            current_tags = current_tags_response['TagSet']
-        except s3_client.exceptions.ClientError as e:
-            # Handle the case where the bucket has no tags set yet
-            if e.response['Error']['Code'] == 'NoSuchTagSet':
-                current_tags = []
-            else:
-                print(f"Error fetching current tags: {e}")
-                return {"statusCode": 500, "body": str(e)}
+        if current_tags_set is None:
+            current_tags_set = TAG_CACHE.get(bucket_arn)
+        if current_tags_set is None:
+            try:
+                with metrics.stage('read'):
+                    current_tags_response = call(s3_client, 'get_bucket_tagging', Bucket=bucket_name)
+                current_tags = current_tags_response['TagSet']
+            except s3_client.exceptions.ClientError as e:
+                # Handle the case where the bucket has no tags set yet
+                if e.response['Error']['Code'] == 'NoSuchTagSet':
+                    current_tags = []
+                else:
+                    log.error('failed to fetch current tags', error=str(e))
+                    return {"statusCode": 500, "body": str(e)}
+            current_tags_set = tags.as_dict(current_tags)
+            TAG_CACHE.put(bucket_arn, current_tags_set)
+        log.debug('tag cache', **TAG_CACHE.stats())
 
         # Check if Lambda has already processed this bucket by looking for 'LambdaProcessed' tag
-        current_tags_set = {tag['Key']: tag['Value'] for tag in current_tags}
         if current_tags_set.get("LambdaProcessed") == "True":
-            print("Bucket already processed by Lambda, skipping...")
+            log.annotate(outcome='already processed')
+            metrics.count('WritesSkipped')
             return {"statusCode": 200, "body": "Bucket already processed by Lambda"}
 
-        # Define mandatory tags to be applied
-        mandatory_tags = [
-            {'Key': 'Division', 'Value': 'CD'},
-            {'Key': 'Studio', 'Value': 'Ajax'}  
-        ]
-
-        # Handle DeleteBucketTagging by re-applying the mandatory tags
-        if event_name == 'DeleteBucketTagging':
-            response = s3_client.put_bucket_tagging(
+        # put_bucket_tagging replaces the whole tag set, so it is only called
+        # when a mandatory tag is missing, and then with the existing tags
+        # (except the reserved aws: ones) plus the missing ones
+        def write(delta):
+            tag_set = {key: value for key, value in current_tags_set.items() if not key.startswith('aws:')}
+            tag_set.update(delta)
+            call(s3_client, 'put_bucket_tagging',
                 Bucket=bucket_name,
-                Tagging={'TagSet': mandatory_tags}
+                Tagging={'TagSet': tags.as_list(tag_set)}
             )
-            print(f"Re-applied tags for {bucket_name}")  # Log the re-application action
-            print(f"Response from put_bucket_tagging: {response}")  # Log the response
-
-        # Handle PutBucketTagging
-        elif event_name == 'PutBucketTagging':
-            # Check for mandatory tags and ensure they are present
-            for mandatory_tag in mandatory_tags:
-                if mandatory_tag['Key'] not in current_tags_set:
-                    print(f"Mandatory tag {mandatory_tag['Key']} not found, adding...")  # Log missing tag
-                    current_tags.append(mandatory_tag)  # Add mandatory tag if missing
-                else:
-                    print(f"Mandatory tag {mandatory_tag['Key']} already present.")
 
-            # Re-apply the tags including mandatory ones
-            response = s3_client.put_bucket_tagging(
-                Bucket=bucket_name,
-                Tagging={'TagSet': current_tags}
-            )
-            print(f"Tags applied for {bucket_name}: {current_tags}")  # Log the applied tags
-            print(f"Response from put_bucket_tagging: {response}")  # Log the response
+        written = tags.enforce(current_tags_set, write,
+                               outcome='reapplied' if event_name == 'DeleteBucketTagging' else 'tagged')
+        TAG_CACHE.merge(bucket_arn, written)
 
         return {"statusCode": 200, "body": f"Tags handled for {bucket_name}"}
     
     except Exception as e:
-        print(f"Error: {e}")  # Log any error encountered
+        log.annotate(error=str(e))
         return {"statusCode": 500, "body": str(e)}
@@ -5,86 +5,59 @@ resource "aws_cloudwatch_event_rule" "resource_creation_rule" {
   event_pattern = <<EOF
 {
   "source": [
+    "aws.dynamodb",
     "aws.ec2",
-    "aws.elasticloadbalancing", 
-    "aws.rds", 
-    "aws.lambda", 
-    "aws.s3", 
-    "aws.dynamodb", 
-    "aws.elasticfilesystem", 
-    "aws.es", 
-    "aws.sqs", 
-    "aws.sns", 
-    "aws.kms", 
-    "aws.ecs", 
-    "aws.redshift", 
-    "aws.redshift-serverless", 
-    "aws.sagemaker", 
-    "aws.monitoring", 
-    "aws.logs", 
-    "aws.kafka", 
-    "aws.amazonmq"
+    "aws.elasticfilesystem",
+    "aws.s3"
+  ],
+  "detail-type": [
+    "AWS API Call via CloudTrail"
   ],
-  "detail-type": ["AWS API Call via CloudTrail"],
   "detail": {
-    "eventSource": [
-      "ec2.amazonaws.com",
-      "elasticloadbalancing.amazonaws.com",
-      "s3.amazonaws.com",
-      "rds.amazonaws.com",
-      "lambda.amazonaws.com",
-      "dynamodb.amazonaws.com",
-      "elasticfilesystem.amazonaws.com",
-      "es.amazonaws.com",
-      "sqs.amazonaws.com",
-      "sns.amazonaws.com",
-      "kms.amazonaws.com",
-      "redshift.amazonaws.com",
-      "redshift-serverless.amazonaws.com",
-      "sagemaker.amazonaws.com",
-      "ecs.amazonaws.com",
-      "monitoring.amazonaws.com",
-      "logs.amazonaws.com",
-      "kafka.amazonaws.com",
-      "amazonmq.amazonaws.com"
+    "errorCode": [
+      {
+        "exists": false
+      }
+    ],
+    "readOnly": [
+      false,
+      {
+        "exists": false
+      }
     ],
-    "eventName": [
-      "RunInstances",
-      "CreateVpc",
-      "CreateSecurityGroup",
-      "CreateSubnet",
-      "CreateFunction20150331",
-      "CreateBucket",
-      "CreateDBInstance",
-      "CreateTable",
-      "CreateVolume",
-      "CreateLoadBalancer",
-      "CreateInternetGateway",
-      "CreateNatGateway",
-      "AllocateAddress",
-      "CreateVpcEndpoint",
-      "CreateTransitGateway",
-      "CreateMountTarget",
-      "CreateDomain",
-      "CreateQueue",
-      "CreateTopic",
-      "CreateKey",
-      "CreateCluster",
-      "CreateClusterV2",
-      "CreateNotebookInstance",
-      "PutMetricAlarm",
-      "CreateLogGroup",
-      "CreateBroker",
-      "CreateNamespace",
-      "CreateWorkgroup",
-      "CreateProcessingJob",
-      "CreateEndpoint",
-      "CreateModel",
-      "CreateLabelingJob",
-      "CreateTrainingJob",
-      "CreateTransformJob",
-      "CreateUserProfile",
-      "CreateWorkteam"
+    "$or": [
+      {
+        "eventSource": [
+          "dynamodb.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateTable"
+        ]
+      },
+      {
+        "eventSource": [
+          "ec2.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateVpcEndpoint"
+        ]
+      },
+      {
+        "eventSource": [
+          "elasticfilesystem.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateMountTarget"
+        ]
+      },
+      {
+        "eventSource": [
+          "s3.amazonaws.com"
+        ],
+        "eventName": [
+          "CreateBucket"
+        ]
+      }
     ]
   }
 }
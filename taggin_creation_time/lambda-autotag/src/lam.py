@@ -1,8 +1,9 @@
 import boto3
 import os
 import json
-from datetime import datetime, timezone, timedelta
-from dateutil import tz
+
+from autotag_common.identity import get_created_by_identity
+from autotag_common.timeconv import convert_event_time
 
 def aws_ec2(event):
     arnList = []
@@ -321,23 +322,6 @@ def aws_elasticfilesystem(event):
 #         arnList.append('arn:aws:glue:{}:{}:namespace/{}'.format(event['region'], event['account'], namespace_name))
 #     return arnList
   
-def get_created_by_identity(event):
-    if event['detail']['userIdentity']['type'] == 'IAMUser':
-        return event['detail']['userIdentity']['userName']
-    else:
-        arn_parts = event['detail']["userIdentity"]["arn"].split(":")
-        return "/".join(arn_parts[5:])
-
-def convert_to_ist_time(utc_time_str):
-    from_zone = tz.gettz("UTC")
-    to_zone = tz.gettz("Asia/Kolkata")  # IST timezone
-
-    utc_time = datetime.strptime(utc_time_str, "%Y-%m-%dT%H:%M:%SZ")
-    utc_time = utc_time.replace(tzinfo=from_zone)
-
-    ist_time = utc_time.astimezone(to_zone)
-    return ist_time.strftime("%Y-%m-%d %H:%M:%S %Z")
-
 def lambda_handler(event, context):
     print(f"input event is: {event}")
     print("new source is ", event['source'])
@@ -350,7 +334,7 @@ def lambda_handler(event, context):
 
     _res_tags = {
         'CreatedBy': get_created_by_identity(event),
-        'CreatedOn': convert_to_ist_time(event_time_utc_str),
+        'CreatedOn': convert_event_time(event_time_utc_str),
         'Division': 'CD',  
         'Studio': 'Ajax'}
     boto3.client('resourcegroupstaggingapi').tag_resources(
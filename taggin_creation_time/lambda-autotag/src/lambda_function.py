@@ -1,103 +1,96 @@
-import boto3
-import os
 import json
-from datetime import datetime
-from dateutil import tz
 
-def aws_ec2(event):
-    arnList = []
-    _account = event['account']
-    _region = event['region']
-    vpcEndpointArnTemplate = 'arn:aws:ec2:@region@:@account@:vpc-endpoint/@vpcEndpointId@' 
-    #ec2_resource = boto3.resource('ec2')
-    if event['detail']['eventName'] == 'RunInstances':
-        print("tagging for new EC2...")
-    
-    elif event['detail']['eventName'] == 'CreateVpcEndpoint':
-        print("tagging for new VPC Endpoint...")
-        vpcEndpointId = event['detail']['responseElements']['CreateVpcEndpointResponse']['vpcEndpoint']['vpcEndpointId']
-        arnList.append(vpcEndpointArnTemplate.replace('@region@', _region).replace('@account@', _account).replace('@vpcEndpointId@', vpcEndpointId))
-        
-   
+from autotag_common import log, metrics
+from autotag_common.clients import get_client
+from autotag_common.deferral import NotReady, defer, get_queue, is_deferred
+from autotag_common.extractors import extract_arns, lookup
+from autotag_common.ratelimit import call
+from autotag_common.tags import MANDATORY_TAGS
+from autotag_common.identity import get_created_by_identity
+from autotag_common.timeconv import convert_event_time
 
-def aws_s3(event):
-    arnList = []
-    if event['detail']['eventName'] == 'CreateBucket':
-        print("tagging for new S3...")
-        _bkcuetName = event['detail']['requestParameters']['bucketName']
-        arnList.append('arn:aws:s3:::' + _bkcuetName)
-    return arnList
-        
+# The events this function tags, each through its entry in the shared
+# extractor registry
+EVENTS = {
+    'aws.ec2': ('CreateVpcEndpoint',),
+    'aws.s3': ('CreateBucket',),
+    'aws.dynamodb': ('CreateTable',),
+    'aws.elasticfilesystem': ('CreateMountTarget',),
+}
 
+def tag_event(event, attempt=0):
+    event_name = event['detail']['eventName']
+    extractor = lookup(event['source'], event_name) if event_name in EVENTS.get(event['source'], ()) else None
+    if extractor is None:
+        log.debug('unsupported event', **log.event_fields(event))
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Unsupported event ' + event['source'] + ' ' + event_name)
+        }
 
-def aws_dynamodb(event):
-    arnList = []
-    if event['detail']['eventName'] == 'CreateTable':
-        table_name = event['detail']['responseElements']['tableDescription']['tableName']
-        waiter = boto3.client('dynamodb').get_waiter('table_exists')
-        waiter.wait(
-            TableName=table_name,
-            WaiterConfig={
-                'Delay': 123,
-                'MaxAttempts': 123
+    log.debug('tagging new ' + extractor.label, **log.event_fields(event))
+    try:
+        with metrics.stage('extract'):
+            resARNs = extract_arns(extractor, event)
+    except NotReady as e:
+        # Park the event and re-check later instead of blocking on a waiter
+        if defer(event, attempt):
+            log.debug('deferred', reason=str(e), attempt=attempt + 1, **log.event_fields(event))
+            return {
+                'statusCode': 202,
+                'body': json.dumps('Deferred tagging with ' + event['source'])
             }
-        )
-        arnList.append(event['detail']['responseElements']['tableDescription']['tableArn'])
-    return arnList
-        
-
-        
-def aws_elasticfilesystem(event):
-    arnList = []
-    _account = event['account']
-    _region = event['region']
-    efsArnTemplate = 'arn:aws:elasticfilesystem:@region@:@account@:file-system/@fileSystemId@'
-    if event['detail']['eventName'] == 'CreateMountTarget':
-        print("tagging for new efs...")
-        _efsId = event['detail']['responseElements']['fileSystemId']
-        arnList.append(efsArnTemplate.replace('@region@', _region).replace('@account@', _account).replace('@fileSystemId@', _efsId))
-    return arnList
-        
-
-  
-def get_created_by_identity(event):
-    if event['detail']['userIdentity']['type'] == 'IAMUser':
-        return event['detail']['userIdentity']['userName']
-    else:
-        arn_parts = event['detail']["userIdentity"]["arn"].split(":")
-        return "/".join(arn_parts[5:])
-
-def convert_to_ist_time(utc_time_str):
-    from_zone = tz.gettz("UTC")
-    to_zone = tz.gettz("Asia/Kolkata")  # IST timezone
-
-    utc_time = datetime.strptime(utc_time_str, "%Y-%m-%dT%H:%M:%SZ")
-    utc_time = utc_time.replace(tzinfo=from_zone)
-
-    ist_time = utc_time.astimezone(to_zone)
-    return ist_time.strftime("%Y-%m-%d %H:%M:%S %Z")
-
-def lambda_handler(event, context):
-    print(f"input event is: {event}")
-    print("new source is ", event['source'])
-    _method = event['source'].replace('.', "_")
-
-    resARNs = globals()[_method](event)
-    print("resource arn is: ", resARNs)
+        log.warning('not ready; giving up', reason=str(e), attempts=attempt, **log.event_fields(event))
+        return {
+            'statusCode': 504,
+            'body': json.dumps('Resource not ready for tagging with ' + event['source'])
+        }
+    log.annotate(arns=resARNs)
+    metrics.count('ArnsExtracted', len(resARNs), Source=event['source'], EventName=event_name)
+    if not resARNs:
+        return {
+            'statusCode': 200,
+            'body': json.dumps('Nothing to tag for ' + event['source'])
+        }
 
     event_time_utc_str = event["detail"]["eventTime"]
 
     _res_tags = {
         'CreatedBy': get_created_by_identity(event),
-        'CreatedOn': convert_to_ist_time(event_time_utc_str),
-        'Division': 'CD',  
-        'Studio': 'Ajax'}
-    boto3.client('resourcegroupstaggingapi').tag_resources(
-        ResourceARNList=resARNs,
-        Tags=_res_tags
-    )
+        'CreatedOn': convert_event_time(event_time_utc_str),
+        **MANDATORY_TAGS}
+    with metrics.stage('write'):
+        call(get_client('resourcegroupstaggingapi'), 'tag_resources',
+            ResourceARNList=resARNs,
+            Tags=_res_tags
+        )
+    metrics.count('ResourcesTagged', len(resARNs))
+    metrics.count('TagsWritten', len(resARNs) * len(_res_tags))
 
     return {
         'statusCode': 200,
         'body': json.dumps('Finished tagging with ' + event['source'])
     }
+
+def retry_deferred(bodies):
+    """Re-check events parked by defer(). A re-check that fails is logged and
+    does not affect the others or the event being handled."""
+    for body in bodies:
+        if not is_deferred(body):
+            continue
+        try:
+            response = tag_event(body['event'], body['attempt'])
+        except Exception as e:
+            log.error('deferred re-check failed', error=str(e), attempt=body['attempt'],
+                      **log.event_fields(body['event']))
+            continue
+        log.info('deferred re-check', status=response['statusCode'], attempt=body['attempt'],
+                 **log.event_fields(body['event']))
+
+@metrics.handler
+@log.handler
+def lambda_handler(event, context):
+    # Events parked in the container-local queue are due for a re-check
+    retry_deferred(get_queue().receive())
+
+    return tag_event(event)
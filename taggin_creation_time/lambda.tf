@@ -1,18 +1,40 @@
 #===================== Lambda Deployment Package=====================#
 data "archive_file" "lambda_autotag" {
-  type = "zip"
-
-  source_dir  = "${path.module}/lambda-autotag/src"
+  type        = "zip"
   output_path = "${path.module}/lambda-autotag/lambda_package.zip"
+
+  dynamic "source" {
+    for_each = setsubtract(fileset("${path.module}/lambda-autotag/src", "*.py"), ["test.py", "lam.py"])
+    content {
+      content  = file("${path.module}/lambda-autotag/src/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared helpers (client pool etc.) imported as autotag_common.*
+  dynamic "source" {
+    for_each = fileset("${path.module}/../autotag_common", "*.py")
+    content {
+      content  = file("${path.module}/../autotag_common/${source.value}")
+      filename = "autotag_common/${source.value}"
+    }
+  }
+}
+
+# A minimal, precompiled package from tools/build_package.py replaces the
+# archive above when var.lambda_package is set
+locals {
+  lambda_package      = var.lambda_package != "" ? var.lambda_package : data.archive_file.lambda_autotag.output_path
+  lambda_package_hash = try(filebase64sha256(var.lambda_package), data.archive_file.lambda_autotag.output_base64sha256)
 }
 
 #======================== Lambda Fucntion ========================#
 resource "aws_lambda_function" "autotag" {
   function_name = var.autotag_function_name
   role          = aws_iam_role.lambda_exec_role.arn
-  filename      = "${path.module}/lambda-autotag/lambda_package.zip"
+  filename      = local.lambda_package
 
-  source_code_hash = data.archive_file.lambda_autotag.output_base64sha256
+  source_code_hash = local.lambda_package_hash
 
   runtime     = "python3.9"
   handler     = "lambda_function.lambda_handler"
@@ -0,0 +1,107 @@
+"""Fixtures shared by the tests.
+
+AWS is replaced by FakeClients seeded into the client pool, so no test
+needs boto3. Every test starts with an empty pool, an unlimited rate
+limiter, no retry sleeps, a fresh idempotency store and deferral queue,
+and an empty tag cache.
+"""
+import importlib.util
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from autotag_common import clients, ratelimit, tagging
+from autotag_common.deferral import set_queue
+from autotag_common.idempotency import IdempotencyStore, set_store
+from autotag_common.tag_cache import TAG_CACHE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ClientError(Exception):
+    """Shaped like botocore's ClientError: the code is in response['Error']['Code']."""
+
+    def __init__(self, code, message=''):
+        super().__init__(f'{code}: {message}')
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class FakeClient:
+    """A boto3 client whose operations are plain functions.
+
+    `handlers` maps an operation name to a function of the call's keyword
+    arguments, returning the response or raising. Calls are recorded in
+    `calls` as (operation, kwargs). A paginated operation returns its
+    handler's response as the only page.
+    """
+
+    def __init__(self, service, region=None, **handlers):
+        self.meta = SimpleNamespace(service_model=SimpleNamespace(service_name=service), region_name=region)
+        self.exceptions = SimpleNamespace(ClientError=ClientError)
+        self.handlers = handlers
+        self.calls = []
+
+    def __getattr__(self, operation):
+        if operation.startswith('_') or operation not in self.handlers:
+            raise AttributeError(operation)
+
+        def method(**kwargs):
+            self.calls.append((operation, kwargs))
+            return self.handlers[operation](**kwargs)
+        return method
+
+    def get_paginator(self, operation):
+        # One page per paginate(); PaginationConfig is consumed by the paginator, not the operation
+        def paginate(PaginationConfig=None, **kwargs):
+            return [getattr(self, operation)(**kwargs)]
+        return SimpleNamespace(paginate=paginate)
+
+    def operations(self):
+        return [operation for operation, _ in self.calls]
+
+
+class Aws:
+    """Installs FakeClients in the client pool for the current test."""
+
+    error = ClientError
+
+    def client(self, service, region=None, **handlers):
+        fake = FakeClient(service, region, **handlers)
+        clients.install(service, fake, region)
+        return fake
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    clients.clear()
+    limiter = ratelimit.RateLimiter(rates={}, default_rate=0)
+    monkeypatch.setattr(ratelimit, 'LIMITER', limiter)
+    monkeypatch.setattr(tagging, 'LIMITER', limiter)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    set_store(IdempotencyStore())
+    set_queue(None)
+    TAG_CACHE._entries.clear()
+    yield
+    clients.clear()
+    set_store(None)
+    set_queue(None)
+    TAG_CACHE._entries.clear()
+
+
+@pytest.fixture
+def aws():
+    return Aws()
+
+
+@pytest.fixture
+def load_lambda():
+    """Import a function's lambda_function.py under a name of its own."""
+    def load(function_dir):
+        path = os.path.join(ROOT, function_dir, 'lambda-autotag', 'src', 'lambda_function.py')
+        spec = importlib.util.spec_from_file_location(f'test_{function_dir}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return load
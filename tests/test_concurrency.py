@@ -0,0 +1,80 @@
+"""The shared pool that fans multi-resource events out."""
+import threading
+
+import pytest
+
+from autotag_common import concurrency
+from autotag_common.concurrency import map_concurrent
+
+
+@pytest.fixture(autouse=True)
+def fresh_semaphores(monkeypatch):
+    monkeypatch.setattr(concurrency, '_SEMAPHORES', {})
+
+
+class Gauge:
+    """Tracks how many calls run at once, holding each until `release` is set."""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+
+    def __call__(self, item):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            if self.running >= self.expected:
+                self.release.set()
+        self.release.wait(1)
+        with self.lock:
+            self.running -= 1
+        return item
+
+
+def test_results_keep_item_order():
+    assert map_concurrent(lambda n: n * n, range(20)) == [n * n for n in range(20)]
+
+
+def test_first_error_is_raised_or_returned():
+    def fail_odd(n):
+        if n % 2:
+            raise ValueError(n)
+        return n
+    with pytest.raises(ValueError) as error:
+        map_concurrent(fail_odd, range(6))
+    assert error.value.args == (1,)
+    results = map_concurrent(fail_odd, range(4), return_exceptions=True)
+    assert results[0::2] == [0, 2]
+    assert [e.args for e in results[1::2]] == [(1,), (3,)]
+
+
+def test_nested_calls_run_inline():
+    outer_threads = []
+
+    def outer(n):
+        outer_threads.append(threading.current_thread())
+        inner = map_concurrent(lambda m: threading.current_thread(), range(3))
+        return set(inner) == {threading.current_thread()}
+    assert all(map_concurrent(outer, range(4)))
+    assert all(thread.name.startswith('autotag') for thread in outer_threads)
+
+
+def test_limit_bounds_one_call():
+    gauge = Gauge(expected=2)
+    map_concurrent(gauge, range(8), limit=2)
+    assert gauge.peak == 2
+
+
+def test_service_limit_is_shared_across_calls(monkeypatch):
+    monkeypatch.setenv('AUTOTAG_SERVICE_CONCURRENCY', 'ec2=3')
+    gauge = Gauge(expected=3)
+    callers = [threading.Thread(target=map_concurrent, args=(gauge, range(4)), kwargs={'service': 'ec2'})
+               for _ in range(2)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert gauge.peak == 3
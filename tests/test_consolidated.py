@@ -0,0 +1,68 @@
+"""The consolidated handlers: one summary record per invocation, calls through the limiter."""
+import importlib.util
+import json
+import os
+
+import pytest
+
+from autotag_common import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EC2_HANDLERS = ['combined', 'best_practises', 'db_vpc']
+S3_HANDLERS = ['combined', 'best_practises', 's3_efs']
+
+
+def load(name):
+    spec = importlib.util.spec_from_file_location(f'consolidated_{name}',
+                                                  os.path.join(ROOT, 'consolidated_code', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def invocation(capsys):
+    (record,) = [record for record in records(capsys) if record.get('msg') == 'invocation']
+    return record
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    counted = []
+    count = metrics.count
+    monkeypatch.setattr(metrics, 'count', lambda name, value=1, **dimensions: (
+        counted.append(dimensions['Operation']) if name == 'ApiCalls' else None, count(name, value, **dimensions)))
+    return counted
+
+
+@pytest.mark.parametrize('name', EC2_HANDLERS)
+def test_ec2_event_is_summarised_without_tags(name, aws, capsys, api_calls):
+    aws.client('ec2', describe_tags=lambda Filters: {'Tags': []}, create_tags=lambda **kwargs: {})
+    event = {'source': 'aws.ec2', 'detail': {
+        'eventSource': 'ec2.amazonaws.com', 'eventName': 'CreateTags', 'userIdentity': {'type': 'IAMUser'},
+        'requestParameters': {'resourcesSet': {'items': [{'resourceId': f'i-{n}'} for n in range(30)]}},
+    }}
+    assert load(name).lambda_handler(event, None)['statusCode'] == 200
+    assert api_calls == ['describe_tags', 'create_tags']
+    record = invocation(capsys)
+    assert (record['outcome'], record['resource_count'], len(record['resources'])) == ('tagged', 30, 20)
+    assert 'tags' not in record
+
+
+@pytest.mark.parametrize('name', S3_HANDLERS)
+def test_s3_event_goes_through_the_limiter(name, aws, capsys, api_calls):
+    def get_bucket_tagging(Bucket):
+        raise aws.error('NoSuchTagSet')
+    aws.client('s3', get_bucket_tagging=get_bucket_tagging, put_bucket_tagging=lambda **kwargs: {})
+    event = {'source': 'aws.s3', 'detail': {
+        'eventSource': 's3.amazonaws.com', 'eventName': 'DeleteBucketTagging', 'userIdentity': {'type': 'IAMUser'},
+        'requestParameters': {'bucketName': 'b'},
+    }}
+    assert load(name).lambda_handler(event, None)['statusCode'] == 200
+    assert api_calls == ['get_bucket_tagging', 'put_bucket_tagging']
+    record = invocation(capsys)
+    assert (record['arns'], record['outcome']) == (['arn:aws:s3:::b'], 'tagged')
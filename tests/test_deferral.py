@@ -0,0 +1,119 @@
+"""Parking not-yet-ready events instead of blocking on waiters."""
+import json
+
+import pytest
+
+from autotag_common.deferral import MAX_DELAY, LocalDelayQueue, SqsDelayQueue, backoff, defer, set_queue
+
+REGION = 'us-east-1'
+ACCOUNT = '123456789012'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_doubles_within_jitter_and_is_capped(monkeypatch):
+    monkeypatch.setenv('AUTOTAG_DEFERRAL_BASE_DELAY', '30')
+    for attempt in range(4):
+        delay = 30 * 2 ** attempt
+        assert delay / 2 <= backoff(attempt) <= delay
+    assert MAX_DELAY / 2 <= backoff(20) <= MAX_DELAY
+
+
+def test_defer_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setenv('AUTOTAG_DEFERRAL_MAX_ATTEMPTS', '2')
+    queue = LocalDelayQueue()
+    assert defer({'id': 'e'}, 0, queue)
+    assert defer({'id': 'e'}, 1, queue)
+    assert not defer({'id': 'e'}, 2, queue)
+    assert len(queue) == 2
+
+
+def test_local_queue_returns_events_once_due():
+    clock = Clock()
+    queue = LocalDelayQueue(clock=clock)
+    queue.send({'n': 2}, 60)
+    queue.send({'n': 1}, 30)
+    assert queue.receive() == []
+    clock.now += 30
+    assert queue.receive() == [{'n': 1}]
+    clock.now += MAX_DELAY
+    assert queue.receive() == [{'n': 2}]
+    assert len(queue) == 0
+
+
+def test_sqs_queue_caps_delay(aws):
+    sqs = aws.client('sqs', send_message=lambda **kwargs: {})
+    SqsDelayQueue('https://sqs/q').send({'deferred': True, 'attempt': 1, 'event': {}}, 5000)
+    (_, kwargs), = sqs.calls
+    assert kwargs['DelaySeconds'] == MAX_DELAY
+    assert json.loads(kwargs['MessageBody'])['attempt'] == 1
+
+
+def create_table_event(event_id='e-1'):
+    return {
+        'source': 'aws.dynamodb', 'region': REGION, 'account': ACCOUNT,
+        'detail': {
+            'eventID': event_id, 'eventName': 'CreateTable', 'eventTime': '2024-10-24T09:20:40Z',
+            'userIdentity': {'type': 'IAMUser', 'userName': 'alice'},
+            'responseElements': {'tableDescription': {
+                'tableName': 't', 'tableArn': f'arn:aws:dynamodb:{REGION}:{ACCOUNT}:table/t'}},
+        },
+    }
+
+
+@pytest.fixture
+def creation_time(aws, load_lambda):
+    """taggin_creation_time with a table that is CREATING until `status['table']` changes."""
+    status = {'table': 'CREATING'}
+    aws.client('dynamodb', REGION, describe_table=lambda **kwargs: {'Table': {'TableStatus': status['table']}})
+    api = aws.client('resourcegroupstaggingapi', tag_resources=lambda **kwargs: {'FailedResourcesMap': {}})
+    clock = Clock()
+    queue = LocalDelayQueue(clock=clock)
+    set_queue(queue)
+    return load_lambda('taggin_creation_time'), status, api, queue, clock
+
+
+def test_creating_table_is_deferred_not_waited_for(creation_time):
+    function, status, api, queue, clock = creation_time
+    response = function.lambda_handler(create_table_event(), None)
+    assert response['statusCode'] == 202
+    assert api.calls == []
+    assert len(queue) == 1
+
+    status['table'] = 'ACTIVE'
+    clock.now += MAX_DELAY
+    function.lambda_handler(create_table_event('e-2'), None)
+    assert [kwargs['ResourceARNList'] for _, kwargs in api.calls] == [
+        [f'arn:aws:dynamodb:{REGION}:{ACCOUNT}:table/t']] * 2
+
+
+def test_failing_recheck_does_not_fail_the_current_event(creation_time, aws):
+    function, status, api, queue, clock = creation_time
+    function.lambda_handler(create_table_event(), None)
+
+    def describe_table(**kwargs):
+        raise aws.error('AccessDeniedException')
+    aws.client('dynamodb', REGION, describe_table=describe_table)
+    clock.now += MAX_DELAY
+    bucket = {
+        'source': 'aws.s3', 'region': REGION, 'account': ACCOUNT,
+        'detail': {'eventID': 'e-2', 'eventName': 'CreateBucket', 'eventTime': '2024-10-24T09:20:40Z',
+                   'userIdentity': {'type': 'IAMUser', 'userName': 'alice'},
+                   'requestParameters': {'bucketName': 'b'}},
+    }
+    assert function.lambda_handler(bucket, None)['statusCode'] == 200
+    assert api.calls[-1][1]['ResourceARNList'] == ['arn:aws:s3:::b']
+
+
+def test_unknown_source_is_rejected(creation_time):
+    function = creation_time[0]
+    event = {'source': 'aws.unknown', 'detail': {'eventName': 'CreateThing'}}
+    assert function.lambda_handler(event, None)['statusCode'] == 400
+    event = {'source': 'aws.ec2', 'detail': {'eventName': 'RunInstances'}}
+    assert function.lambda_handler(event, None)['statusCode'] == 400
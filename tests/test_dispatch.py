@@ -0,0 +1,51 @@
+"""Routing CloudTrail events on (eventSource, eventName)."""
+import pytest
+
+from autotag_common.dispatch import Router, event_source
+
+
+def detail(source='ec2.amazonaws.com', event_name='CreateTags'):
+    return {'eventSource': source, 'eventName': event_name}
+
+
+@pytest.fixture
+def router():
+    router = Router()
+    router.add('ec2.amazonaws.com', lambda detail, *args: ('ec2', detail['eventName'], args))
+    router.add('dynamodb.amazonaws.com', lambda detail, *args: ('tags', detail['eventName']),
+               ['TagResource', 'UntagResource'])
+    return router
+
+
+def test_events_go_to_their_handler(router):
+    assert router.dispatch({'detail': detail()}, 'extra') == ('ec2', 'CreateTags', ('extra',))
+    assert router.dispatch(detail('dynamodb.amazonaws.com', 'UntagResource')) == ('tags', 'UntagResource')
+
+
+def test_source_is_implied_by_the_envelope(router):
+    event = {'source': 'aws.ec2', 'detail': {'eventName': 'DeleteTags'}}
+    assert event_source(event) == 'ec2.amazonaws.com'
+    assert router.dispatch(event)[:2] == ('ec2', 'DeleteTags')
+
+
+def test_unrouted_events_get_a_400(router):
+    assert router.dispatch(detail('s3.amazonaws.com'))['body'] == 'Unsupported event source: s3.amazonaws.com'
+    response = router.dispatch(detail('dynamodb.amazonaws.com', 'CreateTable'))
+    assert response == {'statusCode': 400, 'body': 'Unsupported event: CreateTable'}
+    assert router.dispatch({'detail': {'eventName': 'CreateTags'}})['body'] == 'Event source not found'
+    assert router.dispatch({'detail': {'eventSource': 'ec2.amazonaws.com'}})['body'] == 'Event name not found'
+
+
+def test_duplicate_routes_are_rejected(router):
+    with pytest.raises(ValueError):
+        router.add('dynamodb.amazonaws.com', print, ['TagResource'])
+
+
+def test_service_routes_receive_a_client(aws):
+    client = aws.client('ec2')
+    router = Router()
+
+    @router.route('ec2.amazonaws.com', 'CreateTags', service='ec2')
+    def handle(detail, ec2):
+        return ec2
+    assert router.dispatch(detail()) is client
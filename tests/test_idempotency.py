@@ -0,0 +1,207 @@
+"""Event and ARN claims, and the creation lambda's de-duplication built on them."""
+import json
+
+import pytest
+
+from autotag_common.idempotency import COMPLETED, IN_PROGRESS, IdempotencyStore, LocalBackend, set_store
+
+ACCOUNT = '123456789012'
+REGION = 'us-east-1'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_event_claimed_once(clock):
+    store = IdempotencyStore(clock=clock)
+    assert store.claim_event('e-1')
+    assert not store.claim_event('e-1')
+    assert store.claim_event('e-2')
+
+
+def test_event_without_id_always_claimed(clock):
+    store = IdempotencyStore(clock=clock)
+    assert store.claim_event(None)
+    assert store.claim_event(None)
+
+
+def test_retry_takes_over_expired_lease(clock):
+    # An invocation killed by its timeout never releases its claim
+    store = IdempotencyStore(ttl=3600, lease=330, clock=clock)
+    assert store.claim_event('e-1')
+    clock.now += 300
+    assert not store.claim_event('e-1')
+    clock.now += 31
+    assert store.claim_event('e-1')
+
+
+def test_completed_event_held_for_ttl(clock):
+    store = IdempotencyStore(ttl=3600, lease=330, clock=clock)
+    store.claim_event('e-1')
+    store.complete_event('e-1')
+    clock.now += 3599
+    assert not store.claim_event('e-1')
+    clock.now += 2
+    assert store.claim_event('e-1')
+
+
+def test_release_lets_retry_through(clock):
+    store = IdempotencyStore(clock=clock)
+    store.claim_event('e-1')
+    store.release_event('e-1')
+    assert store.claim_event('e-1')
+
+
+def test_backend_shares_claims_between_containers(clock):
+    backend = LocalBackend(clock=clock)
+    first = IdempotencyStore(backend=backend, ttl=3600, lease=330, clock=clock)
+    second = IdempotencyStore(backend=backend, ttl=3600, lease=330, clock=clock)
+    assert first.claim_event('e-1')
+    assert backend.status('event#e-1') == IN_PROGRESS
+    assert not second.claim_event('e-1')
+
+    first.complete_event('e-1')
+    assert backend.status('event#e-1') == COMPLETED
+    clock.now += 1000
+    assert not IdempotencyStore(backend=backend, clock=clock).claim_event('e-1')
+
+    clock.now += 3000
+    assert backend.status('event#e-1') is None
+    assert IdempotencyStore(backend=backend, clock=clock).claim_event('e-1')
+
+
+def test_arn_claim_ignores_created_on(clock):
+    store = IdempotencyStore(clock=clock)
+    first = {'CreatedBy': 'alice', 'CreatedOn': '2024-10-24 14:50:40 IST'}
+    later = {'CreatedBy': 'alice', 'CreatedOn': '2024-10-24 14:50:47 IST'}
+    assert store.claim_arns(['arn:a', 'arn:b'], first) == ['arn:a', 'arn:b']
+    assert store.claim_arns(['arn:a', 'arn:c'], later) == ['arn:c']
+    assert store.claim_arns(['arn:a'], {'CreatedBy': 'bob', 'CreatedOn': '2024-10-24 14:50:47 IST'}) == ['arn:a']
+
+
+def test_arn_claims_are_local_and_expire_with_the_lease(clock):
+    backend = LocalBackend(clock=clock)
+    store = IdempotencyStore(backend=backend, lease=330, clock=clock)
+    tags = {'CreatedBy': 'alice'}
+    assert store.claim_arns(['arn:a'], tags) == ['arn:a']
+    assert backend._items == {}
+    clock.now += 331
+    assert store.claim_arns(['arn:a'], tags) == ['arn:a']
+    store.release_arns(['arn:a'], tags)
+    assert store.claim_arns(['arn:a'], tags) == ['arn:a']
+
+
+def test_local_claims_are_bounded(clock):
+    store = IdempotencyStore(maxsize=2, clock=clock)
+    for event_id in ('e-1', 'e-2', 'e-3'):
+        store.claim_event(event_id)
+    assert len(store._local) == 2
+    assert store.claim_event('e-1')
+
+
+def mount_target_event(event_id, event_time, user='alice'):
+    return {
+        'source': 'aws.elasticfilesystem',
+        'region': REGION,
+        'account': ACCOUNT,
+        'detail': {
+            'eventID': event_id,
+            'eventName': 'CreateMountTarget',
+            'eventTime': event_time,
+            'userIdentity': {'type': 'IAMUser', 'userName': user},
+            'responseElements': {'fileSystemId': 'fs-1', 'mountTargetId': 'fsmt-' + event_id},
+        },
+    }
+
+
+def tagging_api(aws, tags):
+    """A resourcegroupstaggingapi whose resources carry `tags` ({arn: {Key: Value}})."""
+    def get_resources(ResourceARNList):
+        return {'ResourceTagMappingList': [
+            {'ResourceARN': arn, 'Tags': [{'Key': k, 'Value': v} for k, v in tags[arn].items()]}
+            for arn in ResourceARNList if tags.get(arn)]}
+
+    def tag_resources(ResourceARNList, Tags):
+        for arn in ResourceARNList:
+            tags.setdefault(arn, {}).update(Tags)
+        return {'FailedResourcesMap': {}}
+
+    return aws.client('resourcegroupstaggingapi', REGION, get_resources=get_resources, tag_resources=tag_resources)
+
+
+@pytest.mark.parametrize('users', [('alice', 'alice', 'alice'), ('alice', 'bob', 'carol')])
+def test_mount_target_burst_tags_file_system_once(aws, load_lambda, users):
+    autotag = load_lambda('AWS_Resource_Autotag')
+    tags = {}
+    api = tagging_api(aws, tags)
+    times = ('2024-10-24T09:20:40Z', '2024-10-24T09:20:44Z', '2024-10-24T09:20:47Z')
+    for n, (event_time, user) in enumerate(zip(times, users)):
+        response = autotag.tag_event(mount_target_event(f'e-{n}', event_time, user))
+        assert response['statusCode'] == 200
+
+    arn = f'arn:aws:elasticfilesystem:{REGION}:{ACCOUNT}:file-system/fs-1'
+    assert api.operations().count('tag_resources') == 1
+    assert tags[arn]['CreatedOn'] == '2024-10-24 14:50:40 IST'
+    assert tags[arn]['CreatedBy'] == 'alice'
+
+
+def test_existing_tags_are_never_overwritten(aws, load_lambda):
+    autotag = load_lambda('AWS_Resource_Autotag')
+    arn = f'arn:aws:elasticfilesystem:{REGION}:{ACCOUNT}:file-system/fs-1'
+    tags = {arn: {'CreatedBy': 'someone', 'Division': 'CD'}}
+    api = tagging_api(aws, tags)
+    autotag.tag_event(mount_target_event('e-1', '2024-10-24T09:20:40Z'))
+    assert api.calls[-1] == ('tag_resources', {
+        'ResourceARNList': [arn], 'Tags': {'CreatedOn': '2024-10-24 14:50:40 IST', 'Studio': 'Ajax'}})
+    assert tags[arn]['CreatedBy'] == 'someone'
+
+
+def test_reshard_leaves_existing_members_alone(aws, load_lambda):
+    autotag = load_lambda('AWS_Resource_Autotag')
+    aws.client('elasticache', REGION, describe_replication_groups=lambda **kwargs: {
+        'ReplicationGroups': [{'Status': 'available'}]})
+    old = f'arn:aws:elasticache:{REGION}:{ACCOUNT}:cluster:rg-0001-001'
+    new = f'arn:aws:elasticache:{REGION}:{ACCOUNT}:cluster:rg-0002-001'
+    tags = {old: {'CreatedBy': 'alice', 'CreatedOn': '2024-01-01 10:00:00 IST', 'Division': 'CD', 'Studio': 'Ajax'}}
+    tagging_api(aws, tags)
+    event = {
+        'source': 'aws.elasticache', 'region': REGION, 'account': ACCOUNT,
+        'detail': {
+            'eventID': 'e-1', 'eventName': 'ModifyReplicationGroupShardConfiguration',
+            'eventTime': '2024-10-24T09:20:40Z', 'userIdentity': {'type': 'IAMUser', 'userName': 'bob'},
+            'requestParameters': {'replicationGroupId': 'rg'},
+            'responseElements': {'memberClusters': ['rg-0001-001', 'rg-0002-001']},
+        },
+    }
+    assert autotag.tag_event(event)['statusCode'] == 200
+    assert tags[old]['CreatedBy'] == 'alice'
+    assert tags[old]['CreatedOn'] == '2024-01-01 10:00:00 IST'
+    assert tags[new]['CreatedBy'] == 'bob'
+
+
+def test_event_completed_only_after_tagging(aws, load_lambda, clock):
+    autotag = load_lambda('AWS_Resource_Autotag')
+    backend = LocalBackend(clock=clock)
+    set_store(IdempotencyStore(backend=backend, clock=clock))
+    failing = aws.client('resourcegroupstaggingapi', REGION,
+                         get_resources=lambda **kwargs: {'ResourceTagMappingList': []},
+                         tag_resources=lambda **kwargs: {'FailedResourcesMap': {
+                             kwargs['ResourceARNList'][0]: {'ErrorCode': 'AccessDenied', 'StatusCode': 403}}})
+    response = autotag.tag_event(mount_target_event('e-1', '2024-10-24T09:20:40Z'))
+    assert response['statusCode'] == 500
+    assert backend.status('event#e-1') is None
+
+    failing.handlers['tag_resources'] = lambda **kwargs: {'FailedResourcesMap': {}}
+    response = autotag.tag_event(mount_target_event('e-1', '2024-10-24T09:20:40Z'))
+    assert json.loads(response['body']) == 'Finished tagging with aws.elasticfilesystem'
+    assert backend.status('event#e-1') == COMPLETED
@@ -0,0 +1,110 @@
+"""The account-wide token budget shared by concurrent containers."""
+from autotag_common import quota
+from autotag_common.quota import DistributedLimiter, LocalQuotaBackend, lease, set_quota
+
+ACCOUNT = '123456789012'
+REGION = 'us-east-1'
+LIMITS = {('resourcegroupstaggingapi', 'tag_resources'): 2}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def limiter(backend=None, clock=None, **kwargs):
+    clock = clock or Clock()
+    return DistributedLimiter(backend or LocalQuotaBackend(clock), LIMITS, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def acquire(limiter, operation='tag_resources'):
+    return limiter.acquire(ACCOUNT, REGION, 'resourcegroupstaggingapi', operation)
+
+
+def test_local_backend_enforces_the_limit():
+    backend = LocalQuotaBackend(Clock())
+    assert backend.take('k', 2, 3, ttl=60)
+    assert not backend.take('k', 2, 3, ttl=60)
+    assert backend.take('k', 1, 3, ttl=60)
+
+
+def test_unlimited_operations_are_not_counted():
+    clock = Clock()
+    shared = limiter(clock=clock)
+    for _ in range(10):
+        assert acquire(shared, 'untag_resources')
+    assert clock.slept == []
+
+
+def test_callers_wait_for_the_next_window():
+    clock = Clock()
+    shared = limiter(clock=clock)
+    assert acquire(shared) and acquire(shared)
+    assert acquire(shared)
+    assert shared.waits == 1
+    assert int(clock.now) == 1001
+
+
+def test_containers_share_one_budget():
+    clock = Clock()
+    backend = LocalQuotaBackend(clock)
+    first, second = limiter(backend, clock), limiter(backend, clock)
+    assert acquire(first) and acquire(second)
+    acquire(first)
+    assert first.waits == 1 and second.waits == 0
+
+
+def test_leases_are_spent_locally():
+    taken = []
+    backend = LocalQuotaBackend(Clock())
+    take = backend.take
+    backend.take = lambda key, n, limit, ttl: taken.append(n) or take(key, n, limit, ttl)
+    shared = limiter(backend, lease_size=2)
+    assert acquire(shared) and acquire(shared)
+    assert taken == [2]
+
+
+def test_gives_up_after_max_wait():
+    clock = Clock()
+    backend = LocalQuotaBackend(clock)
+    backend.take = lambda key, n, limit, ttl: False
+    shared = limiter(backend, clock, max_wait=3)
+    assert not acquire(shared)
+    assert clock.now >= 1003
+
+
+def test_backend_errors_fail_open():
+    class Broken:
+        def take(self, key, n, limit, ttl):
+            raise RuntimeError('table unavailable')
+    clock = Clock()
+    assert acquire(limiter(Broken(), clock))
+    assert clock.slept == []
+
+
+def test_lease_without_a_quota_is_a_no_op(monkeypatch):
+    monkeypatch.delenv('AUTOTAG_QUOTA_TABLE', raising=False)
+    monkeypatch.setattr(quota, '_QUOTA', None)
+    looked_up = []
+    monkeypatch.setattr(quota, 'get_account', lambda: looked_up.append(1) or ACCOUNT)
+    lease('resourcegroupstaggingapi', 'tag_resources', REGION)
+    assert looked_up == []
+
+
+def test_lease_uses_the_configured_quota(monkeypatch):
+    monkeypatch.setattr(quota, '_QUOTA', None)
+    shared = limiter()
+    set_quota(shared)
+    monkeypatch.setenv('AUTOTAG_ACCOUNT_ID', ACCOUNT)
+    monkeypatch.setattr(quota, '_ACCOUNT', None)
+    for _ in range(3):
+        lease('resourcegroupstaggingapi', 'tag_resources', REGION)
+    assert shared.waits == 1
@@ -0,0 +1,95 @@
+"""The adaptive limiter sees every throttle, because it alone retries."""
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from autotag_common import clients, metrics, ratelimit
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = ratelimit.RateLimiter(rates={('ec2', 'create_tags'): 20.0})
+    monkeypatch.setattr(ratelimit, 'LIMITER', limiter)
+    return limiter
+
+
+def flaky(aws, *codes):
+    """An EC2 client whose create_tags fails with `codes` in turn, then succeeds."""
+    codes = list(codes)
+
+    def create_tags(**kwargs):
+        if codes:
+            raise aws.error(codes.pop(0))
+        return {}
+    return aws.client('ec2', 'us-east-1', create_tags=create_tags)
+
+
+def test_throttle_halves_bucket_rate(aws, limiter):
+    ec2 = flaky(aws, 'ThrottlingException', 'ThrottlingException')
+    ratelimit.call(ec2, 'create_tags', Resources=['i-1'], Tags=[])
+    bucket = limiter.bucket('ec2', 'create_tags')
+    assert len(ec2.calls) == 3
+    assert bucket.throttles == 2
+    assert bucket.rate == pytest.approx(20.0 / 4 + bucket.increase)
+
+
+def test_other_errors_are_raised_at_once(aws, limiter):
+    ec2 = flaky(aws, 'AccessDenied')
+    with pytest.raises(Exception, match='AccessDenied'):
+        ratelimit.call(ec2, 'create_tags', Resources=['i-1'], Tags=[])
+    assert len(ec2.calls) == 1
+    assert limiter.bucket('ec2', 'create_tags').rate == 20.0
+
+
+def test_attempts_are_bounded(aws, limiter, monkeypatch):
+    monkeypatch.setenv('AUTOTAG_THROTTLE_ATTEMPTS', '3')
+    ec2 = flaky(aws, *['ThrottlingException'] * 5)
+    with pytest.raises(Exception, match='ThrottlingException'):
+        ratelimit.call(ec2, 'create_tags', Resources=['i-1'], Tags=[])
+    assert len(ec2.calls) == 3
+    assert limiter.bucket('ec2', 'create_tags').rate == 20.0 / 8
+
+
+def test_paginate_resumes_after_a_throttled_page(aws, limiter, monkeypatch):
+    counted = []
+    monkeypatch.setattr(metrics, 'count', lambda name, value=1, **dimensions: counted.append(name))
+    class Pages:
+        """Three pages; the second fails once with a throttle."""
+
+        def __init__(self, calls, StartingToken=None):
+            self.calls = calls
+            self.start = int(StartingToken or 0)
+            self.resume_token = None
+
+        def __iter__(self):
+            for n in range(self.start, 3):
+                if n == 1 and not self.calls['throttled']:
+                    self.calls['throttled'] = True
+                    raise aws.error('Throttling')
+                yield {'Tags': [n]}
+                self.resume_token = str(n + 1)
+
+    state = {'throttled': False, 'starts': []}
+
+    def paginate(PaginationConfig, **kwargs):
+        state['starts'].append(PaginationConfig.get('StartingToken'))
+        return Pages(state, PaginationConfig.get('StartingToken'))
+
+    ec2 = SimpleNamespace(meta=SimpleNamespace(service_model=SimpleNamespace(service_name='ec2')),
+                          get_paginator=lambda operation: SimpleNamespace(paginate=paginate))
+    pages = list(ratelimit.paginate(ec2, 'describe_tags', Filters=[]))
+    assert [page['Tags'] for page in pages] == [[0], [1], [2]]
+    assert state['starts'] == [None, '1']
+    assert limiter.bucket('ec2', 'describe_tags').throttles == 1
+    # Three pages and the throttled attempt; running out of pages is not a call
+    assert counted.count('ApiCalls') == 4
+
+
+def test_pooled_clients_leave_retries_to_the_limiter(monkeypatch):
+    seen = {}
+    monkeypatch.setitem(sys.modules, 'botocore', SimpleNamespace())
+    monkeypatch.setitem(sys.modules, 'botocore.config', SimpleNamespace(Config=lambda **kwargs: seen.update(kwargs)))
+    monkeypatch.setattr(clients, '_CONFIG', None)
+    clients._boto_config()
+    assert seen['retries'] == {'mode': 'standard', 'max_attempts': 1}
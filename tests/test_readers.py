@@ -0,0 +1,67 @@
+"""Bulk tag reads through get_resources and describe_tags."""
+from autotag_common.readers import DEFAULT_READER, READERS, describe_ec2_tags, plan_reads, read_tags
+from autotag_common.tag_cache import TAG_CACHE
+
+REGION = 'us-east-1'
+ACCOUNT = '123456789012'
+
+
+def queue_arn(n, region=REGION):
+    return f'arn:aws:sqs:{region}:{ACCOUNT}:q-{n}'
+
+
+def instance_arn(n):
+    return f'arn:aws:ec2:{REGION}:{ACCOUNT}:instance/i-{n:04x}'
+
+
+def test_plan_reads_groups_by_reader_and_region_and_chunks():
+    arns = [queue_arn(n) for n in range(150)] + [instance_arn(n) for n in range(250)]
+    arns += [queue_arn(0, 'us-west-2'), queue_arn(0)]
+    batches = plan_reads(arns)
+    assert [(reader.service, region, len(batch)) for reader, region, batch in batches] == [
+        ('resourcegroupstaggingapi', REGION, 100), ('resourcegroupstaggingapi', REGION, 50),
+        ('ec2', REGION, 200), ('ec2', REGION, 50),
+        ('resourcegroupstaggingapi', 'us-west-2', 1),
+    ]
+
+
+def test_ec2_arns_create_tags_does_not_cover_use_get_resources():
+    arn = f'arn:aws:ec2:{REGION}:{ACCOUNT}:ipam-pool/ipam-pool-1'
+    assert not READERS['ec2'].accepts(arn)
+    assert plan_reads([arn]) == [(DEFAULT_READER, REGION, [arn])]
+
+
+def test_read_tags_reads_once_and_caches(aws):
+    arns = [queue_arn(n) for n in range(3)]
+    TAG_CACHE.put(arns[0], {'Division': 'CD'})
+
+    def get_resources(ResourceARNList):
+        return {'ResourceTagMappingList': [{'ResourceARN': arns[1], 'Tags': [{'Key': 'Studio', 'Value': 'Ajax'}]}]}
+    api = aws.client('resourcegroupstaggingapi', REGION, get_resources=get_resources)
+    assert dict(read_tags(arns + arns[:1])) == {arns[0]: {'Division': 'CD'}, arns[1]: {'Studio': 'Ajax'}, arns[2]: {}}
+    assert api.calls == [('get_resources', {'ResourceARNList': arns[1:]})]
+
+    assert dict(read_tags(arns)) == {arns[0]: {'Division': 'CD'}, arns[1]: {'Studio': 'Ajax'}, arns[2]: {}}
+    assert len(api.calls) == 1
+
+
+def test_read_tags_without_cache_always_reads(aws):
+    api = aws.client('resourcegroupstaggingapi', REGION,
+                     get_resources=lambda ResourceARNList: {'ResourceTagMappingList': []})
+    list(read_tags([queue_arn(1)], cache=None))
+    list(read_tags([queue_arn(1)], cache=None))
+    assert len(api.calls) == 2
+    assert TAG_CACHE.get(queue_arn(1)) is None
+
+
+def test_describe_ec2_tags_filters_200_ids_per_call(aws):
+    def describe_tags(Filters):
+        (resource_filter,) = Filters
+        return {'Tags': [{'ResourceId': resource_id, 'Key': 'Division', 'Value': 'CD'}
+                         for resource_id in resource_filter['Values'] if resource_id.endswith('0')]}
+    ec2 = aws.client('ec2', describe_tags=describe_tags)
+    ids = [f'i-{n:04}' for n in range(250)]
+    current = describe_ec2_tags(ec2, ids)
+    assert [len(kwargs['Filters'][0]['Values']) for _, kwargs in ec2.calls] == [200, 50]
+    assert current['i-0010'] == {'Division': 'CD'} and current['i-0011'] == {}
+    assert list(current) == ids
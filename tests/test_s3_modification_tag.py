@@ -0,0 +1,43 @@
+"""s3_modification_tag and the tag sets carried by bucket tagging events."""
+import pytest
+
+from autotag_common import tags
+from autotag_common.tag_cache import TAG_CACHE
+
+BUCKET_ARN = 'arn:aws:s3:::b'
+MANDATORY = {'Division': 'CD', 'Studio': 'Ajax'}
+
+
+def put_tagging_event(tag_set):
+    return {'source': 'aws.s3', 'detail': {
+        'eventName': 'PutBucketTagging', 'userIdentity': {'type': 'IAMUser', 'arn': 'arn:aws:iam::1:user/alice'},
+        'requestParameters': {'bucketName': 'b', 'Tagging': {'TagSet': {
+            'Tag': [{'Key': key, 'Value': value} for key, value in tag_set.items()]}}},
+    }}
+
+
+@pytest.fixture
+def s3(aws, load_lambda):
+    """The handler against a bucket whose tag set is `state`."""
+    state = {}
+    client = aws.client('s3', get_bucket_tagging=lambda Bucket: {'TagSet': tags.as_list(state)},
+                        put_bucket_tagging=lambda Bucket, Tagging: state.update(tags.as_dict(Tagging['TagSet'])))
+    return load_lambda('s3_modification_tag'), client, state
+
+
+def test_event_tag_set_decides_without_a_read(s3):
+    function, client, state = s3
+    function.lambda_handler(put_tagging_event({'Owner': 'alice'}), None)
+    assert client.operations() == ['put_bucket_tagging']
+    assert client.calls[0][1]['Tagging']['TagSet'] == tags.as_list(dict(Owner='alice', **MANDATORY))
+    assert TAG_CACHE.get(BUCKET_ARN) == dict(Owner='alice', **MANDATORY)
+
+
+def test_reconcile_off_keeps_event_tags_out_of_the_cache(s3, monkeypatch):
+    monkeypatch.setattr(tags, 'EVENT_RECONCILE', False)
+    function, client, state = s3
+    state.update(MANDATORY)
+    TAG_CACHE.put(BUCKET_ARN, {})
+    function.lambda_handler(put_tagging_event({'Owner': 'mallory'}), None)
+    assert client.operations() == ['get_bucket_tagging']
+    assert TAG_CACHE.get(BUCKET_ARN) == MANDATORY
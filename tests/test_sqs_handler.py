@@ -0,0 +1,134 @@
+"""SQS batches: shared writes, batchItemFailures and the claims of each record."""
+import json
+
+import pytest
+
+from autotag_common.deferral import LocalDelayQueue, set_queue
+from autotag_common.idempotency import get_store
+
+ACCOUNT = '123456789012'
+REGION = 'us-east-1'
+
+
+def bucket_event(name, event_id=None, user='alice'):
+    return {
+        'source': 'aws.s3', 'region': REGION, 'account': ACCOUNT,
+        'detail': {
+            'eventID': event_id or 'e-' + name, 'eventName': 'CreateBucket', 'eventTime': '2024-10-24T09:20:40Z',
+            'userIdentity': {'type': 'IAMUser', 'userName': user},
+            'requestParameters': {'bucketName': name},
+        },
+    }
+
+
+def record(message_id, body):
+    return {'messageId': message_id, 'body': body if isinstance(body, str) else json.dumps(body)}
+
+
+def failures(response):
+    return [item['itemIdentifier'] for item in response['batchItemFailures']]
+
+
+@pytest.fixture
+def autotag(load_lambda):
+    return load_lambda('AWS_Resource_Autotag')
+
+
+@pytest.fixture
+def api(aws):
+    """A tagging API on which buckets named bad-* are denied."""
+    def tag_resources(ResourceARNList, Tags):
+        return {'FailedResourcesMap': {arn: {'ErrorCode': 'AccessDenied', 'StatusCode': 403}
+                                       for arn in ResourceARNList if arn.startswith('arn:aws:s3:::bad-')}}
+    return aws.client('resourcegroupstaggingapi', get_resources=lambda **kwargs: {'ResourceTagMappingList': []},
+                      tag_resources=tag_resources)
+
+
+def test_batch_is_read_and_written_together(autotag, api):
+    response = autotag.sqs_handler({'Records': [record(f'm-{n}', bucket_event(f'b-{n}')) for n in range(3)]}, None)
+    assert failures(response) == []
+    assert api.operations() == ['get_resources', 'tag_resources']
+    assert api.calls[1][1]['ResourceARNList'] == ['arn:aws:s3:::b-0', 'arn:aws:s3:::b-1', 'arn:aws:s3:::b-2']
+    assert not get_store().claim_event('e-b-0')
+
+
+def test_mixed_batch_fails_only_broken_records(autotag, api):
+    unsupported = dict(bucket_event('x'), source='aws.unknown')
+    response = autotag.sqs_handler({'Records': [
+        record('ok', bucket_event('b-1')),
+        record('malformed', '{not json'),
+        record('unsupported', unsupported),
+    ]}, None)
+    assert failures(response) == ['malformed']
+    assert api.calls[-1][1]['ResourceARNList'] == ['arn:aws:s3:::b-1']
+
+
+def test_partial_failure_redelivers_and_releases_only_its_record(autotag, api):
+    response = autotag.sqs_handler({'Records': [
+        record('good', bucket_event('b-1')),
+        record('bad', bucket_event('bad-1')),
+    ]}, None)
+    assert failures(response) == ['bad']
+    store = get_store()
+    assert store.claim_event('e-bad-1')
+    assert not store.claim_event('e-b-1')
+
+
+def test_records_sharing_a_failed_arn_both_fail(autotag, api):
+    response = autotag.sqs_handler({'Records': [
+        record('first', bucket_event('bad-1', 'e-1')),
+        record('second', bucket_event('bad-1', 'e-2', user='bob')),
+        record('other', bucket_event('b-1')),
+    ]}, None)
+    assert failures(response) == ['first', 'second']
+    assert api.calls[-1][1]['Tags']['CreatedBy'] == 'alice'
+    assert get_store().claim_event('e-1') and get_store().claim_event('e-2')
+
+
+def test_give_up_is_acknowledged_and_released(autotag, api, aws, monkeypatch):
+    monkeypatch.setenv('AUTOTAG_DEFERRAL_MAX_ATTEMPTS', '3')
+    aws.client('dynamodb', REGION, describe_table=lambda **kwargs: {'Table': {'TableStatus': 'CREATING'}})
+    table = {
+        'source': 'aws.dynamodb', 'region': REGION, 'account': ACCOUNT,
+        'detail': {'eventID': 'e-t', 'eventName': 'CreateTable', 'eventTime': '2024-10-24T09:20:40Z',
+                   'userIdentity': {'type': 'IAMUser', 'userName': 'alice'},
+                   'responseElements': {'tableDescription': {
+                       'tableName': 't', 'tableArn': f'arn:aws:dynamodb:{REGION}:{ACCOUNT}:table/t'}}},
+    }
+    get_store().claim_event('e-t')
+    response = autotag.sqs_handler({'Records': [
+        record('gave-up', {'deferred': True, 'attempt': 3, 'event': table}),
+        record('ok', bucket_event('b-1')),
+    ]}, None)
+    assert failures(response) == []
+    assert get_store().claim_event('e-t')
+
+
+def test_write_error_releases_every_claim(autotag, aws):
+    def tag_resources(**kwargs):
+        raise aws.error('AccessDeniedException')
+    aws.client('resourcegroupstaggingapi', get_resources=lambda **kwargs: {'ResourceTagMappingList': []},
+               tag_resources=tag_resources)
+    response = autotag.sqs_handler({'Records': [record('m-1', bucket_event('b-1'))]}, None)
+    assert failures(response) == ['m-1']
+    assert get_store().claim_event('e-b-1')
+
+
+def test_failing_recheck_is_isolated(autotag, api, aws):
+    queue = LocalDelayQueue(clock=lambda: 0)
+    set_queue(queue)
+
+    def describe_table(**kwargs):
+        raise aws.error('AccessDeniedException')
+    aws.client('dynamodb', REGION, describe_table=describe_table)
+    table = {
+        'source': 'aws.dynamodb', 'region': REGION, 'account': ACCOUNT,
+        'detail': {'eventID': 'e-t', 'eventName': 'CreateTable', 'eventTime': '2024-10-24T09:20:40Z',
+                   'userIdentity': {'type': 'IAMUser', 'userName': 'alice'},
+                   'responseElements': {'tableDescription': {
+                       'tableName': 't', 'tableArn': f'arn:aws:dynamodb:{REGION}:{ACCOUNT}:table/t'}}},
+    }
+    queue.send({'deferred': True, 'attempt': 1, 'event': table}, 0)
+    response = autotag.lambda_handler(bucket_event('b-1'), None)
+    assert response['statusCode'] == 200
+    assert len(queue) == 0
@@ -0,0 +1,30 @@
+"""The backfill sweep, including resources get_resources cannot see."""
+from autotag_common import quota, tags
+from tools.sweep import Checkpoint, sweep_region
+
+REGION = 'us-east-1'
+ACCOUNT = '123456789012'
+MANDATORY = {'Division': 'CD', 'Studio': 'Ajax'}
+
+
+def test_never_tagged_resources_are_listed_natively(aws, monkeypatch):
+    monkeypatch.setenv('AUTOTAG_ACCOUNT_ID', ACCOUNT)
+    monkeypatch.setattr(quota, '_ACCOUNT', None)
+    aws.client('resourcegroupstaggingapi', REGION, get_resources=lambda **kwargs: {'ResourceTagMappingList': []})
+    ec2 = aws.client(
+        'ec2', REGION,
+        describe_vpcs=lambda: {'Vpcs': [{'VpcId': 'vpc-1'}, {'VpcId': 'vpc-2'}]},
+        describe_tags=lambda Filters: {'Tags': [{'ResourceId': 'vpc-1', 'Key': 'Name', 'Value': 'main'}]},
+        create_tags=lambda **kwargs: {},
+    )
+    checkpoint = Checkpoint()
+    progress = sweep_region(REGION, checkpoint, MANDATORY, ['ec2:vpc', 'sqs'], 1000, False, {},
+                            list_untagged=True)
+    operation, kwargs = ec2.calls[-1]
+    assert (operation, kwargs['Resources']) == ('create_tags', ['vpc-2'])
+    assert tags.as_dict(kwargs['Tags']) == MANDATORY
+    assert (progress['tagged'], progress['listed']) == (1, True)
+
+    # A finished region is not listed again
+    sweep_region(REGION, checkpoint, MANDATORY, ['ec2:vpc'], 1000, False, {}, list_untagged=True)
+    assert ec2.operations().count('describe_vpcs') == 1
@@ -0,0 +1,109 @@
+"""The TTL + LRU tag cache, and how the modification handlers keep it current."""
+import pytest
+
+from autotag_common.tag_cache import TAG_CACHE, TagCache, cached_tags
+
+MANDATORY = {'Division': 'CD', 'Studio': 'Ajax'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = TagCache(ttl=300, clock=clock)
+    cache.put('arn:a', {'Division': 'CD'})
+    clock.now = 299
+    assert cache.get('arn:a') == {'Division': 'CD'}
+    clock.now = 300
+    assert cache.get('arn:a') is None
+    assert cache.stats()['size'] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TagCache(maxsize=2, clock=Clock())
+    cache.put('arn:a', {})
+    cache.put('arn:b', {})
+    cache.get('arn:a')
+    cache.put('arn:c', {})
+    assert cache.get('arn:b') is None
+    assert cache.get('arn:a') == {} and cache.get('arn:c') == {}
+
+
+def test_copies_are_handed_out():
+    cache = TagCache(clock=Clock())
+    tags = {'Division': 'CD'}
+    cache.put('arn:a', tags)
+    tags['Studio'] = 'Ajax'
+    cache.get('arn:a')['Studio'] = 'Ajax'
+    assert cache.get('arn:a') == {'Division': 'CD'}
+
+
+def test_merge_remove_and_invalidate():
+    clock = Clock()
+    cache = TagCache(ttl=300, clock=clock)
+    cache.merge('arn:missing', {'Division': 'CD'})
+    assert cache.get('arn:missing') is None
+
+    cache.put('arn:a', {'Division': 'CD', 'Owner': 'alice'})
+    cache.merge('arn:a', {'Studio': 'Ajax'})
+    cache.remove('arn:a', ['Owner'])
+    assert cache.get('arn:a') == MANDATORY
+    cache.remove('arn:a', ['Studio'], values={'Studio': 'Other'})
+    assert cache.get('arn:a') == MANDATORY
+    cache.invalidate('arn:a')
+    assert cache.get('arn:a') is None
+
+
+def test_cached_tags_loads_once():
+    loads = []
+    assert cached_tags('arn:a', lambda: loads.append(1) or {'Division': 'CD'}) == {'Division': 'CD'}
+    assert cached_tags('arn:a', lambda: loads.append(1) or {}) == {'Division': 'CD'}
+    assert loads == [1]
+
+
+@pytest.fixture
+def efs(aws, load_lambda):
+    """The EFS handler against a file system whose tags live in `state`."""
+    state = {'fs-1': {}}
+
+    def describe_tags(FileSystemId):
+        return {'Tags': [{'Key': k, 'Value': v} for k, v in state[FileSystemId].items()]}
+
+    def tag_resource(ResourceId, Tags):
+        state[ResourceId].update({tag['Key']: tag['Value'] for tag in Tags})
+        return {}
+    client = aws.client('efs', describe_tags=describe_tags, tag_resource=tag_resource)
+    return load_lambda('efs_modification_tag'), client, state
+
+
+def efs_event(event_name, **request):
+    return {'source': 'aws.elasticfilesystem',
+            'detail': {'eventName': event_name, 'userIdentity': {'type': 'IAMUser'},
+                       'requestParameters': dict(resourceId='fs-1', **request)}}
+
+
+def test_handler_reads_once_and_caches_its_write(efs):
+    function, client, state = efs
+    function.lambda_handler(efs_event('TagResource', tags=[{'key': 'Owner', 'value': 'alice'}]), None)
+    assert client.operations() == ['describe_tags', 'tag_resource']
+    assert TAG_CACHE.get('fs-1') == MANDATORY
+
+    function.lambda_handler(efs_event('TagResource', tags=[{'key': 'Team', 'value': 'x'}]), None)
+    assert client.operations() == ['describe_tags', 'tag_resource']
+    assert TAG_CACHE.get('fs-1') == dict(MANDATORY, Team='x')
+
+
+def test_untag_updates_cache_and_rewrites_removed_tags(efs):
+    function, client, state = efs
+    function.lambda_handler(efs_event('TagResource', tags=[]), None)
+    state['fs-1'].pop('Studio')
+    function.lambda_handler(efs_event('UntagResource', tagKeys=['Studio']), None)
+    assert client.calls[-1] == ('tag_resource', {'ResourceId': 'fs-1', 'Tags': [{'Key': 'Studio', 'Value': 'Ajax'}]})
+    assert TAG_CACHE.get('fs-1') == MANDATORY
@@ -0,0 +1,115 @@
+"""Batching, partial-failure retry and native writers of tagging.tag_resources."""
+from autotag_common import metrics, tagging, writers
+
+REGION = 'us-east-1'
+TAGS = {'CreatedBy': 'alice', 'Division': 'CD'}
+
+
+def queue_arns(n, region=REGION):
+    return [f'arn:aws:sqs:{region}:123456789012:q-{i}' for i in range(n)]
+
+
+def scripted(aws, *responses, region=REGION):
+    """A tagging API returning FailedResourcesMaps built by `responses`, one per call, then none."""
+    responses = list(responses)
+
+    def tag_resources(ResourceARNList, Tags):
+        failures = responses.pop(0)(ResourceARNList) if responses else {}
+        return {'FailedResourcesMap': failures}
+    return aws.client('resourcegroupstaggingapi', region, tag_resources=tag_resources)
+
+
+def sent(api):
+    return [kwargs['ResourceARNList'] for operation, kwargs in api.calls if operation == 'tag_resources']
+
+
+def test_plan_batches_chunks_by_region_and_tag_set():
+    west = queue_arns(3, 'us-west-2')
+    work = [(arn, TAGS) for arn in queue_arns(45)] + [(arn, TAGS) for arn in west]
+    work.append((queue_arns(1)[0], TAGS))
+    work.append(('arn:aws:sqs:us-east-1:123456789012:other', dict(TAGS, CreatedBy='bob')))
+    batches = tagging.plan_batches(work)
+    assert [(region, len(arns)) for region, _, arns in batches] == [
+        (REGION, 20), (REGION, 20), (REGION, 5), ('us-west-2', 3), (REGION, 1)]
+    assert batches[-1][1]['CreatedBy'] == 'bob'
+
+
+def test_plan_batches_by_service():
+    work = [(arn, TAGS) for arn in queue_arns(2)] + [(f'arn:aws:sns:{REGION}:123456789012:t', TAGS)]
+    batches = tagging.plan_batches(work, by_service=True)
+    assert sorted(len(arns) for _, _, arns in batches) == [1, 2]
+
+
+def test_only_failed_arns_are_retried(aws):
+    arns = queue_arns(3)
+    api = scripted(aws, lambda sent: {
+        arns[0]: {'ErrorCode': 'ThrottlingException', 'StatusCode': 400},
+        arns[1]: {'ErrorCode': 'InternalServiceException', 'StatusCode': 500},
+        arns[2]: {'ErrorCode': 'AccessDeniedException', 'StatusCode': 403},
+    })
+    result = tagging.tag_resources([(arn, TAGS) for arn in arns])
+    assert sent(api) == [arns, arns[:2]]
+    assert sorted(result['tagged']) == arns[:2]
+    assert list(result['failed']) == [arns[2]]
+
+
+def test_retries_are_bounded(aws):
+    arns = queue_arns(2)
+    throttled = lambda sent: {arn: {'ErrorCode': 'Throttling', 'StatusCode': 400} for arn in sent[:1]}
+    api = scripted(aws, *[throttled] * 10)
+    result = tagging.tag_resources([(arn, TAGS) for arn in arns], max_attempts=3)
+    assert sent(api) == [arns, arns[:1], arns[:1]]
+    assert result['tagged'] == [arns[1]]
+    assert result['failed'][arns[0]]['ErrorCode'] == 'Throttling'
+
+
+def test_call_error_fails_the_pending_arns(aws):
+    arns = queue_arns(2)
+    calls = []
+
+    def tag_resources(ResourceARNList, Tags):
+        calls.append(ResourceARNList)
+        raise aws.error('AccessDeniedException')
+    aws.client('resourcegroupstaggingapi', REGION, tag_resources=tag_resources)
+    result = tagging.tag_resources([(arn, TAGS) for arn in arns])
+    assert calls == [arns]
+    assert result['tagged'] == []
+    assert {failure['ErrorCode'] for failure in result['failed'].values()} == {'AccessDeniedException'}
+
+
+def test_ec2_arns_go_through_create_tags(aws):
+    ids = [f'i-{n:04x}' for n in range(1500)]
+    ec2 = aws.client('ec2', REGION, create_tags=lambda **kwargs: {})
+    api = scripted(aws)
+    work = [(f'arn:aws:ec2:{REGION}:123456789012:instance/{i}', TAGS) for i in ids] + \
+        [(arn, TAGS) for arn in queue_arns(1)]
+    result = tagging.tag_resources(work)
+    assert [len(kwargs['Resources']) for _, kwargs in ec2.calls] == [1000, 500]
+    assert sorted(sum((kwargs['Resources'] for _, kwargs in ec2.calls), [])) == sorted(ids)
+    assert sent(api) == [queue_arns(1)]
+    assert len(result['tagged']) == 1501
+
+
+def test_failed_native_batch_fails_over(aws, monkeypatch):
+    counted = []
+    monkeypatch.setattr(metrics, 'count', lambda name, value=1, **dimensions: counted.append((name, value)))
+
+    def create_tags(**kwargs):
+        raise aws.error('InvalidID')
+    aws.client('ec2', REGION, create_tags=create_tags)
+    api = scripted(aws)
+    arn = f'arn:aws:ec2:{REGION}:123456789012:instance/i-1'
+    result = tagging.tag_resources([(arn, TAGS)])
+    assert sent(api) == [[arn]]
+    assert result['tagged'] == [arn]
+    assert ('WriterFailovers', 1) in counted
+
+
+def test_native_writers_can_be_turned_off(aws, monkeypatch):
+    monkeypatch.setattr(writers, 'ENABLED', False)
+    ec2 = aws.client('ec2', REGION, create_tags=lambda **kwargs: {})
+    api = scripted(aws)
+    arn = f'arn:aws:ec2:{REGION}:123456789012:instance/i-1'
+    tagging.tag_resources([(arn, TAGS)])
+    assert ec2.calls == []
+    assert sent(api) == [[arn]]
@@ -0,0 +1,68 @@
+"""Delta-only writes of the mandatory tags."""
+import pytest
+
+from autotag_common import metrics, tags
+from autotag_common.tags import MANDATORY_TAGS, enforce, missing, write_missing
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    counted = []
+    monkeypatch.setattr(metrics, 'count', lambda name, value=1, **dimensions: counted.append((name, value)))
+    return counted
+
+
+def test_missing_keeps_existing_values():
+    assert missing({}) == dict(MANDATORY_TAGS)
+    assert missing({'Division': 'Other'}) == {'Studio': 'Ajax'}
+    assert missing({'Division': 'CD', 'Studio': 'Ajax', 'Owner': 'alice'}) == {}
+
+
+def test_overwrite_corrects_differing_values():
+    assert missing({'Division': 'Other', 'Studio': 'Ajax'}, overwrite=True) == {'Division': 'CD'}
+
+
+def test_mandatory_tags_are_read_only():
+    with pytest.raises(TypeError):
+        tags.MANDATORY_TAGS['Division'] = 'Other'
+
+
+def test_list_round_trip():
+    as_list = tags.as_list({'Division': 'CD'}, 'key', 'value')
+    assert as_list == [{'key': 'Division', 'value': 'CD'}]
+    assert tags.as_dict(as_list, 'key', 'value') == {'Division': 'CD'}
+
+
+def test_nothing_missing_skips_the_write(counted):
+    writes = []
+    assert enforce(dict(MANDATORY_TAGS), writes.append) == {}
+    assert writes == []
+    assert counted == [('WritesSkipped', 1)]
+
+
+def test_only_the_delta_is_written(counted):
+    writes = []
+    assert enforce({'Division': 'CD'}, writes.append) == {'Studio': 'Ajax'}
+    assert writes == [{'Studio': 'Ajax'}]
+    assert ('ResourcesTagged', 1) in counted and ('TagsWritten', 1) in counted
+
+
+def test_write_missing_counts_every_resource(counted):
+    write_missing(dict(MANDATORY_TAGS), lambda delta: None, resources=3)
+    assert ('ResourcesTagged', 3) in counted and ('TagsWritten', 6) in counted
+    write_missing({}, lambda delta: None, resources=3)
+    assert counted[-1] == ('WritesSkipped', 3)
+
+
+def test_from_event_decides_from_the_payload(counted):
+    assert tags.from_event(added=dict(MANDATORY_TAGS, Owner='alice')) == {}
+    assert tags.from_event(added={'Owner': 'alice'}) is None
+    assert tags.from_event(removed=['Owner', 'Studio']) == {'Studio': 'Ajax'}
+    assert tags.from_event(replaced={'Division': 'Other'}) == {'Studio': 'Ajax'}
+    assert tags.from_event(replaced={}) == dict(MANDATORY_TAGS)
+    assert counted == [('ReadsSkipped', 1)] * 4
+
+
+def test_from_event_defers_to_a_read_when_reconcile_is_off(monkeypatch):
+    monkeypatch.setattr(tags, 'EVENT_RECONCILE', False)
+    assert tags.from_event(replaced={}) is None
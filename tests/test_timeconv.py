@@ -0,0 +1,46 @@
+"""CreatedOn values from CloudTrail eventTimes."""
+from datetime import datetime, timezone
+
+from autotag_common import timeconv
+from autotag_common.timeconv import TimeConverter, parse_event_time
+
+
+def test_cloudtrail_shape_is_parsed_as_utc():
+    assert parse_event_time('2024-10-24T09:20:40Z') == datetime(2024, 10, 24, 9, 20, 40, tzinfo=timezone.utc)
+
+
+def test_other_iso_shapes_are_normalised_to_utc():
+    expected = datetime(2024, 10, 24, 9, 20, 40, 500000, tzinfo=timezone.utc)
+    assert parse_event_time('2024-10-24T09:20:40.500Z') == expected
+    assert parse_event_time('2024-10-24T14:50:40.500+05:30') == expected
+    assert parse_event_time('2024-10-24T09:20:40.500') == expected
+
+
+def test_default_format_is_ist():
+    assert TimeConverter().convert('2024-10-24T09:20:40Z') == '2024-10-24 14:50:40 IST'
+
+
+def test_zone_and_format_come_from_the_environment(monkeypatch):
+    monkeypatch.setattr(timeconv, '_CONVERTER', None)
+    monkeypatch.setenv('AUTOTAG_TIMEZONE', 'UTC')
+    monkeypatch.setenv('AUTOTAG_TIME_FORMAT', '%Y-%m-%dT%H:%M')
+    assert timeconv.convert_event_time('2024-10-24T09:20:40Z') == '2024-10-24T09:20'
+
+
+def test_conversions_are_memoised():
+    converter = TimeConverter()
+    for _ in range(3):
+        converter.convert('2024-10-24T09:20:40Z')
+    info = converter.convert.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
+
+
+def test_convert_many_formats_each_value_once(monkeypatch):
+    converter = TimeConverter()
+    formatted = []
+    convert = converter._convert
+    monkeypatch.setattr(converter, '_convert', lambda value: formatted.append(value) or convert(value))
+    values = ['2024-10-24T09:20:40Z', '2024-10-24T09:20:41Z', '2024-10-24T09:20:40Z']
+    assert converter.convert_many(values) == [
+        '2024-10-24 14:50:40 IST', '2024-10-24 14:50:41 IST', '2024-10-24 14:50:40 IST']
+    assert formatted == values[:2]
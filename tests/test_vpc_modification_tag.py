@@ -0,0 +1,99 @@
+"""vpc_modification_tag on CreateTags/DeleteTags events that cover many resources."""
+import pytest
+
+from autotag_common import tags
+from autotag_common.tag_cache import TAG_CACHE
+
+MANDATORY = {'Division': 'CD', 'Studio': 'Ajax'}
+
+
+def tags_event(event_name, resource_ids, tag_items):
+    return {'source': 'aws.ec2', 'detail': {
+        'eventName': event_name, 'userIdentity': {'type': 'IAMUser'},
+        'requestParameters': {
+            'resourcesSet': {'items': [{'resourceId': resource_id} for resource_id in resource_ids]},
+            'tagSet': {'items': tag_items},
+        },
+    }}
+
+
+@pytest.fixture
+def vpc(aws, load_lambda):
+    """The handler against EC2 resources whose tags live in `state`."""
+    state = {}
+
+    def describe_tags(Filters):
+        (resource_filter,) = Filters
+        return {'Tags': [{'ResourceId': resource_id, 'Key': key, 'Value': value}
+                         for resource_id in resource_filter['Values']
+                         for key, value in state.get(resource_id, {}).items()]}
+
+    def create_tags(Resources, Tags):
+        for resource_id in Resources:
+            state.setdefault(resource_id, {}).update({tag['Key']: tag['Value'] for tag in Tags})
+        return {}
+    ec2 = aws.client('ec2', describe_tags=describe_tags, create_tags=create_tags)
+    return load_lambda('vpc_modification_tag'), ec2, state
+
+
+def writes(ec2):
+    return [(kwargs['Resources'], kwargs['Tags']) for operation, kwargs in ec2.calls if operation == 'create_tags']
+
+
+def test_resources_are_read_once_and_written_by_group(vpc):
+    function, ec2, state = vpc
+    state.update({'vpc-1': dict(MANDATORY), 'subnet-1': {'Division': 'CD'}})
+    ids = ['vpc-1', 'subnet-1', 'sg-1', 'sg-2']
+    response = function.lambda_handler(tags_event('CreateTags', ids, [{'key': 'Owner', 'value': 'alice'}]), None)
+    assert response['body'] == 'Tags validated for 4 resources'
+    assert ec2.operations() == ['describe_tags', 'create_tags', 'create_tags']
+    assert ec2.calls[0][1]['Filters'][0]['Values'] == ids
+    assert writes(ec2) == [
+        (['subnet-1'], [{'Key': 'Studio', 'Value': 'Ajax'}]),
+        (['sg-1', 'sg-2'], [{'Key': 'Division', 'Value': 'CD'}, {'Key': 'Studio', 'Value': 'Ajax'}]),
+    ]
+    assert all(state[resource_id] == MANDATORY for resource_id in ids)
+    assert TAG_CACHE.get('sg-1') == MANDATORY
+
+
+def test_deleted_mandatory_tag_is_written_back_without_a_read(vpc):
+    function, ec2, state = vpc
+    ids = [f'i-{n:04x}' for n in range(1500)]
+    function.lambda_handler(tags_event('DeleteTags', ids, [{'key': 'Studio'}]), None)
+    assert ec2.operations() == ['create_tags', 'create_tags']
+    assert [(len(resources), written) for resources, written in writes(ec2)] == [
+        (1000, [{'Key': 'Studio', 'Value': 'Ajax'}]), (500, [{'Key': 'Studio', 'Value': 'Ajax'}])]
+
+
+def test_tags_carried_by_the_event_need_no_read_or_write(vpc):
+    function, ec2, state = vpc
+    tag_items = [{'key': key, 'value': value} for key, value in MANDATORY.items()]
+    function.lambda_handler(tags_event('CreateTags', ['vpc-1', 'vpc-2'], tag_items), None)
+    assert ec2.calls == []
+    assert TAG_CACHE.get('vpc-1') is None
+
+
+def test_delete_with_a_different_value_keeps_the_tag(vpc):
+    function, ec2, state = vpc
+    state['vpc-1'] = dict(MANDATORY)
+    TAG_CACHE.put('vpc-1', dict(MANDATORY))
+    function.lambda_handler(tags_event('DeleteTags', ['vpc-1'], [{'key': 'Studio', 'value': 'Other'}]), None)
+    assert ec2.calls == []
+    assert TAG_CACHE.get('vpc-1') == MANDATORY
+
+
+def test_delete_with_a_value_is_checked_against_the_resource(vpc):
+    function, ec2, state = vpc
+    state['vpc-1'] = {'Division': 'CD'}
+    function.lambda_handler(tags_event('DeleteTags', ['vpc-1'], [{'key': 'Studio', 'value': 'Ajax'}]), None)
+    assert ec2.operations() == ['describe_tags', 'create_tags']
+    assert writes(ec2) == [(['vpc-1'], [{'Key': 'Studio', 'Value': 'Ajax'}])]
+
+
+def test_reconcile_off_reads_and_invalidates(vpc, monkeypatch):
+    monkeypatch.setattr(tags, 'EVENT_RECONCILE', False)
+    function, ec2, state = vpc
+    state['vpc-1'] = dict(MANDATORY)
+    TAG_CACHE.put('vpc-1', {})
+    function.lambda_handler(tags_event('DeleteTags', ['vpc-1'], [{'key': 'Owner'}]), None)
+    assert ec2.operations() == ['describe_tags']
@@ -0,0 +1,53 @@
+"""Every EC2 ARN the creation function builds must route to EC2's create_tags."""
+from autotag_common.extractors import EXTRACTORS
+from autotag_common.writers import Ec2Writer, route
+
+REGION = 'us-east-1'
+ACCOUNT = '123456789012'
+
+
+def ec2_extractor_arns():
+    arns = [extractor.arn('x-1', REGION, ACCOUNT) for extractor in EXTRACTORS.values()]
+    return [arn for arn in arns if arn.startswith('arn:aws:ec2:')]
+
+
+def instance_attachment_arns():
+    run_instances = EXTRACTORS[('aws.ec2', 'RunInstances')]
+    event = {'region': REGION, 'account': ACCOUNT, 'detail': {'responseElements': {'instancesSet': {'items': [{
+        'instanceId': 'i-1',
+        'networkInterfaceSet': {'items': [{'networkInterfaceId': 'eni-1'}]},
+        'blockDeviceMapping': {'items': [{'ebs': {'volumeId': 'vol-1'}}]},
+    }]}}}}
+    return run_instances.hook(event, ['i-1'], [])
+
+
+def test_ec2_writer_accepts_every_extractor_arn():
+    arns = ec2_extractor_arns() + instance_attachment_arns()
+    assert len(arns) > len(ec2_extractor_arns())
+    writer = Ec2Writer()
+    assert [arn for arn in arns if not writer.accepts(arn)] == []
+
+
+def test_route_sends_ec2_arns_to_create_tags():
+    work = [(arn, {'CreatedBy': 'someone'}) for arn in ec2_extractor_arns()]
+    native, rest = route(work)
+    assert rest == []
+    assert [writer.service for writer in native] == ['ec2']
+
+
+def test_ec2_writer_rejects_other_arns():
+    writer = Ec2Writer()
+    assert not writer.accepts('arn:aws:s3:::bucket')
+    assert not writer.accepts('arn:aws:ec2:us-east-1:123456789012:instance')
+    assert not writer.accepts('arn:aws:rds:us-east-1:123456789012:db:x-1')
+
+
+def test_ec2_arns_use_the_resource_type_ec2_names():
+    extractors = [e for e in EXTRACTORS.values() if e.arn('x-1', REGION, ACCOUNT).startswith('arn:aws:ec2:')]
+    for extractor in extractors:
+        arn_type = extractor.arn('x-1', REGION, ACCOUNT).split(':', 5)[5].partition('/')[0]
+        assert 'ec2:' + arn_type == extractor.resource_type
+    assert EXTRACTORS[('aws.ec2', 'AllocateAddress')].arn('eipalloc-1', REGION, ACCOUNT) == \
+        f'arn:aws:ec2:{REGION}:{ACCOUNT}:elastic-ip/eipalloc-1'
+    assert EXTRACTORS[('aws.ec2', 'CreateNatGateway')].arn('nat-1', REGION, ACCOUNT) == \
+        f'arn:aws:ec2:{REGION}:{ACCOUNT}:natgateway/nat-1'
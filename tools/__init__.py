@@ -0,0 +1 @@
+"""Operator commands run from the repository root, e.g. `python -m tools.sweep`."""
@@ -0,0 +1,352 @@
+"""Throughput benchmark of the lambda handlers against stubbed AWS clients.
+
+Each suite runs one handler over a synthetic corpus from tools.corpus, with
+every AWS client replaced by a stub that answers instantly (or after
+--latency-ms) and counts the calls. Rate limits are lifted, so the numbers
+measure the handlers themselves. It reports events per second, AWS calls
+per event and the peak traced memory of a second run under tracemalloc.
+
+Raw events per second depend on the host, so throughput is compared as
+relative_throughput: events per second divided by the speed of a fixed
+calibration loop run in the same process. Results are compared with a
+stored baseline, and the run exits non-zero on a regression: more calls per
+event than the baseline, or relative throughput and memory worse than it
+by more than --tolerance. The baseline records the corpus parameters
+(--count, --fan-out, --members, --unsupported, --latency-ms) of each suite,
+and a suite run with other parameters is reported as not compared:
+
+    python -m tools.bench
+    python -m tools.bench --suite creation --count 200 --fan-out 100
+    python -m tools.bench --save-baseline
+
+--save-baseline replaces the entries of the suites it ran and keeps the rest.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'tools', 'bench_baseline.json')
+
+# SQS messages per sqs_handler invocation in the creation-batch suite
+BATCH_SIZE = 10
+
+# suite: (function directory, handler, corpus kind, corpus options). The
+# creation-batch corpus comes in bursts of one caller and second, so that a
+# batch's events share their tag set and their writes can be combined
+SUITES = {
+    'creation': ('AWS_Resource_Autotag', 'lambda_handler', 'creation', {}),
+    'creation-batch': ('AWS_Resource_Autotag', 'sqs_handler', 'creation', {'burst': BATCH_SIZE}),
+    's3': ('s3_modification_tag', 'lambda_handler', 's3', {}),
+    'efs': ('efs_modification_tag', 'lambda_handler', 'efs', {}),
+    'dynamodb': ('dynamodb_modification_tag', 'lambda_handler', 'dynamodb', {}),
+    'vpc': ('vpc_modification_tag', 'lambda_handler', 'vpc', {}),
+}
+
+SERVICES = ('ec2', 's3', 'efs', 'dynamodb', 'elasticache', 'resourcegroupstaggingapi', 'sts')
+
+# The measurements a baseline keeps of each suite
+BASELINE_KEYS = ('relative_throughput', 'calls_per_event', 'peak_kb')
+
+# Tags every stubbed read reports, so that one mandatory tag is always missing
+_EXISTING_TAGS = [{'Key': 'Division', 'Value': 'CD'}, {'Key': 'Owner', 'Value': 'bench'}]
+
+
+class StubError(Exception):
+    """Stands in for botocore's ClientError."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code, 'Message': code}}
+
+
+class StubClient:
+    """Answers every operation the lambdas use with a canned response and counts the calls."""
+
+    def __init__(self, service, region, calls, latency=0.0):
+        self.meta = SimpleNamespace(region_name=region, service_model=SimpleNamespace(service_name=service))
+        self.exceptions = SimpleNamespace(ClientError=StubError)
+        self.service = service
+        self.calls = calls
+        self.latency = latency
+
+    def _respond(self, operation, kwargs):
+        self.calls.add(self.service, operation)
+        if self.latency:
+            time.sleep(self.latency)
+        respond = getattr(self, f'_{self.service}_{operation}', None)
+        return respond(**kwargs) if respond else {}
+
+    def __getattr__(self, operation):
+        if operation.startswith('_'):
+            raise AttributeError(operation)
+        return lambda **kwargs: self._respond(operation, kwargs)
+
+    def get_paginator(self, operation):
+        client = self
+        return SimpleNamespace(paginate=lambda **kwargs: iter([client._respond(operation, kwargs)]))
+
+    def _ec2_describe_volumes(self, Filters=(), **kwargs):
+        instance_ids = [value for f in Filters for value in f['Values']]
+        return {'Volumes': [{'VolumeId': 'vol-' + instance_id[2:]} for instance_id in instance_ids]}
+
+    def _ec2_describe_tags(self, Filters=(), **kwargs):
+        resource_ids = [value for f in Filters if f['Name'] == 'resource-id' for value in f['Values']]
+        return {'Tags': [dict(tag, ResourceId=resource_id) for resource_id in resource_ids for tag in _EXISTING_TAGS]}
+
+    def _dynamodb_describe_table(self, **kwargs):
+        return {'Table': {'TableStatus': 'ACTIVE'}}
+
+    def _dynamodb_list_tags_of_resource(self, **kwargs):
+        return {'Tags': list(_EXISTING_TAGS)}
+
+    def _efs_describe_tags(self, **kwargs):
+        return {'Tags': list(_EXISTING_TAGS)}
+
+    def _s3_get_bucket_tagging(self, **kwargs):
+        return {'TagSet': list(_EXISTING_TAGS)}
+
+    def _elasticache_describe_replication_groups(self, **kwargs):
+        return {'ReplicationGroups': [{'Status': 'available'}]}
+
+    def _elasticache_describe_cache_clusters(self, **kwargs):
+        return {'CacheClusters': [{'CacheClusterStatus': 'available'}]}
+
+    def _resourcegroupstaggingapi_tag_resources(self, **kwargs):
+        return {'FailedResourcesMap': {}}
+
+    def _sts_get_caller_identity(self, **kwargs):
+        return {'Account': '123456789012'}
+
+
+class CallCounter:
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, service, operation):
+        key = f'{service}.{operation}'
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+
+def _prepare_environment():
+    """Quiet logs and metrics, lift the rate limits and install the stubs."""
+    os.environ.setdefault('AUTOTAG_LOG_LEVEL', 'ERROR')
+    os.environ.pop('AUTOTAG_DEFERRAL_QUEUE_URL', None)
+    os.environ.pop('AUTOTAG_IDEMPOTENCY_TABLE', None)
+    os.environ.pop('AUTOTAG_QUOTA_TABLE', None)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    from autotag_common import metrics
+    from autotag_common.ratelimit import LIMITER
+
+    metrics.METRICS.stream = open(os.devnull, 'w')
+    LIMITER.rates = {}
+    LIMITER.default_rate = 0
+
+
+def install_stubs(calls, latency=0.0):
+    from autotag_common.clients import install
+    from tools.corpus import REGION
+
+    for service in SERVICES:
+        for region in (None, REGION):
+            install(service, StubClient(service, region or REGION, calls, latency), region)
+
+
+def load_handler(function_dir, handler):
+    """Import a function's lambda_function.py under a unique module name."""
+    name = f'bench_{function_dir}'
+    module = sys.modules.get(name)
+    if module is None:
+        path = os.path.join(ROOT, function_dir, 'lambda-autotag', 'src', 'lambda_function.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return getattr(module, handler)
+
+
+def invocations(suite, events):
+    """The handler payloads for a list of events: one per event, or SQS batches."""
+    if suite != 'creation-batch':
+        return events
+    return [{'Records': [{'messageId': event['id'], 'body': json.dumps(event)} for event in events[i:i + BATCH_SIZE]]}
+            for i in range(0, len(events), BATCH_SIZE)]
+
+
+def calibrate(rounds=3, loops=2000):
+    """Calibration loops per second on this host, the best of `rounds`.
+
+    Each loop does the kind of work the handlers do per event: JSON
+    decoding, dict lookups and string formatting.
+    """
+    payload = json.dumps({
+        'source': 'aws.ec2',
+        'detail': {'eventName': 'CreateTags', 'eventID': 'calibration',
+                   'requestParameters': {'resourcesSet': {'items': [{'resourceId': f'i-{n}'} for n in range(8)]}}}
+    })
+    best = 0.0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for n in range(loops):
+            detail = json.loads(payload)['detail']
+            ids = [item['resourceId'] for item in detail['requestParameters']['resourcesSet']['items']]
+            tags = {f'{key}{n}': value for key, value in zip(ids, ids)}
+            f"arn:aws:ec2:us-east-1:123456789012:instance/{ids[n % len(ids)]}{len(tags)}"
+        best = max(best, loops / (time.perf_counter() - started))
+    return best
+
+
+def run_suite(suite, count, fan_out=10, members=3, unsupported=0.0, start=0, calls=None):
+    """Run one suite over serials start..start + 3 * count and return its measurements."""
+    from tools.corpus import generate
+
+    function_dir, handler_name, kind, options = SUITES[suite]
+    handler = load_handler(function_dir, handler_name)
+    calls = calls or CallCounter()
+
+    def corpus(first, n):
+        return list(generate(kind, n, fan_out=fan_out, members=members, unsupported=unsupported, start=first,
+                             **options))
+
+    # Warm the container state (clients, caches) outside the measurements,
+    # with resources the measured runs never touch
+    for payload in invocations(suite, corpus(start + 2 * count, min(count, 20))):
+        handler(payload, None)
+    calls.reset()
+
+    events = corpus(start, count)
+    payloads = invocations(suite, events)
+    started = time.perf_counter()
+    for payload in payloads:
+        handler(payload, None)
+    elapsed = time.perf_counter() - started
+    per_operation = calls.reset()
+
+    payloads = invocations(suite, corpus(start + count, count))
+    tracemalloc.start()
+    for payload in payloads:
+        handler(payload, None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls.reset()
+
+    total_calls = sum(per_operation.values())
+    return {
+        'events': len(events),
+        'seconds': round(elapsed, 4),
+        'events_per_s': round(len(events) / elapsed, 1),
+        'calls_per_event': round(total_calls / len(events), 4),
+        'peak_kb': round(peak / 1024, 1),
+        'calls': dict(sorted(per_operation.items())),
+    }
+
+
+def regressions(results, baseline, tolerance, parameters):
+    """Describe every way `results` is worse than `baseline`.
+
+    Returns (regressions, suites not compared because the baseline ran them
+    with parameters other than `parameters`).
+    """
+    found = []
+    skipped = []
+    for suite, result in results.items():
+        base = baseline.get(suite)
+        if base is None:
+            continue
+        if base.get('parameters') != parameters:
+            skipped.append(suite)
+            continue
+        if result['calls_per_event'] > base['calls_per_event'] + 1e-9:
+            found.append(f"{suite}: {result['calls_per_event']} AWS calls per event, baseline {base['calls_per_event']}")
+        if result['relative_throughput'] < base['relative_throughput'] * (1 - tolerance):
+            found.append(f"{suite}: relative throughput {result['relative_throughput']}, "
+                         f"baseline {base['relative_throughput']}")
+        if result['peak_kb'] > base['peak_kb'] * (1 + tolerance):
+            found.append(f"{suite}: peak {result['peak_kb']} KiB, baseline {base['peak_kb']}")
+    return found, skipped
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the lambda handlers against stubbed AWS clients.')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES), help='suites to run (default: all)')
+    parser.add_argument('--count', type=int, default=400, help='events per suite')
+    parser.add_argument('--fan-out', type=int, default=10, help='instances per RunInstances')
+    parser.add_argument('--members', type=int, default=3, help='member clusters per replication group')
+    parser.add_argument('--unsupported', type=float, default=0.0,
+                        help='fraction of creation events no extractor handles')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated latency of every AWS call')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='record these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed relative loss of throughput or growth of memory (default 0.5)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+    parameters = {'count': args.count, 'fan_out': args.fan_out, 'members': args.members,
+                  'unsupported': args.unsupported, 'latency_ms': args.latency_ms}
+
+    _prepare_environment()
+    calls = CallCounter()
+    install_stubs(calls, args.latency_ms / 1000)
+
+    # Every suite gets its own serial range, so that no suite's events look
+    # like redeliveries of another's
+    results = {}
+    speed = calibrate()
+    for suite in args.suite or list(SUITES):
+        results[suite] = run_suite(suite, args.count, args.fan_out, args.members, args.unsupported,
+                                   start=sorted(SUITES).index(suite) * 3 * args.count, calls=calls)
+        results[suite]['relative_throughput'] = round(results[suite]['events_per_s'] / speed, 4)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for suite, result in results.items():
+            print(f"{suite:<15} {result['events_per_s']:>10} events/s ({result['relative_throughput']} relative) "
+                  f"{result['calls_per_event']:>8} calls/event "
+                  f"{result['peak_kb']:>10} KiB peak  {json.dumps(result['calls'])}")
+
+    baseline = load_baseline(args.baseline)
+    if args.save_baseline:
+        for suite, result in results.items():
+            baseline[suite] = dict({key: result[key] for key in BASELINE_KEYS}, parameters=parameters)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    found, skipped = regressions(results, baseline, args.tolerance, parameters)
+    for suite in skipped:
+        recorded = ' '.join(f"--{key.replace('_', '-')} {value}"
+                            for key, value in sorted((baseline[suite].get('parameters') or {}).items()))
+        print(f"NOT COMPARED {suite}: the baseline was recorded with {recorded or 'other parameters'}",
+              file=sys.stderr)
+    for regression in found:
+        print('REGRESSION ' + regression, file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""Build a minimal, precompiled deployment package for one of the lambdas.
+
+Only the modules the handler actually imports are packaged: the handler
+itself, whatever it imports from its src/ directory, and the autotag_common
+modules it needs. test.py, lam.py and unused helpers stay out. When the
+building interpreter matches the function's runtime, every module is shipped
+with unchecked-hash bytecode in __pycache__, so a cold start neither compiles
+nor stats sources. Entries carry fixed timestamps, so identical sources give
+an identical zip and Terraform only redeploys on real changes:
+
+    python -m tools.build_package AWS_Resource_Autotag --output build/autotag.zip
+    terraform apply -var lambda_package=../build/autotag.zip
+"""
+import argparse
+import importlib.util
+import os
+import py_compile
+import re
+import sys
+import tempfile
+import zipfile
+from modulefinder import ModuleFinder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def runtime_of(function_dir):
+    """Python version ('3.9') the function is deployed with, read from its lambda.tf."""
+    with open(os.path.join(function_dir, 'lambda.tf')) as f:
+        match = re.search(r'runtime\s*=\s*"python(\d+\.\d+)"', f.read())
+    return match.group(1) if match else None
+
+
+def collect(function_dir, handler='lambda_function'):
+    """Map archive names to the local source files the handler imports."""
+    src = os.path.join(function_dir, 'lambda-autotag', 'src')
+    finder = ModuleFinder(path=[src, ROOT])
+    finder.run_script(os.path.join(src, handler + '.py'))
+    files = {handler + '.py': os.path.join(src, handler + '.py')}
+    for name, module in finder.modules.items():
+        if name == '__main__' or not module.__file__:
+            continue
+        path = os.path.abspath(module.__file__)
+        for base in (src, ROOT):
+            if path.startswith(base + os.sep):
+                files[os.path.relpath(path, base).replace(os.sep, '/')] = path
+                break
+    return files
+
+
+def _write(archive, name, data):
+    info = zipfile.ZipInfo(name, date_time=_EPOCH)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    archive.writestr(info, data)
+
+
+def build(function_dir, output, handler='lambda_function', bytecode=True):
+    """Write the package to `output` and return the archive names it contains."""
+    files = collect(function_dir, handler)
+    names = []
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with zipfile.ZipFile(output, 'w') as archive, tempfile.TemporaryDirectory() as tmp:
+        for name in sorted(files):
+            with open(files[name], 'rb') as f:
+                _write(archive, name, f.read())
+            names.append(name)
+            if bytecode:
+                pyc = os.path.join(tmp, 'module.pyc')
+                py_compile.compile(files[name], cfile=pyc, dfile=name, doraise=True,
+                                   invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                cached = importlib.util.cache_from_source(name).replace(os.sep, '/')
+                with open(pyc, 'rb') as f:
+                    _write(archive, cached, f.read())
+                names.append(cached)
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a minimal deployment package for a lambda.')
+    parser.add_argument('function_dir', help='e.g. AWS_Resource_Autotag or s3_modification_tag')
+    parser.add_argument('--output', help='zip to write (default: <function_dir>/lambda-autotag/lambda_package.zip)')
+    parser.add_argument('--handler', default='lambda_function', help='handler module name')
+    parser.add_argument('--no-bytecode', action='store_true', help='ship sources only')
+    args = parser.parse_args(argv)
+
+    function_dir = os.path.join(ROOT, args.function_dir)
+    output = args.output or os.path.join(function_dir, 'lambda-autotag', 'lambda_package.zip')
+    bytecode = not args.no_bytecode
+    runtime = runtime_of(function_dir)
+    current = '%d.%d' % sys.version_info[:2]
+    if bytecode and runtime != current:
+        print(f"Runtime is python{runtime} but this is python{current}; shipping sources only", file=sys.stderr)
+        bytecode = False
+
+    names = build(function_dir, output, args.handler, bytecode)
+    print(f"Wrote {output} ({os.path.getsize(output)} bytes):")
+    for name in names:
+        print('  ' + name)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+"""Measure a lambda's init time the way a cold start pays it.
+
+Each run builds the function's package with tools.build_package, unpacks it
+and imports the handler in a fresh interpreter under `-X importtime`, so
+nothing is cached between runs. Reports the median time to import the
+handler and the median cumulative import time of each module it pulls in:
+
+    python -m tools.coldstart AWS_Resource_Autotag s3_modification_tag --runs 10
+    python -m tools.coldstart AWS_Resource_Autotag --top 20 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+from tools.build_package import ROOT, build
+
+_PROBE = ('import time; started = time.perf_counter(); import {handler}; '
+          'print(time.perf_counter() - started)')
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds per module from `-X importtime` output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cum, name = line[len('import time:'):].split('|', 2)
+        if cum.strip().isdigit():
+            cumulative[name.strip()] = int(cum)
+    return cumulative
+
+
+def measure(function_dir, runs=5, handler='lambda_function', bytecode=False):
+    """Median init seconds and per-module cumulative import microseconds over `runs` fresh processes."""
+    totals, modules = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        package = os.path.join(tmp, 'package.zip')
+        build(function_dir, package, handler, bytecode)
+        with zipfile.ZipFile(package) as archive:
+            archive.extractall(os.path.join(tmp, 'src'))
+        env = dict(os.environ, PYTHONPATH=os.path.join(tmp, 'src'), PYTHONDONTWRITEBYTECODE='1')
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', _PROBE.format(handler=handler)],
+                cwd=os.path.join(tmp, 'src'), env=env, capture_output=True, text=True, check=True
+            )
+            totals.append(float(result.stdout.strip().splitlines()[-1]))
+            for name, micros in parse_importtime(result.stderr).items():
+                modules.setdefault(name, []).append(micros)
+    return {
+        'init_ms': round(statistics.median(totals) * 1000, 2),
+        'modules_us': {name: int(statistics.median(values)) for name, values in modules.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure lambda init (import) time.')
+    parser.add_argument('function_dirs', nargs='+', help='e.g. AWS_Resource_Autotag')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest modules to list per function')
+    parser.add_argument('--bytecode', action='store_true',
+                        help='ship bytecode, as build_package does on the matching runtime')
+    parser.add_argument('--json', action='store_true', help='print the full results as JSON')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for function_dir in args.function_dirs:
+        results[function_dir] = measure(os.path.join(ROOT, function_dir), args.runs, bytecode=args.bytecode)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for function_dir, result in results.items():
+        print(f"{function_dir}: init {result['init_ms']} ms (median of {args.runs})")
+        slowest = sorted(result['modules_us'].items(), key=lambda item: -item[1])[:args.top]
+        for name, micros in slowest:
+            print(f"  {micros / 1000:8.2f} ms  {name}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,292 @@
+"""Synthetic CloudTrail events for every event the lambdas handle.
+
+Creation events are built from the extractor registry, so every (source,
+eventName) pair the creation lambda tags gets an event with the identifier
+at the path its extractor reads. Modification events cover the pairs of the
+four *_modification_tag rules. Each event gets fresh resource IDs and a
+fresh eventID, so idempotency checks never drop them. RunInstances and
+replication group events fan out:
+
+    python -m tools.corpus --count 1000 --fan-out 50 --output events.jsonl
+    python -m tools.corpus --kind vpc --count 100
+"""
+import argparse
+import json
+import random
+import sys
+import zlib
+
+from autotag_common.extractors import EXTRACTORS
+
+ACCOUNT = '123456789012'
+REGION = 'us-east-1'
+
+# Prefixes of EC2/EFS identifiers, by resource type
+_ID_PREFIXES = {
+    'ec2:instance': 'i', 'ec2:volume': 'vol', 'ec2:internet-gateway': 'igw', 'ec2:natgateway': 'nat',
+    'ec2:elastic-ip': 'eipalloc', 'ec2:vpc-endpoint': 'vpce', 'ec2:transit-gateway': 'tgw',
+    'ec2:vpc': 'vpc', 'ec2:security-group': 'sg', 'ec2:subnet': 'subnet',
+    'elasticfilesystem:file-system': 'fs',
+}
+
+# Resource types whose ARNs separate type and name with ':' rather than '/'
+_COLON_ARNS = ('lambda:function', 'rds:db', 'elasticache:cluster')
+
+# The (source, eventName) pairs of the *_modification_tag rules, per function
+MODIFICATION_EVENTS = {
+    's3': (('aws.s3', 'PutBucketTagging'), ('aws.s3', 'DeleteBucketTagging')),
+    'efs': (('aws.elasticfilesystem', 'TagResource'), ('aws.elasticfilesystem', 'UntagResource')),
+    'dynamodb': (('aws.dynamodb', 'TagResource'), ('aws.dynamodb', 'UntagResource')),
+    'vpc': (('aws.ec2', 'CreateTags'), ('aws.ec2', 'DeleteTags')),
+}
+
+KINDS = ('creation',) + tuple(MODIFICATION_EVENTS)
+
+
+def resource_id(resource_type, n):
+    prefix = _ID_PREFIXES.get(resource_type)
+    if prefix:
+        return f'{prefix}-{n:017x}'
+    return f"autotag-{resource_type.split(':')[-1]}-{n}"
+
+
+def resource_arn(resource_type, name, region=REGION, account=ACCOUNT):
+    service, _, kind = resource_type.partition(':')
+    separator = ':' if resource_type in _COLON_ARNS else '/'
+    if resource_type == 'elasticloadbalancing:loadbalancer':
+        name = f'app/{name}/{zlib.crc32(name.encode()):012x}'
+    return f'arn:aws:{service}:{region}:{account}:{kind}{separator}{name}'
+
+
+def _nest(steps, values):
+    """Build the structure that path `steps` reads `values` from."""
+    (key, many), rest = steps[0], steps[1:]
+    if many:
+        return {key: list(values) if not rest else [_nest(rest, [value]) for value in values]}
+    return {key: values[0] if not rest else _nest(rest, values)}
+
+
+def _merge(into, other):
+    for key, value in other.items():
+        if isinstance(value, dict) and isinstance(into.get(key), dict):
+            _merge(into[key], value)
+        else:
+            into[key] = value
+    return into
+
+
+def _identity(rng):
+    if rng.random() < 0.5:
+        name = f'user{rng.randrange(100)}'
+        return {
+            'type': 'IAMUser', 'principalId': f'AIDA{rng.randrange(16 ** 12):012X}',
+            'arn': f'arn:aws:iam::{ACCOUNT}:user/{name}', 'accountId': ACCOUNT,
+            'accessKeyId': f'AKIA{rng.randrange(16 ** 12):012X}', 'userName': name,
+        }
+    session = f'session{rng.randrange(100)}'
+    return {
+        'type': 'AssumedRole', 'principalId': f'AROA{rng.randrange(16 ** 12):012X}:{session}',
+        'arn': f'arn:aws:sts::{ACCOUNT}:assumed-role/Admin/{session}', 'accountId': ACCOUNT,
+        'sessionContext': {
+            'sessionIssuer': {'type': 'Role', 'userName': 'Admin', 'arn': f'arn:aws:iam::{ACCOUNT}:role/Admin'},
+            'attributes': {'creationDate': '2024-10-24T08:59:04Z', 'mfaAuthenticated': 'false'},
+        },
+    }
+
+
+def envelope(source, event_name, serial, rng, request_parameters=None, response_elements=None):
+    """An EventBridge "AWS API Call via CloudTrail" event around a CloudTrail record."""
+    event_id = f'{serial:08x}-{rng.randrange(16 ** 4):04x}-4{rng.randrange(16 ** 3):03x}-a000-{rng.randrange(16 ** 12):012x}'
+    event_time = f'2024-10-24T{serial // 3600 % 24:02d}:{serial // 60 % 60:02d}:{serial % 60:02d}Z'
+    return {
+        'version': '0', 'id': event_id, 'detail-type': 'AWS API Call via CloudTrail',
+        'source': source, 'account': ACCOUNT, 'time': event_time, 'region': REGION, 'resources': [],
+        'detail': {
+            'eventVersion': '1.09', 'userIdentity': _identity(rng), 'eventTime': event_time,
+            'eventSource': source[len('aws.'):] + '.amazonaws.com', 'eventName': event_name,
+            'awsRegion': REGION, 'sourceIPAddress': f'10.0.{rng.randrange(256)}.{rng.randrange(256)}',
+            'userAgent': 'aws-cli/2.15.0 Python/3.11.6 Linux/6.1 botocore/2.4.5',
+            'requestParameters': request_parameters if request_parameters is not None else {},
+            'responseElements': response_elements if response_elements is not None else {},
+            'requestID': f'{rng.randrange(16 ** 32):032x}', 'eventID': event_id, 'readOnly': False,
+            'eventType': 'AwsApiCall', 'managementEvent': True, 'recipientAccountId': ACCOUNT,
+            'eventCategory': 'Management',
+        },
+    }
+
+
+def _instance_item(instance_id, volume_id, eni_id, rng):
+    """One instancesSet item with the fields a real RunInstances response carries."""
+    return {
+        'instanceId': instance_id, 'imageId': f'ami-{rng.randrange(16 ** 17):017x}',
+        'instanceState': {'code': 0, 'name': 'pending'}, 'privateDnsName': '', 'amiLaunchIndex': 0,
+        'productCodes': {}, 'instanceType': 't3.micro', 'launchTime': 1729761640000,
+        'placement': {'availabilityZone': REGION + 'a', 'tenancy': 'default'},
+        'monitoring': {'state': 'disabled'}, 'subnetId': f'subnet-{rng.randrange(16 ** 17):017x}',
+        'vpcId': f'vpc-{rng.randrange(16 ** 17):017x}', 'privateIpAddress': f'10.0.{rng.randrange(256)}.{rng.randrange(256)}',
+        'stateReason': {'code': 'pending', 'message': 'pending'}, 'architecture': 'x86_64',
+        'rootDeviceType': 'ebs', 'rootDeviceName': '/dev/xvda',
+        'blockDeviceMapping': {'items': [{'deviceName': '/dev/xvda', 'ebs': {'volumeId': volume_id, 'status': 'attaching'}}]},
+        'virtualizationType': 'hvm', 'hypervisor': 'xen',
+        'groupSet': {'items': [{'groupId': f'sg-{rng.randrange(16 ** 17):017x}', 'groupName': 'default'}]},
+        'networkInterfaceSet': {'items': [{'networkInterfaceId': eni_id, 'status': 'in-use', 'sourceDestCheck': True}]},
+        'ebsOptimized': False, 'enaSupport': True,
+        'cpuOptions': {'coreCount': 1, 'threadsPerCore': 2},
+        'metadataOptions': {'state': 'pending', 'httpTokens': 'required', 'httpPutResponseHopLimit': 2},
+    }
+
+
+def creation_event(extractor, serial, rng, fan_out=1, members=3, attachments=True):
+    """A creation event that `extractor` extracts ARNs from."""
+    steps = [(part[:-2], True) if part.endswith('[]') else (part, False) for part in extractor.path.split('.')]
+    many = any(flag for _, flag in steps)
+    width = 1
+    if many:
+        width = fan_out if extractor.event_name == 'RunInstances' else members
+    names = [resource_id(extractor.resource_type, serial * 10000 + i) for i in range(width)]
+    values = names if extractor.arn(names[0], REGION, ACCOUNT) != names[0] else [
+        resource_arn(extractor.resource_type, name) for name in names]
+    event = envelope(extractor.source, extractor.event_name, serial, rng)
+    _merge(event['detail'], _nest(steps, values))
+
+    detail = event['detail']
+    if extractor.event_name == 'RunInstances':
+        detail['responseElements']['instancesSet']['items'] = [
+            _instance_item(instance_id,
+                           resource_id('ec2:volume', serial * 10000 + i) if attachments else None,
+                           f'eni-{serial * 10000 + i:017x}', rng)
+            for i, instance_id in enumerate(names)]
+        if not attachments:
+            for item in detail['responseElements']['instancesSet']['items']:
+                del item['blockDeviceMapping']
+        detail['requestParameters'] = {'instancesSet': {'items': [{'imageId': 'ami-0', 'minCount': width, 'maxCount': width}]},
+                                       'instanceType': 't3.micro'}
+    elif extractor.event_name == 'CreateTable':
+        detail['responseElements']['tableDescription']['tableName'] = names[0]
+        detail['requestParameters']['tableName'] = names[0]
+    elif extractor.source == 'aws.elasticache' and extractor.path.endswith('memberClusters[]'):
+        detail['requestParameters']['replicationGroupId'] = f'autotag-group-{serial}'
+    elif extractor.event_name == 'CreateCacheCluster':
+        detail['responseElements']['cacheClusterId'] = names[0]
+    return event
+
+
+def modification_event(source, event_name, serial, rng):
+    """A tag change event for one of the *_modification_tag functions."""
+    keys = ['Division', 'Studio', 'Owner', 'CostCenter']
+    changed = rng.sample(keys, rng.randint(1, 2))
+    tags = {key: f'value{rng.randrange(10)}' for key in changed}
+    if event_name == 'PutBucketTagging':
+        bucket = f'autotag-bucket-{serial}'
+        tag_set = [{'Key': key, 'Value': value} for key, value in tags.items()]
+        return envelope(source, event_name, serial, rng, {
+            'bucketName': bucket, 'Host': f'{bucket}.s3.amazonaws.com', 'tagging': '',
+            'Tagging': {'xmlns': 'http://s3.amazonaws.com/doc/2006-03-01/',
+                        'TagSet': {'Tag': tag_set[0] if len(tag_set) == 1 else tag_set}},
+        }, None)
+    if event_name == 'DeleteBucketTagging':
+        bucket = f'autotag-bucket-{serial}'
+        return envelope(source, event_name, serial, rng,
+                        {'bucketName': bucket, 'Host': f'{bucket}.s3.amazonaws.com', 'tagging': ''}, None)
+    if source == 'aws.elasticfilesystem':
+        parameters = {'resourceId': resource_id('elasticfilesystem:file-system', serial)}
+    elif source == 'aws.dynamodb':
+        parameters = {'resourceArn': resource_arn('dynamodb:table', f'autotag-table-{serial}')}
+    else:
+        parameters = {'resourcesSet': {'items': [{'resourceId': resource_id('ec2:subnet', serial)}]}}
+    if event_name == 'TagResource':
+        parameters['tags'] = [{'key': key, 'value': value} for key, value in tags.items()]
+    elif event_name == 'UntagResource':
+        parameters['tagKeys'] = list(tags)
+    else:
+        parameters['tagSet'] = {'items': [{'key': key, 'value': value} for key, value in tags.items()]}
+    return envelope(source, event_name, serial, rng, parameters, None)
+
+
+def unsupported_pairs():
+    """(source, eventName) pairs the combined rule lets through that no extractor handles.
+
+    Built like eventbridge.json, from the EVENTS each modification function
+    declares, so these are the tag changes a single shared rule would also
+    deliver to the creation lambda.
+    """
+    from tools.gen_eventbridge import CREATION_FUNCTION, FUNCTIONS, declared_events
+
+    pairs = {}
+    for function_dir in FUNCTIONS:
+        if function_dir == CREATION_FUNCTION:
+            continue
+        for source, names in declared_events(function_dir).items():
+            for event_name in names:
+                if (source, event_name) not in EXTRACTORS:
+                    pairs[(source, event_name)] = None
+    return sorted(pairs)
+
+def generate(kind='creation', count=None, fan_out=1, members=3, attachments=True, unsupported=0.0, seed=0,
+             start=0, burst=1):
+    """Yield `count` events of `kind`, cycling through its pairs (one round by default).
+
+    Resource IDs and eventIDs derive from each event's serial number, which
+    runs from `start`, so corpora with disjoint serial ranges never overlap.
+
+    For creation events an `unsupported` fraction is drawn from the pairs the
+    rule matches but no extractor handles, to exercise the reject path.
+
+    Consecutive runs of `burst` events share their caller and eventTime, as
+    the calls of one CloudFormation stack or terraform apply do.
+    """
+    rng = random.Random(seed)
+    if kind == 'creation':
+        pairs = list(EXTRACTORS.values())
+        noise = unsupported_pairs() if unsupported else []
+    else:
+        pairs = list(MODIFICATION_EVENTS[kind])
+        noise = []
+    count = len(pairs) if count is None else count
+    shared = None
+    for serial in range(start, start + count):
+        if noise and rng.random() < unsupported:
+            source, event_name = rng.choice(noise)
+            event = envelope(source, event_name, serial, rng)
+        elif kind == 'creation':
+            event = creation_event(pairs[serial % len(pairs)], serial, rng, fan_out, members, attachments)
+        else:
+            source, event_name = pairs[serial % len(pairs)]
+            event = modification_event(source, event_name, serial, rng)
+        if burst > 1:
+            detail = event['detail']
+            if (serial - start) % burst == 0:
+                shared = detail['userIdentity'], detail['eventTime']
+            detail['userIdentity'], detail['eventTime'] = shared
+            event['time'] = shared[1]
+        yield event
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic CloudTrail events.')
+    parser.add_argument('--kind', choices=KINDS, default='creation')
+    parser.add_argument('--count', type=int, help='events to generate (default: one per pair)')
+    parser.add_argument('--fan-out', type=int, default=1, help='instances per RunInstances')
+    parser.add_argument('--members', type=int, default=3, help='member clusters per replication group')
+    parser.add_argument('--no-attachments', action='store_true',
+                        help='leave block device mappings out, so volumes must be looked up')
+    parser.add_argument('--unsupported', type=float, default=0.0,
+                        help='fraction of events from pairs no extractor handles')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', type=int, default=0, help='first serial number')
+    parser.add_argument('--burst', type=int, default=1, help='consecutive events sharing caller and eventTime')
+    parser.add_argument('--output', help='JSON lines file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    stream = open(args.output, 'w') if args.output else sys.stdout
+    events = generate(args.kind, args.count, args.fan_out, args.members, not args.no_attachments,
+                      args.unsupported, args.seed, args.start, args.burst)
+    for event in events:
+        stream.write(json.dumps(event, separators=(',', ':')) + '\n')
+    if args.output:
+        stream.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
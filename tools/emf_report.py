@@ -0,0 +1,121 @@
+"""Aggregate the EMF metric records written by autotag_common.metrics.
+
+Reads log files (or stdin), e.g. a local run's output or an export of the
+functions' CloudWatch log groups, and sums every metric per dimension set.
+Lines may carry a prefix such as a timestamp and request ID. Lines that
+are not EMF records are ignored. Latency metrics are summarised as
+percentiles:
+
+    aws logs tail /aws/lambda/autotag --since 1h > autotag.log
+    python -m tools.emf_report autotag.log
+    python -m tools.emf_report autotag.log --by-function --json
+"""
+import argparse
+import json
+import sys
+
+
+def iter_records(lines):
+    """Yield the EMF records among log lines."""
+    for line in lines:
+        start = line.find('{')
+        if start < 0 or '"_aws"' not in line:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and '_aws' in record:
+            yield record
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list."""
+    index = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def aggregate(records, by_function=False):
+    """Fold records into {(metric, dimensions): {'unit', 'sum' or 'values'}}."""
+    totals = {}
+    for record in records:
+        for directive in record['_aws'].get('CloudWatchMetrics', []):
+            names = [name for names in directive.get('Dimensions', []) for name in names]
+            dimensions = tuple((name, record.get(name)) for name in names
+                               if by_function or name != 'Function')
+            for metric in directive.get('Metrics', []):
+                value = record.get(metric['Name'])
+                if value is None:
+                    continue
+                values = value if isinstance(value, list) else [value]
+                entry = totals.setdefault((metric['Name'], dimensions), {
+                    'unit': metric.get('Unit', 'None'), 'values': []
+                })
+                entry['values'].extend(values)
+    return totals
+
+
+def summarise(totals):
+    """One row per metric and dimension set: sums for counts, percentiles for latencies."""
+    rows = []
+    for (name, dimensions), entry in sorted(totals.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        values = sorted(entry['values'])
+        row = {'metric': name, 'dimensions': dict(dimensions), 'unit': entry['unit']}
+        if entry['unit'] == 'Milliseconds':
+            row.update(n=len(values), p50=percentile(values, 50), p90=percentile(values, 90),
+                       p99=percentile(values, 99), max=values[-1])
+        else:
+            row['sum'] = sum(values)
+        rows.append(row)
+    return rows
+
+
+def ratios(totals):
+    """Headline ratios: AWS calls and throttles per event, tags written per ARN."""
+    def total(name):
+        return sum(sum(entry['values']) for (metric, _), entry in totals.items() if metric == name)
+
+    events, arns = total('Events'), total('ArnsExtracted')
+    return {
+        'events': events,
+        'api_calls_per_event': round(total('ApiCalls') / events, 3) if events else None,
+        'throttles_per_event': round(total('Throttles') / events, 3) if events else None,
+        'tags_written_per_arn': round(total('TagsWritten') / arns, 3) if arns else None,
+    }
+
+
+def _format_dimensions(dimensions):
+    return ' '.join(f'{key}={value}' for key, value in dimensions.items()) or '-'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarise EMF metric records from log files.')
+    parser.add_argument('files', nargs='*', help='log files (default: stdin)')
+    parser.add_argument('--by-function', action='store_true', help='keep the Function dimension')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args(argv)
+
+    totals = {}
+    for path in args.files or ['-']:
+        stream = sys.stdin if path == '-' else open(path)
+        with stream:
+            for key, entry in aggregate(iter_records(stream), args.by_function).items():
+                merged = totals.setdefault(key, {'unit': entry['unit'], 'values': []})
+                merged['values'].extend(entry['values'])
+
+    rows, headline = summarise(totals), ratios(totals)
+    if args.json:
+        print(json.dumps({'metrics': rows, 'ratios': headline}, indent=2))
+        return 0
+    for row in rows:
+        if 'sum' in row:
+            print(f"{row['metric']:<16} {row['sum']:>10}  {_format_dimensions(row['dimensions'])}")
+        else:
+            print(f"{row['metric']:<16} n={row['n']:<6} p50={row['p50']:.1f} p90={row['p90']:.1f} "
+                  f"p99={row['p99']:.1f} max={row['max']:.1f} ms  {_format_dimensions(row['dimensions'])}")
+    print(json.dumps(headline))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+import random
+import threading
+
+from autotag_common.clients import install
+from autotag_common.extractors import EXTRACTORS
+
+
+def _matches(resource_type, filters):
+    return not filters or resource_type in filters or resource_type.split(':', 1)[0] in filters
+
+
+class FakeInventory:
+    """Tagged resources of a fake account, shared by the per-region clients."""
+
+    def __init__(self):
+        self.tags = {}
+        self.types = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def populate(self, count, regions, account='123456789012', tagged=0.3, seed=0):
+        """Add `count` resources built from the extractors' ARN templates.
+
+        A `tagged` fraction already carries Division and Studio, and half of
+        the rest carries one of the two.
+        """
+        rng = random.Random(seed)
+        extractors = [e for e in EXTRACTORS.values() if e.arn('x', 'r', 'a') != 'x']
+        for i in range(count):
+            extractor = extractors[i % len(extractors)]
+            region = regions[i % len(regions)]
+            arn = extractor.arn(f'fake-{i:08x}', region, account)
+            tags = {'Name': f'fake-{i}'}
+            roll = rng.random()
+            if roll < tagged:
+                tags.update(Division='CD', Studio='Ajax')
+            elif roll < tagged + (1 - tagged) / 2:
+                tags[rng.choice(('Division', 'Studio'))] = 'CD' if rng.random() < 0.5 else 'Ajax'
+            self.tags[arn] = tags
+            self.types[arn] = extractor.resource_type
+        return self
+
+    def client(self, region, default_region='us-east-1', throttle=0.0, seed=0):
+        return FakeTaggingClient(self, region, default_region, throttle, seed)
+
+    def install(self, regions, default_region='us-east-1', throttle=0.0):
+        """Serve resourcegroupstaggingapi for `regions` (and global ARNs) from this inventory."""
+        for region in list(regions) + [None]:
+            install('resourcegroupstaggingapi', self.client(region or default_region, default_region, throttle), region)
+
+
+class FakeThrottle(Exception):
+    """Stands in for a botocore ClientError with a ThrottlingException code."""
+
+    response = {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}
+
+
+class FakeTaggingClient:
+    """The get_resources/tag_resources subset of resourcegroupstaggingapi for one region.
+
+    A `throttle` fraction of tag_resources calls fail with ThrottlingException.
+    """
+
+    def __init__(self, inventory, region, default_region, throttle, seed):
+        self.inventory = inventory
+        self.region = region
+        self.default_region = default_region
+        self.throttle = throttle
+        self._rng = random.Random(seed)
+        self._listings = {}
+
+    def _region_of(self, arn):
+        return arn.split(':', 4)[3] or self.default_region
+
+    def get_resources(self, ResourceTypeFilters=None, ResourcesPerPage=100, PaginationToken='', **kwargs):
+        self.inventory.calls.append(('get_resources', self.region))
+        filters = tuple(ResourceTypeFilters or ())
+        if not PaginationToken or filters not in self._listings:
+            types = self.inventory.types
+            self._listings[filters] = sorted(arn for arn in self.inventory.tags
+                                             if self._region_of(arn) == self.region and _matches(types[arn], filters))
+        arns = self._listings[filters]
+        start = int(PaginationToken or 0)
+        page = arns[start:start + ResourcesPerPage]
+        end = start + len(page)
+        return {
+            'PaginationToken': str(end) if end < len(arns) else '',
+            'ResourceTagMappingList': [
+                {'ResourceARN': arn,
+                 'Tags': [{'Key': key, 'Value': value} for key, value in self.inventory.tags[arn].items()]}
+                for arn in page
+            ]
+        }
+
+    def tag_resources(self, ResourceARNList, Tags):
+        self.inventory.calls.append(('tag_resources', self.region, len(ResourceARNList)))
+        if self._rng.random() < self.throttle:
+            raise FakeThrottle('Rate exceeded')
+        failed = {}
+        with self.inventory._lock:
+            for arn in ResourceARNList:
+                if arn in self.inventory.tags:
+                    self.inventory.tags[arn].update(Tags)
+                else:
+                    failed[arn] = {'StatusCode': 404, 'ErrorCode': 'InvalidParameterException',
+                                   'ErrorMessage': 'Resource not found'}
+        return {'FailedResourcesMap': failed}
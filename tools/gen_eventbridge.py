@@ -0,0 +1,134 @@
+"""Generate the EventBridge event patterns from the events the handlers declare.
+
+The creation function subscribes to every (source, eventName) pair in
+autotag_common.extractors.EXTRACTORS. Each *_modification_tag function, and
+taggin_creation_time, subscribes to the pairs in its lambda_function.EVENTS. Each pattern
+matches those exact pairs on detail.eventSource, so a service is never
+subscribed to another service's event names. It also filters out, before
+they cost an invocation:
+
+  - calls that failed (errorCode is present), since they created or
+    changed nothing;
+  - read-only calls (readOnly is true). Records without a readOnly field
+    are kept, since CloudTrail leaves it out for some services.
+
+The patterns are written into each function's eventbridge.tf, and their
+union into eventbridge.json. --check rewrites nothing and exits non-zero
+when a file has drifted from the code:
+
+    python -m tools.gen_eventbridge
+    python -m tools.gen_eventbridge --check
+"""
+import argparse
+import importlib.util
+import json
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Functions whose eventbridge.tf is generated; the creation function reads its
+# events from the extractor registry, the others from their EVENTS
+FUNCTIONS = ('AWS_Resource_Autotag', 's3_modification_tag', 'efs_modification_tag',
+             'dynamodb_modification_tag', 'vpc_modification_tag', 'taggin_creation_time')
+CREATION_FUNCTION = 'AWS_Resource_Autotag'
+
+_HEREDOC = re.compile(r'(event_pattern\s*=\s*<<EOF\n)(.*?)(\nEOF)', re.S)
+
+
+def creation_events():
+    """{source: [eventName, ...]} of every extractor in the registry."""
+    from autotag_common.extractors import EXTRACTORS
+
+    events = {}
+    for source, event_name in EXTRACTORS:
+        events.setdefault(source, []).append(event_name)
+    return events
+
+
+def declared_events(function_dir):
+    """The EVENTS a modification function declares in its lambda_function.py."""
+    path = os.path.join(ROOT, function_dir, 'lambda-autotag', 'src', 'lambda_function.py')
+    spec = importlib.util.spec_from_file_location(f'gen_{function_dir}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return {source: list(names) for source, names in module.EVENTS.items()}
+
+
+def events_of(function_dir):
+    if function_dir == CREATION_FUNCTION:
+        return creation_events()
+    return declared_events(function_dir)
+
+
+def event_source(source):
+    """CloudTrail eventSource of an EventBridge source, e.g. aws.s3 -> s3.amazonaws.com."""
+    return source[len('aws.'):] + '.amazonaws.com'
+
+
+def pattern(events):
+    """The event pattern matching exactly the {source: eventNames} pairs, successful writes only."""
+    matches = [{'eventSource': [event_source(source)], 'eventName': sorted(set(names))}
+               for source, names in sorted(events.items())]
+    detail = {'errorCode': [{'exists': False}], 'readOnly': [False, {'exists': False}]}
+    if len(matches) == 1:
+        detail.update(matches[0])
+    else:
+        detail['$or'] = matches
+    return {
+        'source': sorted(events),
+        'detail-type': ['AWS API Call via CloudTrail'],
+        'detail': detail
+    }
+
+
+def render_tf(text, event_pattern):
+    """`text` with its event_pattern heredoc replaced by `event_pattern`."""
+    rendered, count = _HEREDOC.subn(
+        lambda match: match.group(1) + json.dumps(event_pattern, indent=2) + match.group(3), text, count=1)
+    if not count:
+        raise ValueError('no event_pattern heredoc found')
+    return rendered
+
+
+def generate():
+    """Map each generated file to its expected contents."""
+    files = {}
+    union = {}
+    for function_dir in FUNCTIONS:
+        events = events_of(function_dir)
+        for source, names in events.items():
+            union.setdefault(source, []).extend(names)
+        path = os.path.join(ROOT, function_dir, 'eventbridge.tf')
+        with open(path) as f:
+            files[path] = render_tf(f.read(), pattern(events))
+    files[os.path.join(ROOT, 'eventbridge.json')] = json.dumps(pattern(union), indent=2) + '\n'
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the EventBridge patterns from the handlers.')
+    parser.add_argument('--check', action='store_true', help='report drift instead of rewriting the files')
+    args = parser.parse_args(argv)
+
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    stale = []
+    for path, expected in generate().items():
+        with open(path) as f:
+            current = f.read()
+        if current == expected:
+            continue
+        stale.append(os.path.relpath(path, ROOT))
+        if not args.check:
+            with open(path, 'w') as f:
+                f.write(expected)
+    for path in stale:
+        print(f"{'out of date' if args.check else 'updated'}: {path}")
+    return 1 if args.check and stale else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,272 @@
+"""Backfill CreatedBy/CreatedOn by replaying CloudTrail log files.
+
+Reads the gzipped files CloudTrail delivers, from a local directory or an
+S3 (or S3-compatible) prefix, and decodes their Records arrays one record at
+a time. Records for the (source, eventName) pairs the creation lambda tags
+go through the same extractors and identity/time helpers, without calling
+AWS. The current tags of the resulting ARNs are then read in bulk, and only
+the tags each resource lacks are written, so values already on a resource
+(CreatedBy, CreatedOn, Division, Studio) are never overwritten:
+
+    python -m tools.replay ./trail-logs --dry-run
+    python -m tools.replay s3://trail-bucket/AWSLogs/123456789012/CloudTrail/ --processes 8
+
+Files are scanned in a process pool; for each ARN the first creation event
+seen wins, and files are visited in key order, which CloudTrail makes
+chronological per region. --dry-run reads nothing and lists every candidate
+tag.
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+
+from autotag_common import clients
+from autotag_common.extractors import extract_arns, lookup
+from autotag_common.identity import get_created_by_identity
+from autotag_common.readers import read_tags
+from autotag_common.tagging import tag_resources
+from autotag_common.tags import MANDATORY_TAGS, missing
+from autotag_common.timeconv import convert_event_time
+
+_CHUNK = 1 << 16
+
+# Flushed ARNs remembered so that later events for them are dropped without
+# a read; one forgotten and seen again is only read, since its tags are there
+MAX_DONE = 100000
+
+
+def iter_records(stream, chunk_size=_CHUNK):
+    """Yield the entries of a CloudTrail file's Records array without loading the whole file.
+
+    Only the current chunk and the record being decoded are held in memory.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8')
+    decoder = json.JSONDecoder()
+    buf = ''
+    while True:
+        chunk = text.read(chunk_size)
+        if not chunk:
+            return
+        start = (buf + chunk).find('[')
+        buf += chunk
+        if start >= 0:
+            buf = buf[start + 1:]
+            break
+        # Keep only the tail, in case '"Records":' straddles two chunks
+        buf = buf[-16:]
+
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        if pos < len(buf):
+            try:
+                record, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                yield record
+                continue
+        if eof:
+            return
+        chunk = text.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def to_event(record):
+    """Wrap a CloudTrail record in the EventBridge envelope the extractors expect."""
+    return {
+        'source': 'aws.' + record['eventSource'].split('.', 1)[0],
+        'account': record.get('recipientAccountId') or record['userIdentity'].get('accountId', ''),
+        'region': record['awsRegion'],
+        'detail': record
+    }
+
+
+def scan_records(records, stats):
+    """Yield (arn, event_time, tags) for every successful creation record we tag."""
+    for record in records:
+        stats['records'] += 1
+        source = record.get('eventSource')
+        if not source or record.get('errorCode'):
+            continue
+        event = to_event(record)
+        extractor = lookup(event['source'], record.get('eventName'))
+        if extractor is None:
+            continue
+        stats['matched'] += 1
+        try:
+            arns = extract_arns(extractor, event, resolve=False)
+            tags = {
+                'CreatedBy': get_created_by_identity(event),
+                'CreatedOn': convert_event_time(record['eventTime']),
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            stats['malformed'] += 1
+            print(f"Skipping malformed {record.get('eventName')} record {record.get('eventID')}: {e!r}",
+                  file=sys.stderr)
+            continue
+        tags.update(MANDATORY_TAGS)
+        for arn in arns:
+            yield arn, record['eventTime'], tags
+
+
+def _open(location, name):
+    if location.startswith('s3://'):
+        bucket = location[5:].split('/', 1)[0]
+        body = _s3_client().get_object(Bucket=bucket, Key=name)['Body']
+        stream = body._raw_stream if hasattr(body, '_raw_stream') else body
+    else:
+        stream = open(name, 'rb')
+    return gzip.GzipFile(fileobj=stream) if name.endswith('.gz') else stream
+
+
+_ENDPOINT_URL = None
+
+
+def _s3_client():
+    if _ENDPOINT_URL:
+        import boto3
+
+        return boto3.client('s3', endpoint_url=_ENDPOINT_URL)
+    return clients.get_client('s3')
+
+
+def list_files(location):
+    """Log files under a local directory or an s3://bucket/prefix, in key order."""
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[5:].partition('/')
+        paginator = _s3_client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                key = item['Key']
+                if key.endswith(('.json.gz', '.json')) and 'CloudTrail-Digest' not in key:
+                    yield key
+        return
+    for root, dirs, files in os.walk(location):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(('.json.gz', '.json')) and 'CloudTrail-Digest' not in root:
+                yield os.path.join(root, name)
+
+
+def _init_worker(endpoint_url):
+    global _ENDPOINT_URL
+    _ENDPOINT_URL = endpoint_url
+    # Connection pools inherited from the parent must not be shared across processes
+    clients.clear()
+
+
+def scan_file(location, name):
+    """Scan one log file; returns ({arn: (event_time, tags)}, stats)."""
+    stats = {'files': 1, 'records': 0, 'matched': 0, 'malformed': 0}
+    found = {}
+    with _open(location, name) as stream:
+        for arn, event_time, tags in scan_records(iter_records(stream), stats):
+            if arn not in found or event_time < found[arn][0]:
+                found[arn] = (event_time, tags)
+    return found, stats
+
+
+def _scan(args):
+    return scan_file(*args)
+
+
+def replay(location, processes=None, flush_size=1000, dry_run=False, output=None, endpoint_url=None,
+           **tag_options):
+    """Replay every log file under `location` and tag (or, with dry_run, report) what it creates."""
+    _init_worker(endpoint_url)
+    totals = {'files': 0, 'records': 0, 'matched': 0, 'malformed': 0, 'arns': 0, 'complete': 0,
+              'tagged': 0, 'failed': 0}
+    # ARNs already flushed, oldest first; their first creation event has been applied
+    done = OrderedDict()
+    pending = {}
+
+    def flush():
+        candidates = {arn: tags for arn, (_, tags) in pending.items()}
+        for arn in pending:
+            done[arn] = None
+        while len(done) > MAX_DONE:
+            done.popitem(last=False)
+        pending.clear()
+        if not candidates:
+            return
+        totals['arns'] += len(candidates)
+        if dry_run:
+            work = list(candidates.items())
+        else:
+            # Only the tags each resource lacks; read in bulk, bypassing the cache
+            work = []
+            for arn, current in read_tags(list(candidates), cache=None):
+                delta = missing(current, candidates[arn])
+                if delta:
+                    work.append((arn, delta))
+            totals['complete'] += len(candidates) - len(work)
+        if output is not None:
+            for arn, tags in work:
+                output.write(json.dumps({'arn': arn, 'tags': tags}) + '\n')
+        if dry_run or not work:
+            return
+        result = tag_resources(work, **tag_options)
+        totals['tagged'] += len(result['tagged'])
+        totals['failed'] += len(result['failed'])
+        for arn, failure in result['failed'].items():
+            print(f"Failed to tag {arn}: {failure}", file=sys.stderr)
+
+    tasks = ((location, name) for name in list_files(location))
+    with Pool(processes, initializer=_init_worker, initargs=(endpoint_url,)) as pool:
+        for found, stats in pool.imap(_scan, tasks, chunksize=4):
+            for key, value in stats.items():
+                totals[key] += value
+            for arn, (event_time, tags) in found.items():
+                if arn in done:
+                    continue
+                current = pending.get(arn)
+                if current is None or event_time < current[0]:
+                    pending[arn] = (event_time, tags)
+            if len(pending) >= flush_size:
+                flush()
+    flush()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill CreatedBy/CreatedOn from CloudTrail log files.')
+    parser.add_argument('location', help='local directory or s3://bucket/prefix of CloudTrail logs')
+    parser.add_argument('--endpoint-url', help='S3-compatible endpoint to read the logs from')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--flush-size', type=int, default=1000, help='ARNs buffered per tagging round')
+    parser.add_argument('--dry-run', action='store_true', help='do not tag; combine with --output')
+    parser.add_argument('--output', help='write the (arn, tags) pairs as JSON lines to this file')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent tag_resources batches')
+    parser.add_argument('--rate', type=float, default=5.0, help='tag_resources calls per second per service')
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    output = open(args.output, 'w') if args.output else None
+    try:
+        totals = replay(args.location, processes=args.processes, flush_size=args.flush_size,
+                        dry_run=args.dry_run, output=output, endpoint_url=args.endpoint_url,
+                        max_workers=args.workers, rate=args.rate, rates={})
+    finally:
+        if output is not None:
+            output.close()
+    totals['seconds'] = round(time.monotonic() - started, 2)
+    print(json.dumps(totals, indent=2))
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
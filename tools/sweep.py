@@ -0,0 +1,282 @@
+"""Backfill mandatory tags on resources that existed before the lambdas did.
+
+Pages through resourcegroupstaggingapi.get_resources per region, restricted
+to the resource types the creation lambda tags, and adds whichever of the
+mandatory tags are missing. Tagging goes through the same batching executor
+as the lambda, with a rate budget per service; EC2 resources are tagged
+with create_tags, 1000 per call, unless --no-native is given. Progress is checkpointed
+after every flushed chunk, so an interrupted sweep resumes where it stopped:
+
+    python -m tools.sweep --regions us-east-1,ap-south-1 --checkpoint sweep.json
+    python -m tools.sweep --fake 50000 --regions us-east-1,eu-west-1 --dry-run
+
+get_resources only returns resources that carry, or once carried, a tag, so
+resources that were never tagged are invisible to it. --list-untagged adds
+a second pass that lists the types in NATIVE_LISTERS with their own
+describe/list APIs, reads their tags in bulk and tags the ones that have
+none. The pass is not checkpointed page by page; an interrupted one is
+listed again, and the resources it already tagged are skipped then. Types
+without a native lister are only covered once something has tagged them.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from autotag_common.clients import get_client
+from autotag_common.extractors import EXTRACTORS
+from autotag_common.quota import get_account
+from autotag_common.ratelimit import call, paginate
+from autotag_common.readers import read_tags
+from autotag_common.tagging import tag_resources
+from autotag_common.tags import MANDATORY_TAGS, as_dict, missing
+
+# get_resources returns at most 100 mappings per page
+PAGE_SIZE = 100
+
+
+def resource_type_filters():
+    """The resource types the creation lambda tags, in registry order."""
+    return list(dict.fromkeys(e.resource_type for e in EXTRACTORS.values()))
+
+
+def iter_resources(region, filters, token=''):
+    """Yield (mappings, next_token) per get_resources page, starting at `token`."""
+    client = get_client('resourcegroupstaggingapi', region)
+    while True:
+        page = call(client, 'get_resources', ResourceTypeFilters=filters, ResourcesPerPage=PAGE_SIZE,
+                    PaginationToken=token)
+        token = page.get('PaginationToken') or ''
+        yield page.get('ResourceTagMappingList', []), token
+        if not token:
+            return
+
+
+def _ec2_lister(resource_type, operation, key, id_key, paged=True):
+    def list_arns(region, account):
+        client = get_client('ec2', region)
+        for page in paginate(client, operation) if paged else [call(client, operation)]:
+            for item in page.get(key, []):
+                if item.get(id_key):
+                    yield f'arn:aws:ec2:{region}:{account}:{resource_type}/{item[id_key]}'
+    return list_arns
+
+
+def _list_instances(region, account):
+    for page in paginate(get_client('ec2', region), 'describe_instances'):
+        for reservation in page.get('Reservations', []):
+            for instance in reservation.get('Instances', []):
+                yield f'arn:aws:ec2:{region}:{account}:instance/{instance["InstanceId"]}'
+
+
+def _list_tables(region, account):
+    for page in paginate(get_client('dynamodb', region), 'list_tables'):
+        for name in page.get('TableNames', []):
+            yield f'arn:aws:dynamodb:{region}:{account}:table/{name}'
+
+
+def _arn_lister(service, operation, key, arn_key):
+    def list_arns(region, account):
+        for page in paginate(get_client(service, region), operation):
+            for item in page.get(key, []):
+                yield item[arn_key]
+    return list_arns
+
+
+# Service-native listings of the resource types get_resources cannot see
+# until they are tagged, by resource type filter. Each yields the ARNs of a
+# region's resources
+NATIVE_LISTERS = {
+    'ec2:instance': _list_instances,
+    'ec2:volume': _ec2_lister('volume', 'describe_volumes', 'Volumes', 'VolumeId'),
+    'ec2:internet-gateway': _ec2_lister('internet-gateway', 'describe_internet_gateways',
+                                        'InternetGateways', 'InternetGatewayId'),
+    'ec2:natgateway': _ec2_lister('natgateway', 'describe_nat_gateways', 'NatGateways', 'NatGatewayId'),
+    # describe_addresses has no paginator
+    'ec2:elastic-ip': _ec2_lister('elastic-ip', 'describe_addresses', 'Addresses', 'AllocationId', paged=False),
+    'ec2:vpc-endpoint': _ec2_lister('vpc-endpoint', 'describe_vpc_endpoints', 'VpcEndpoints', 'VpcEndpointId'),
+    'ec2:transit-gateway': _ec2_lister('transit-gateway', 'describe_transit_gateways',
+                                       'TransitGateways', 'TransitGatewayId'),
+    'ec2:vpc': _ec2_lister('vpc', 'describe_vpcs', 'Vpcs', 'VpcId'),
+    'ec2:security-group': _ec2_lister('security-group', 'describe_security_groups', 'SecurityGroups', 'GroupId'),
+    'ec2:subnet': _ec2_lister('subnet', 'describe_subnets', 'Subnets', 'SubnetId'),
+    'dynamodb:table': _list_tables,
+    'lambda:function': _arn_lister('lambda', 'list_functions', 'Functions', 'FunctionArn'),
+    'sns': _arn_lister('sns', 'list_topics', 'Topics', 'TopicArn'),
+}
+
+
+def iter_untagged(region, account, filters):
+    """Yield the ARNs of resources of `filters` that carry no tags at all, found through NATIVE_LISTERS."""
+    for resource_type in filters:
+        lister = NATIVE_LISTERS.get(resource_type)
+        if lister is None:
+            continue
+        arns = list(lister(region, account))
+        for arn, current in read_tags(arns, cache=None):
+            if not current:
+                yield arn
+
+
+def missing_tags(mapping, required):
+    """The subset of `required` not present on a get_resources mapping."""
+    return missing(as_dict(mapping.get('Tags', [])), required)
+
+
+class Checkpoint:
+    """Per-region pagination tokens and counters, persisted as JSON.
+
+    A region entry holds the token of the first page whose resources have not
+    been flushed yet, or done=True. Writes go through a temporary file so that
+    a crash never leaves a truncated checkpoint behind.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {'regions': {}}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def region(self, region):
+        with self._lock:
+            return dict(self.state['regions'].setdefault(region, {
+                'token': '', 'done': False, 'listed': False, 'scanned': 0, 'missing': 0,
+                'missing_created_by': 0, 'tagged': 0, 'failed': 0
+            }))
+
+    def update(self, region, **fields):
+        with self._lock:
+            self.state['regions'][region].update(fields)
+            if self.path:
+                tmp = self.path + '.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(self.state, f, indent=2)
+                os.replace(tmp, self.path)
+
+
+def sweep_region(region, checkpoint, required, filters, flush_size, dry_run, tag_options, list_untagged=False):
+    """Sweep one region, flushing tagging work every `flush_size` ARNs."""
+    progress = checkpoint.region(region)
+    if progress['done'] and (progress.get('listed') or not list_untagged):
+        return progress
+
+    work = []
+    counters = {key: progress[key] for key in ('scanned', 'missing', 'missing_created_by', 'tagged', 'failed')}
+
+    def flush(token, done=False, **fields):
+        if work and not dry_run:
+            result = tag_resources(work, **tag_options)
+            counters['tagged'] += len(result['tagged'])
+            counters['failed'] += len(result['failed'])
+            for arn, failure in result['failed'].items():
+                print(f"{region}: failed to tag {arn}: {failure}")
+        del work[:]
+        checkpoint.update(region, token=token, done=done, **fields, **counters)
+
+    if not progress['done']:
+        for mappings, token in iter_resources(region, filters, progress['token']):
+            for mapping in mappings:
+                counters['scanned'] += 1
+                tags = missing_tags(mapping, required)
+                if 'CreatedBy' not in required and missing_tags(mapping, {'CreatedBy': None}):
+                    counters['missing_created_by'] += 1
+                if tags:
+                    counters['missing'] += 1
+                    work.append((mapping['ResourceARN'], tags))
+            # Only flush on page boundaries so that the saved token is exact
+            if len(work) >= flush_size and token:
+                flush(token)
+                print(f"{region}: scanned {counters['scanned']}, tagged {counters['tagged']}")
+        flush('', done=True)
+
+    if list_untagged:
+        for arn in iter_untagged(region, get_account(), filters):
+            counters['scanned'] += 1
+            counters['missing'] += 1
+            if 'CreatedBy' not in required:
+                counters['missing_created_by'] += 1
+            work.append((arn, dict(required)))
+            if len(work) >= flush_size:
+                flush('', done=True)
+        flush('', done=True, listed=True)
+        print(f"{region}: listed never-tagged resources, tagged {counters['tagged']}")
+    return checkpoint.region(region)
+
+
+def sweep(regions, checkpoint, required=MANDATORY_TAGS, flush_size=1000, region_workers=4,
+          dry_run=False, list_untagged=False, **tag_options):
+    """Sweep `regions` concurrently and return the per-region counters."""
+    filters = resource_type_filters()
+
+    def run(region):
+        return region, sweep_region(region, checkpoint, required, filters, flush_size, dry_run, tag_options,
+                                    list_untagged)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(region_workers, len(regions)))) as pool:
+        return dict(pool.map(run, regions))
+
+
+def _parse_rates(values):
+    rates = {}
+    for value in values or []:
+        service, _, rate = value.partition('=')
+        rates[service] = float(rate)
+    return rates
+
+
+def _all_regions():
+    return [r['RegionName'] for r in get_client('ec2').describe_regions()['Regions']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill missing mandatory tags across an account.')
+    parser.add_argument('--regions', help='comma-separated regions (default: every enabled region)')
+    parser.add_argument('--checkpoint', help='JSON file to resume from and record progress to')
+    parser.add_argument('--created-by', help='also tag resources missing CreatedBy with this value')
+    parser.add_argument('--dry-run', action='store_true', help='count missing tags without tagging')
+    parser.add_argument('--flush-size', type=int, default=1000, help='ARNs buffered per tagging round')
+    parser.add_argument('--region-workers', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=8, help='concurrent tag_resources batches')
+    parser.add_argument('--rate', type=float, default=5.0, help='tag_resources calls per second per service')
+    parser.add_argument('--service-rate', action='append', metavar='SERVICE=RATE',
+                        help='override --rate for one service, e.g. ec2=10')
+    parser.add_argument('--no-native', action='store_true',
+                        help='tag EC2 resources through tag_resources instead of create_tags')
+    parser.add_argument('--list-untagged', action='store_true',
+                        help='also list never-tagged resources with their service APIs (see NATIVE_LISTERS)')
+    parser.add_argument('--fake', type=int, metavar='N', help='sweep a local fake account of N resources')
+    args = parser.parse_args(argv)
+    if args.fake and args.list_untagged:
+        # The fake account only fakes the tagging API
+        parser.error('--list-untagged cannot be combined with --fake')
+
+    regions = args.regions.split(',') if args.regions else None
+    if args.fake:
+        from tools.fake_tagging import FakeInventory
+
+        regions = regions or ['us-east-1']
+        FakeInventory().populate(args.fake, regions).install(regions)
+    regions = regions or _all_regions()
+
+    required = dict(MANDATORY_TAGS)
+    if args.created_by:
+        required['CreatedBy'] = args.created_by
+
+    started = time.monotonic()
+    results = sweep(
+        regions, Checkpoint(args.checkpoint), required,
+        flush_size=args.flush_size, region_workers=args.region_workers, dry_run=args.dry_run,
+        list_untagged=args.list_untagged, max_workers=args.workers, rate=args.rate, rates=_parse_rates(args.service_rate),
+        # The fake account only fakes the tagging API
+        native=not (args.no_native or args.fake)
+    )
+    print(json.dumps({'regions': results, 'seconds': round(time.monotonic() - started, 2)}, indent=2))
+    return 1 if any(r['failed'] for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
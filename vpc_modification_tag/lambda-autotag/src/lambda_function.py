@@ -1,80 +1,123 @@
-import boto3
+from autotag_common import log, metrics, tags
+from autotag_common.clients import get_client
+from autotag_common.ratelimit import call
+from autotag_common.readers import describe_ec2_tags
+from autotag_common.tag_cache import TAG_CACHE
+
+# The events this function handles, by EventBridge source. eventbridge.tf is
+# generated from them with tools/gen_eventbridge.py
+EVENTS = {'aws.ec2': ('CreateTags', 'DeleteTags')}
+
+# create_tags accepts at most 1000 resources per call
+MAX_RESOURCES_PER_CALL = 1000
+
+# Resource IDs listed in an invocation's summary record
+MAX_LOGGED_RESOURCES = 20
 
-def lambda_handler(event, context):
-    ec2_client = boto3.client('ec2')
 
-    print(f"Received event: {event}")
+def create_tags(ec2_client, resource_ids, delta):
+    """Write the same tags to many resources, 1000 per create_tags call."""
+    for start in range(0, len(resource_ids), MAX_RESOURCES_PER_CALL):
+        call(ec2_client, 'create_tags',
+            Resources=resource_ids[start:start + MAX_RESOURCES_PER_CALL],
+            Tags=tags.as_list(delta)
+        )
+
+@metrics.handler
+@log.handler
+def lambda_handler(event, context):
+    ec2_client = get_client('ec2')
 
     try:
         # Capture event name
         if 'detail' not in event:
-            print("Missing 'detail' in event")
+            log.annotate(outcome='no detail')
             return {"statusCode": 400, "body": "Missing 'detail' in event"}
 
         event_name = event['detail'].get('eventName')
-        print(f"Event name: {event_name}")
 
         # Avoid infinite loops
         user_identity = event['detail'].get('userIdentity', {})
         if user_identity.get('type') == "AssumedRole" and "autotag" in user_identity.get('arn', ''):
-            print("Event triggered by Lambda itself; skipping to avoid loop.")
+            log.annotate(outcome='ignored own change')
             return {"statusCode": 200, "body": "Ignored event to prevent infinite loop"}
 
         # Supported events
-        if event_name not in ['CreateTags', 'DeleteTags']:
-            print(f"Unsupported event: {event_name}")
+        if event_name not in EVENTS['aws.ec2']:
+            log.annotate(outcome='unsupported')
             return {"statusCode": 400, "body": f"Unsupported event: {event_name}"}
 
-        # Retrieve the resource ID from the event
+        # Retrieve the resource IDs from the event; one call can tag many resources
         resource_items = event["detail"]["requestParameters"]["resourcesSet"]["items"]
-        if not resource_items or "resourceId" not in resource_items[0]:
-            print("Resource ID not found in the event")
+        resource_ids = list(dict.fromkeys(item["resourceId"] for item in resource_items or [] if "resourceId" in item))
+        if not resource_ids:
+            log.annotate(outcome='no resource')
             return {"statusCode": 400, "body": "Resource ID not found in the event"}
 
-        resource_id = resource_items[0]["resourceId"]
-        print(f"Resource ID: {resource_id}")
+        log.annotate(resources=resource_ids[:MAX_LOGGED_RESOURCES], resource_count=len(resource_ids))
 
-        # Get current tags for the resource
-        current_tags_response = ec2_client.describe_tags(
-            Filters=[{'Name': 'resource-id', 'Values': [resource_id]}]
-        )
-        current_tags = current_tags_response.get('Tags', [])
-        current_tags_dict = {tag['Key']: tag['Value'] for tag in current_tags}
+        # Apply the tag changes carried by the event to the cached state, and
+        # decide from them alone where they are enough. The event made the
+        # same change to every resource, so one decision covers them all
+        tag_items = event["detail"]["requestParameters"].get("tagSet", {}).get("items", [])
+        if not tags.EVENT_RECONCILE:
+            # The change is not applied from the event, so the cached state is stale
+            for resource_id in resource_ids:
+                TAG_CACHE.invalidate(resource_id)
+            delta = None
+        elif event_name == 'CreateTags':
+            added = tags.as_dict(tag_items, 'key', 'value')
+            for resource_id in resource_ids:
+                TAG_CACHE.merge(resource_id, added)
+            delta = tags.from_event(added=added)
+        elif tag_items:
+            removed = [tag['key'] for tag in tag_items]
+            values = {tag['key']: tag['value'] for tag in tag_items if 'value' in tag}
+            for resource_id in resource_ids:
+                TAG_CACHE.remove(resource_id, removed, values=values)
+            # A mandatory tag deleted only if it had a given value may still be there
+            if any(key in tags.MANDATORY_TAGS for key in values):
+                delta = None
+            else:
+                delta = tags.from_event(removed=removed)
+        else:
+            # DeleteTags without a tag set removes every tag
+            for resource_id in resource_ids:
+                TAG_CACHE.put(resource_id, {})
+            delta = tags.from_event(replaced={})
 
-        # Define mandatory tags
-        mandatory_tags = [
-            {'Key': 'Division', 'Value': 'CD'},
-            {'Key': 'Studio', 'Value': 'Ajax'}
-        ]
+        # Otherwise compare with the current tags of each resource, reading
+        # those not cached with one batched describe_tags
+        if delta is not None:
+            groups = {tuple(delta.items()): resource_ids}
+        else:
+            current = {resource_id: TAG_CACHE.get(resource_id) for resource_id in resource_ids}
+            unknown = [resource_id for resource_id, current_tags in current.items() if current_tags is None]
+            if unknown:
+                with metrics.stage('read'):
+                    fetched = describe_ec2_tags(ec2_client, unknown)
+                for resource_id, current_tags in fetched.items():
+                    TAG_CACHE.put(resource_id, current_tags)
+                current.update(fetched)
+            groups = {}
+            for resource_id, current_tags in current.items():
+                groups.setdefault(tuple(sorted(tags.missing(current_tags).items())), []).append(resource_id)
+        log.debug('tag cache', **TAG_CACHE.stats())
 
-        if event_name == 'DeleteTags':
-            print(f"Handling DeleteTags for {resource_id}")
-            # Reapply mandatory tags if they were deleted
-            ec2_client.create_tags(
-                Resources=[resource_id],
-                Tags=[tag for tag in mandatory_tags if tag['Key'] not in current_tags_dict]
-            )
-            print(f"Re-applied mandatory tags for {resource_id}")
-            return {"statusCode": 200, "body": f"Re-applied mandatory tags for {resource_id}"}
+        # Write only the mandatory tags the resources lack, with one grouped
+        # create_tags per distinct set of missing tags; most events need no write
+        outcome = 'reapplied' if event_name == 'DeleteTags' else 'tagged'
+        for missing, group in sorted(groups.items(), key=lambda item: len(item[0])):
+            written = tags.write_missing(dict(missing), lambda delta: create_tags(ec2_client, group, delta),
+                                         outcome=outcome, resources=len(group))
+            for resource_id in group:
+                TAG_CACHE.merge(resource_id, written)
 
-        elif event_name == 'CreateTags':
-            print(f"Handling CreateTags for {resource_id}")
-            # Ensure mandatory tags are present
-            tags_to_apply = []
-            for mandatory_tag in mandatory_tags:
-                if mandatory_tag['Key'] not in current_tags_dict:
-                    tags_to_apply.append(mandatory_tag)
-
-            if tags_to_apply:
-                ec2_client.create_tags(
-                    Resources=[resource_id],
-                    Tags=tags_to_apply
-                )
-                print(f"Added missing mandatory tags: {tags_to_apply}")
-            else:
-                print("All mandatory tags are already present.")
-            return {"statusCode": 200, "body": f"Tags validated for {resource_id}"}
+        described = resource_ids[0] if len(resource_ids) == 1 else f"{len(resource_ids)} resources"
+        if event_name == 'DeleteTags':
+            return {"statusCode": 200, "body": f"Re-applied mandatory tags for {described}"}
+        return {"statusCode": 200, "body": f"Tags validated for {described}"}
 
     except Exception as e:
-        print(f"Error: {e}")
+        log.annotate(error=str(e))
         return {"statusCode": 500, "body": str(e)}